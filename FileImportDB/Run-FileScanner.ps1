@@ -3,6 +3,7 @@ param(
     [string] $DbPath = "fileindex.db",
     [int] $Workers = 10,
     [switch] $Hash,
+    [string[]] $Digests,
     [int] $BatchSize = 500,
     [switch] $FollowSymlinks,
     [string] $Include,
@@ -33,6 +34,7 @@ $pyArgs.Add('--db')
 $pyArgs.Add($DbPath)
 if ($Workers -gt 0) { $pyArgs.Add('--workers'); $pyArgs.Add([string]$Workers) }
 if ($Hash) { $pyArgs.Add('--hash') }
+if ($Digests) { $pyArgs.Add('--digests'); foreach ($d in $Digests) { $pyArgs.Add($d) } }
 if ($BatchSize -ne 500) { $pyArgs.Add('--batch-size'); $pyArgs.Add([string]$BatchSize) }
 if ($FollowSymlinks) { $pyArgs.Add('--follow-symlinks') }
 if ($Include) { $pyArgs.Add('--include'); $pyArgs.Add($Include) }
@@ -2,8 +2,8 @@
 """
 FileImportDB scanner
 
-Scans directories, collects file metadata and (optionally) SHA256 hashes
-in parallel, and writes results into a SQLite database. Designed for
+Scans directories, collects file metadata and (optionally) SHA256, MD5 and
+QuickXorHash digests in parallel, and writes results into a SQLite database. Designed for
 efficient batch inserts and resumable runs.
 
 Usage examples (see README.md):
@@ -19,6 +19,13 @@ import sys
 import sqlite3
 import time
 import hashlib
+import base64
+import errno
+import heapq
+import itertools
+import queue
+import select
+import struct
 from multiprocessing import Pool, cpu_count
 from typing import Iterable, Tuple, Optional, Dict, Any, List
 
@@ -69,6 +76,7 @@ def init_db(conn: sqlite3.Connection) -> None:
         attributes TEXT,
         sha256 TEXT,
         md5 TEXT,
+        quickxorhash TEXT,
         path_length INTEGER,
         path_depth INTEGER,
         owner TEXT,
@@ -84,48 +92,149 @@ def init_db(conn: sqlite3.Connection) -> None:
     CREATE INDEX IF NOT EXISTS idx_files_scanned_at ON files(scanned_at_datetime);
     CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files(sha256);
     """)
+    # Databases created before the quickxorhash column existed
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(files)")}
+    if 'quickxorhash' not in columns:
+        cur.execute("ALTER TABLE files ADD COLUMN quickxorhash TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_files_quickxorhash ON files(quickxorhash)")
     conn.commit()
 
 
+def name_matches(name: str, include: Optional[str]=None, exclude: Optional[str]=None) -> bool:
+    if include and not fnmatch.fnmatch(name, include):
+        return False
+    if exclude and fnmatch.fnmatch(name, exclude):
+        return False
+    return True
+
+
 def iter_files(roots: Iterable[str], follow_symlinks: bool=False,
                include: Optional[str]=None, exclude: Optional[str]=None) -> Iterable[str]:
     for root in roots:
         for dirpath, dirnames, filenames in os.walk(root, followlinks=follow_symlinks):
             for name in filenames:
-                path = os.path.join(dirpath, name)
-                if include and not fnmatch.fnmatch(name, include):
+                if not name_matches(name, include, exclude):
                     continue
-                if exclude and fnmatch.fnmatch(name, exclude):
-                    continue
-                yield path
+                yield os.path.join(dirpath, name)
 
 
-def compute_sha256(path: str, block_size: int = 4 * 1024 * 1024) -> Optional[str]:
+class QuickXorHash:
+    """QuickXorHash as used by OneDrive/SharePoint (``file.hashes.quickXorHash``).
+
+    Every input byte is XORed into a 160-bit circular register at a rotation
+    of 11 bits per byte position, and the total length is XORed into the last
+    8 bytes. Bytes 160 positions apart share the same rotation, so instead of
+    looping per byte each block is loaded as one big integer and folded onto a
+    single 160-byte lane; only the 160 lane rotations remain in Python.
+    """
+
+    name = 'quickxor'
+    digest_size = 20
+    _WIDTH = 160
+    _SHIFT = 11
+    _MASK = (1 << 160) - 1
+    _SLICES = 16
+    # Fold masks depend only on the block size, so they are shared (bounded,
+    # the tail block of every file has its own size)
+    _fold_masks: Dict[int, int] = {}
+
+    def __init__(self, data: bytes = b'') -> None:
+        self._state = 0
+        self._length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data) -> None:
+        n = len(data)
+        if not n:
+            return
+        width = self._WIDTH
+        # First fold: XOR a few lane-aligned slices of the buffer straight
+        # from their bytes, then keep folding the upper half of the lanes onto
+        # the lower half until a single 160-byte lane is left. Every step is
+        # a C-level big-int operation.
+        lanes = -(-n // width)
+        step = -(-lanes // self._SLICES) * width
+        x = 0
+        for off in range(0, n, step):
+            x ^= int.from_bytes(data[off:off + step], 'little')
+        lanes = -(-min(step, n) // width)
+        while lanes > 1:
+            keep = (lanes + 1) // 2
+            bits = keep * width * 8
+            mask = self._fold_masks.get(bits)
+            if mask is None:
+                mask = (1 << bits) - 1
+                if len(self._fold_masks) < 256:
+                    self._fold_masks[bits] = mask
+            x = (x & mask) ^ (x >> bits)
+            lanes = keep
+        acc = 0
+        for col, b in enumerate(x.to_bytes(width, 'little')):
+            if b:
+                acc ^= b << ((col * self._SHIFT) % width)
+        acc = (acc & self._MASK) ^ (acc >> width)
+        # Rotate by the position of this block within the whole stream
+        rot = (self._length * self._SHIFT) % width
+        if rot:
+            acc = ((acc << rot) | (acc >> (width - rot))) & self._MASK
+        self._state ^= acc
+        self._length += n
+
+    def digest(self) -> bytes:
+        return (self._state ^ (self._length << 96)).to_bytes(self.digest_size, 'little')
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def b64digest(self) -> str:
+        """Base64 form, identical to what Graph reports as quickXorHash."""
+        return base64.b64encode(self.digest()).decode('ascii')
+
+
+# Digest name -> column in the `files` table
+DIGEST_COLUMNS = {'sha256': 'sha256', 'md5': 'md5', 'quickxor': 'quickxorhash'}
+DEFAULT_DIGESTS = ('sha256', 'md5')
+
+
+def compute_digests(path: str, digests: Iterable[str], block_size: int = 4 * 1024 * 1024) -> Dict[str, Optional[str]]:
+    """Compute all requested digests in a single read pass over the file.
+
+    Returns a mapping digest name -> value (hex for sha256/md5, base64 for
+    quickxor). All values are None if the file could not be read.
+    """
+    hashers: Dict[str, Any] = {}
+    for d in digests:
+        if d == 'quickxor':
+            hashers[d] = QuickXorHash()
+        else:
+            hashers[d] = hashlib.new(d)
     try:
-        h = hashlib.sha256()
-        with open(path, 'rb') as f:
+        buf = bytearray(block_size)
+        view = memoryview(buf)
+        with open(path, 'rb', buffering=0) as f:
             while True:
-                data = f.read(block_size)
-                if not data:
+                n = f.readinto(buf)
+                if not n:
                     break
-                h.update(data)
-        return h.hexdigest()
+                chunk = view[:n]
+                for h in hashers.values():
+                    h.update(chunk)
     except Exception:
-        return None
+        return {d: None for d in hashers}
+    return {d: (h.b64digest() if d == 'quickxor' else h.hexdigest()) for d, h in hashers.items()}
+
+
+def compute_sha256(path: str, block_size: int = 4 * 1024 * 1024) -> Optional[str]:
+    return compute_digests(path, ('sha256',), block_size)['sha256']
 
 
 def compute_md5(path: str, block_size: int = 4 * 1024 * 1024) -> Optional[str]:
-    try:
-        h = hashlib.md5()
-        with open(path, 'rb') as f:
-            while True:
-                data = f.read(block_size)
-                if not data:
-                    break
-                h.update(data)
-        return h.hexdigest()
-    except Exception:
-        return None
+    return compute_digests(path, ('md5',), block_size)['md5']
+
+
+def compute_quickxorhash(path: str, block_size: int = 4 * 1024 * 1024) -> Optional[str]:
+    return compute_digests(path, ('quickxor',), block_size)['quickxor']
 
 
 def unix_to_datetime(timestamp: float) -> str:
@@ -194,8 +303,8 @@ def get_windows_attributes(path: str) -> Tuple[bool, bool, bool, str]:
     return False, False, False, None
 
 
-def process_path(args: Tuple[str, bool]) -> Tuple[str, Dict[str, Any]]:
-    path, do_hash = args
+def process_path(args: Tuple[str, Tuple[str, ...]]) -> Tuple[str, Dict[str, Any]]:
+    path, digests = args
     try:
         st = os.stat(path)
         name = os.path.basename(path)
@@ -220,11 +329,9 @@ def process_path(args: Tuple[str, bool]) -> Tuple[str, Dict[str, Any]]:
         # Get file version (Windows only)
         file_version = get_file_version(path)
         
-        sha = None
-        md5_hash = None
-        if do_hash:
-            sha = compute_sha256(path)
-            md5_hash = compute_md5(path)
+        hashes: Dict[str, Optional[str]] = {}
+        if digests:
+            hashes = compute_digests(path, digests)
 
         scanned_at = time.time()
         
@@ -244,8 +351,9 @@ def process_path(args: Tuple[str, bool]) -> Tuple[str, Dict[str, Any]]:
             'is_system': int(is_system),
             'is_archive': int(is_archive),
             'attributes': attributes,
-            'sha256': sha,
-            'md5': md5_hash,
+            'sha256': hashes.get('sha256'),
+            'md5': hashes.get('md5'),
+            'quickxorhash': hashes.get('quickxor'),
             'path_length': path_length,
             'path_depth': path_depth,
             'owner': owner,
@@ -257,6 +365,79 @@ def process_path(args: Tuple[str, bool]) -> Tuple[str, Dict[str, Any]]:
         return path, {'error': True}
 
 
+def process_paths(args: Tuple[List[str], Tuple[str, ...]]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Pool task: process a group of files (see hash_in_pool)."""
+    paths, digests = args
+    return [process_path((p, digests)) for p in paths]
+
+
+def iter_file_entries(paths: Iterable[str]) -> Iterable[Tuple[str, int]]:
+    for p in paths:
+        try:
+            size = os.stat(p).st_size
+        except OSError:
+            size = 0
+        yield p, size
+
+
+def hash_in_pool(pool: Any, workers: int, entries: Iterable[Tuple[str, int]], digests: Tuple[str, ...],
+                 task_bytes: int, task_files: int, window: int) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Size-aware scheduling of the hash stage.
+
+    Fixed-count chunks put a 50 GB file and 63 tiny ones on the same worker.
+    Instead, files >= `task_bytes` become tasks of their own and smaller files
+    are packed into tasks of about `task_bytes` (at most `task_files` files).
+    Pending tasks wait in a heap ordered by bytes and are handed out largest
+    first, and only while the pool has capacity. That way huge files start
+    early and the run ends on small tasks instead of one long straggler.
+    At most `window` discovered files are held ahead of the workers.
+    """
+    results: queue.Queue = queue.Queue()
+    heap: List[Tuple[int, int, List[str]]] = []
+    seq = itertools.count()
+    entries = iter(entries)
+    exhausted = False
+    open_paths: List[str] = []
+    open_bytes = 0
+    in_window = 0
+    in_flight = 0
+
+    while True:
+        while not exhausted and in_window < window:
+            try:
+                path, size = next(entries)
+            except StopIteration:
+                exhausted = True
+                break
+            in_window += 1
+            if size >= task_bytes:
+                heapq.heappush(heap, (-size, next(seq), [path]))
+                continue
+            open_paths.append(path)
+            open_bytes += size
+            if open_bytes >= task_bytes or len(open_paths) >= task_files:
+                heapq.heappush(heap, (-open_bytes, next(seq), open_paths))
+                open_paths, open_bytes = [], 0
+        # Don't let workers idle on a half-filled pack
+        if open_paths and not heap:
+            heapq.heappush(heap, (-open_bytes, next(seq), open_paths))
+            open_paths, open_bytes = [], 0
+        while heap and in_flight < workers * 2:
+            _, _, paths = heapq.heappop(heap)
+            pool.apply_async(process_paths, ((paths, digests),), callback=results.put, error_callback=results.put)
+            in_flight += 1
+        if not in_flight:
+            if exhausted and not heap and not open_paths:
+                return
+            continue
+        done = results.get()
+        in_flight -= 1
+        if isinstance(done, BaseException):
+            raise done
+        in_window -= len(done)
+        yield from done
+
+
 def batched(iterable: Iterable, batch_size: int):
     batch = []
     for item in iterable:
@@ -293,6 +474,7 @@ def insert_batch(conn: sqlite3.Connection, rows: List[Tuple[str, Dict[str, Any]]
             meta['attributes'],
             meta['sha256'],
             meta.get('md5'),
+            meta.get('quickxorhash'),
             meta.get('path_length', 0),
             meta.get('path_depth', 0),
             meta.get('owner'),
@@ -306,8 +488,8 @@ def insert_batch(conn: sqlite3.Connection, rows: List[Tuple[str, Dict[str, Any]]
 
     cur.execute('BEGIN')
     cur.executemany('''
-        INSERT INTO files(path,name,dir,extension,size,mtime_unix,ctime_unix,atime_unix,mtime_datetime,ctime_datetime,atime_datetime,is_readonly,is_hidden,is_system,is_archive,attributes,sha256,md5,path_length,path_depth,owner,file_version,scanned_at_unix,scanned_at_datetime)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        INSERT INTO files(path,name,dir,extension,size,mtime_unix,ctime_unix,atime_unix,mtime_datetime,ctime_datetime,atime_datetime,is_readonly,is_hidden,is_system,is_archive,attributes,sha256,md5,quickxorhash,path_length,path_depth,owner,file_version,scanned_at_unix,scanned_at_datetime)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
         ON CONFLICT(path) DO UPDATE SET
           name=excluded.name,
           dir=excluded.dir,
@@ -326,6 +508,7 @@ def insert_batch(conn: sqlite3.Connection, rows: List[Tuple[str, Dict[str, Any]]
           attributes=excluded.attributes,
           sha256=excluded.sha256,
           md5=excluded.md5,
+          quickxorhash=excluded.quickxorhash,
           path_length=excluded.path_length,
           path_depth=excluded.path_depth,
           owner=excluded.owner,
@@ -362,6 +545,7 @@ def init_mssql(conn: Any) -> None:
             attributes NVARCHAR(4000),
             sha256 NVARCHAR(128),
             md5 NVARCHAR(64),
+            quickxorhash NVARCHAR(64),
             path_length INT,
             path_depth INT,
             owner NVARCHAR(512),
@@ -378,6 +562,13 @@ def init_mssql(conn: Any) -> None:
         CREATE INDEX idx_sha256 ON dbo.files(sha256);
     END
     """)
+    # Tables created before the quickxorhash column existed. Separate batches:
+    # T-SQL resolves columns at compile time.
+    cur.execute("IF COL_LENGTH('dbo.files', 'quickxorhash') IS NULL ALTER TABLE dbo.files ADD quickxorhash NVARCHAR(64);")
+    cur.execute("""
+    IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='idx_quickxorhash' AND object_id = OBJECT_ID('dbo.files'))
+        CREATE INDEX idx_quickxorhash ON dbo.files(quickxorhash);
+    """)
     conn.commit()
 
 
@@ -396,13 +587,13 @@ def insert_batch_mssql(conn: Any, rows: List[Tuple[str, Dict[str, Any]]]) -> Non
       mtime_unix = ?, ctime_unix = ?, atime_unix = ?,
       mtime_datetime = ?, ctime_datetime = ?, atime_datetime = ?,
       is_readonly = ?, is_hidden = ?, is_system = ?, is_archive = ?, attributes = ?, 
-      sha256 = ?, md5 = ?, path_length = ?, path_depth = ?, owner = ?, file_version = ?, 
+      sha256 = ?, md5 = ?, quickxorhash = ?, path_length = ?, path_depth = ?, owner = ?, file_version = ?, 
       scanned_at_unix = ?, scanned_at_datetime = ?
     WHERE path = ?
     """)
     insert_sql = ("""
-    INSERT INTO dbo.files(path,name,dir,extension,size,mtime_unix,ctime_unix,atime_unix,mtime_datetime,ctime_datetime,atime_datetime,is_readonly,is_hidden,is_system,is_archive,attributes,sha256,md5,path_length,path_depth,owner,file_version,scanned_at_unix,scanned_at_datetime)
-    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+    INSERT INTO dbo.files(path,name,dir,extension,size,mtime_unix,ctime_unix,atime_unix,mtime_datetime,ctime_datetime,atime_datetime,is_readonly,is_hidden,is_system,is_archive,attributes,sha256,md5,quickxorhash,path_length,path_depth,owner,file_version,scanned_at_unix,scanned_at_datetime)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
     """)
 
     try:
@@ -414,7 +605,7 @@ def insert_batch_mssql(conn: Any, rows: List[Tuple[str, Dict[str, Any]]]) -> Non
                 meta['mtime_unix'], meta['ctime_unix'], meta['atime_unix'],
                 meta.get('mtime_datetime'), meta.get('ctime_datetime'), meta.get('atime_datetime'),
                 meta['is_readonly'], meta.get('is_hidden', 0), meta.get('is_system', 0), meta.get('is_archive', 0),
-                meta['attributes'], meta['sha256'], meta.get('md5'), meta.get('path_length', 0), meta.get('path_depth', 0),
+                meta['attributes'], meta['sha256'], meta.get('md5'), meta.get('quickxorhash'), meta.get('path_length', 0), meta.get('path_depth', 0),
                 meta.get('owner'), meta.get('file_version'), meta['scanned_at_unix'], meta.get('scanned_at_datetime'), path
             )
             cur.execute(update_sql, params_update)
@@ -424,7 +615,7 @@ def insert_batch_mssql(conn: Any, rows: List[Tuple[str, Dict[str, Any]]]) -> Non
                     meta['mtime_unix'], meta['ctime_unix'], meta['atime_unix'],
                     meta.get('mtime_datetime'), meta.get('ctime_datetime'), meta.get('atime_datetime'),
                     meta['is_readonly'], meta.get('is_hidden', 0), meta.get('is_system', 0), meta.get('is_archive', 0),
-                    meta['attributes'], meta['sha256'], meta.get('md5'), meta.get('path_length', 0), meta.get('path_depth', 0),
+                    meta['attributes'], meta['sha256'], meta.get('md5'), meta.get('quickxorhash'), meta.get('path_length', 0), meta.get('path_depth', 0),
                     meta.get('owner'), meta.get('file_version'), meta['scanned_at_unix'], meta.get('scanned_at_datetime')
                 )
                 cur.execute(insert_sql, params_insert)
@@ -434,13 +625,301 @@ def insert_batch_mssql(conn: Any, rows: List[Tuple[str, Dict[str, Any]]]) -> Non
         raise
 
 
+def _tree_range(dirpath: str) -> Tuple[str, str]:
+    """Key range [lo, hi) covering every path below `dirpath` (index-friendly,
+    unlike LIKE which also has to escape wildcards)."""
+    prefix = dirpath.rstrip(os.sep) + os.sep
+    return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+
+def delete_paths(conn: Any, paths: List[str], table: str = 'files') -> None:
+    """Remove rows for files that no longer exist (SQLite or SQL Server)."""
+    if not paths:
+        return
+    cur = conn.cursor()
+    try:
+        cur.executemany(f'DELETE FROM {table} WHERE path = ?', [(p,) for p in paths])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def delete_tree(conn: Any, dirpath: str, table: str = 'files') -> None:
+    """Remove rows for every file below a deleted or moved-away directory."""
+    lo, hi = _tree_range(dirpath)
+    cur = conn.cursor()
+    try:
+        cur.execute(f'DELETE FROM {table} WHERE path >= ? AND path < ?', (lo, hi))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def load_tree_state(conn: Any, dirpath: str, table: str = 'files') -> Dict[str, Tuple[int, float]]:
+    """Return {path: (size, mtime_unix)} for all indexed files below `dirpath`."""
+    lo, hi = _tree_range(dirpath)
+    cur = conn.cursor()
+    cur.execute(f'SELECT path, size, mtime_unix FROM {table} WHERE path >= ? AND path < ?', (lo, hi))
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+
+# --- Watch mode (Linux inotify) -------------------------------------------
+# Constants from <sys/inotify.h>
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+
+class InotifyWatcher:
+    """Minimal ctypes wrapper around inotify for recursive directory watches.
+
+    inotify watches single directories, so every directory below the roots
+    gets its own watch. When fs.inotify.max_user_watches is exhausted the
+    affected directories are returned as "unwatched" so the caller can fall
+    back to periodic rescans for them.
+    """
+
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self) -> None:
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self._ctypes = ctypes
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f'inotify_init1 failed: {os.strerror(err)}')
+        self.wd_to_dir: Dict[int, str] = {}
+        self.dir_to_wd: Dict[str, int] = {}
+
+    def add_watch(self, dirpath: str) -> bool:
+        """Watch one directory. Returns False if the watch limit is reached
+        (or the directory vanished)."""
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dirpath), WATCH_MASK)
+        if wd < 0:
+            err = self._ctypes.get_errno()
+            if err not in (errno.ENOSPC, errno.ENOMEM, errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                raise OSError(err, f'inotify_add_watch failed for {dirpath}: {os.strerror(err)}')
+            return False
+        # Re-adding a moved directory returns its existing wd: update the path
+        old = self.wd_to_dir.get(wd)
+        if old is not None and self.dir_to_wd.get(old) == wd:
+            del self.dir_to_wd[old]
+        self.wd_to_dir[wd] = dirpath
+        self.dir_to_wd[dirpath] = wd
+        return True
+
+    def add_tree(self, root: str, follow_symlinks: bool = False) -> List[str]:
+        """Watch `root` and all directories below it; returns the directories
+        that could not be watched (their whole subtree needs rescans)."""
+        unwatched: List[str] = []
+        for dirpath, dirnames, _ in os.walk(root, followlinks=follow_symlinks):
+            if not self.add_watch(dirpath):
+                if os.path.isdir(dirpath):
+                    unwatched.append(dirpath)
+                dirnames[:] = []
+        return unwatched
+
+    def remove_tree(self, dirpath: str) -> None:
+        """Drop watches for a directory that moved away or was deleted."""
+        lo, hi = _tree_range(dirpath)
+        for d in [d for d in self.dir_to_wd if d == dirpath or lo <= d < hi]:
+            wd = self.dir_to_wd.pop(d)
+            self.wd_to_dir.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> List[Tuple[Optional[str], str, int]]:
+        """Wait up to `timeout` seconds; returns (dir, name, mask) tuples.
+        dir is None for events without a watch (e.g. IN_Q_OVERFLOW)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        off = 0
+        size = self._EVENT.size
+        while off + size <= len(data):
+            wd, mask, _cookie, name_len = self._EVENT.unpack_from(data, off)
+            name = os.fsdecode(data[off + size:off + size + name_len].rstrip(b'\0'))
+            off += size + name_len
+            if mask & IN_IGNORED:
+                d = self.wd_to_dir.pop(wd, None)
+                if d is not None and self.dir_to_wd.get(d) == wd:
+                    del self.dir_to_wd[d]
+                continue
+            events.append((self.wd_to_dir.get(wd), name, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class WatchIndexer:
+    """Applies coalesced inotify events to the `files` table.
+
+    Events are collected into a pending map (path -> upsert/delete, the last
+    event wins) and flushed as one batch once the tree has been quiet for
+    `debounce` seconds, the batch is full, or `max_delay` has passed since the
+    first pending event. Directories that could not be watched, and all roots
+    after a kernel queue overflow, are rescanned periodically.
+    """
+
+    def __init__(self, conn: Any, roots: List[str], args: Any, digests: Tuple[str, ...],
+                 insert_func, table: str):
+        self.conn = conn
+        self.roots = roots
+        self.args = args
+        self.digests = digests
+        self.insert_func = insert_func
+        self.table = table
+        self.watcher = InotifyWatcher()
+        self.pending: Dict[str, bool] = {}
+        self.gone_dirs: List[str] = []
+        self.unwatched: set = set()
+        self.first_pending: Optional[float] = None
+
+    def start(self) -> None:
+        for r in self.roots:
+            self.unwatched.update(self.watcher.add_tree(r, self.args.follow_symlinks))
+        print(f"Watching {len(self.watcher.dir_to_wd)} directories"
+              + (f" ({len(self.unwatched)} over the inotify watch limit, rescanned every {self.args.watch_rescan_interval}s)" if self.unwatched else ""))
+
+    def _queue_tree(self, dirpath: str) -> None:
+        # A directory created or moved in: watch it and index what is inside
+        self.unwatched.update(self.watcher.add_tree(dirpath, self.args.follow_symlinks))
+        for p in iter_files([dirpath], self.args.follow_symlinks, self.args.include, self.args.exclude):
+            self.pending[p] = True
+
+    def handle(self, events: List[Tuple[Optional[str], str, int]]) -> None:
+        for d, name, mask in events:
+            if mask & IN_Q_OVERFLOW:
+                print("inotify event queue overflowed; scheduling a rescan of all roots")
+                self.unwatched.update(self.roots)
+                continue
+            if d is None:
+                continue
+            path = os.path.join(d, name) if name else d
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._queue_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.watcher.remove_tree(path)
+                    self.gone_dirs.append(path)
+                    lo, hi = _tree_range(path)
+                    for p in [p for p in self.pending if lo <= p < hi]:
+                        del self.pending[p]
+            elif name:
+                if not name_matches(name, self.args.include, self.args.exclude):
+                    continue
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ATTRIB):
+                    self.pending[path] = True
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self.pending[path] = False
+            if self.first_pending is None and (self.pending or self.gone_dirs):
+                self.first_pending = time.time()
+
+    def flush(self) -> None:
+        for d in self.gone_dirs:
+            delete_tree(self.conn, d, self.table)
+        upserts = []
+        deletes = []
+        for p, exists in self.pending.items():
+            # re-check: the file may be gone again by the time we flush
+            if exists and os.path.isfile(p):
+                upserts.append(p)
+            else:
+                deletes.append(p)
+        for chunk in batched(upserts, self.args.batch_size):
+            self.insert_func(self.conn, [process_path((p, self.digests)) for p in chunk])
+        delete_paths(self.conn, deletes, self.table)
+        if upserts or deletes or self.gone_dirs:
+            print(f"Watch: upserted {len(upserts)}, deleted {len(deletes)} files, {len(self.gone_dirs)} directories removed")
+        self.pending = {}
+        self.gone_dirs = []
+        self.first_pending = None
+
+    def rescan(self) -> None:
+        """Full reconcile of directories without working watches."""
+        targets = sorted(self.unwatched)
+        # nested targets are covered by their parent
+        targets = [t for i, t in enumerate(targets) if not any(t.startswith(o.rstrip(os.sep) + os.sep) for o in targets[:i])]
+        self.unwatched = set()
+        for d in targets:
+            if not os.path.isdir(d):
+                delete_tree(self.conn, d, self.table)
+                continue
+            # watches may have been freed up in the meantime
+            self.unwatched.update(self.watcher.add_tree(d, self.args.follow_symlinks))
+            known = load_tree_state(self.conn, d, self.table)
+            changed = []
+            for p in iter_files([d], self.args.follow_symlinks, self.args.include, self.args.exclude):
+                prev = known.pop(p, None)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                if prev is None or prev[0] != st.st_size or prev[1] != st.st_mtime:
+                    changed.append(p)
+            for chunk in batched(changed, self.args.batch_size):
+                self.insert_func(self.conn, [process_path((p, self.digests)) for p in chunk])
+            delete_paths(self.conn, list(known), self.table)
+            print(f"Rescan {d}: upserted {len(changed)}, deleted {len(known)} files")
+
+    def run(self) -> None:
+        last_rescan = time.time()
+        try:
+            while True:
+                events = self.watcher.read_events(self.args.watch_debounce)
+                self.handle(events)
+                now = time.time()
+                if self.first_pending is not None and (
+                        not events
+                        or len(self.pending) >= self.args.batch_size
+                        or now - self.first_pending >= self.args.watch_max_delay):
+                    self.flush()
+                if self.unwatched and now - last_rescan >= self.args.watch_rescan_interval:
+                    self.rescan()
+                    last_rescan = now
+        except KeyboardInterrupt:
+            print("Watch mode stopped; flushing pending changes")
+            self.flush()
+        finally:
+            self.watcher.close()
+
+
 def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(description='File metadata scanner -> SQLite')
     parser.add_argument('--roots', '-r', required=True, nargs='+', help='Root directories to scan')
     parser.add_argument('--db', default='fileindex.db', help='SQLite DB file to write')
     parser.add_argument('--workers', '-w', type=int, default=max(1, cpu_count() - 1), help='Number of worker processes to compute hashes')
-    parser.add_argument('--hash', action='store_true', help='Compute SHA256 for each file (slow)')
+    parser.add_argument('--hash', action='store_true', help='Compute file digests (see --digests) for each file (slow)')
+    parser.add_argument('--digests', nargs='+', choices=sorted(DIGEST_COLUMNS), default=list(DEFAULT_DIGESTS),
+                        help='Digests computed with --hash, all in one read pass (default: sha256 md5). '
+                             'quickxor matches file.hashes.quickXorHash reported by SharePoint/OneDrive')
     parser.add_argument('--batch-size', type=int, default=500, help='DB batch size for inserts')
+    parser.add_argument('--task-mb', type=float, default=64, help='Hash scheduling: files of at least this size (MiB) are separate tasks, smaller files are packed up to it')
+    parser.add_argument('--task-files', type=int, default=256, help='Hash scheduling: max files per packed task')
+    parser.add_argument('--schedule-window', type=int, default=20000, help='Hash scheduling: discovered files held ahead of the workers for largest-first ordering')
     parser.add_argument('--follow-symlinks', action='store_true', help='Follow symlinks when walking')
     parser.add_argument('--include', help='Include file pattern (fnmatch)')
     parser.add_argument('--exclude', help='Exclude file pattern (fnmatch)')
@@ -450,8 +929,17 @@ def main(argv: Optional[List[str]] = None) -> int:
     parser.add_argument('--mssql-user', help='SQL user (omit for integrated auth)')
     parser.add_argument('--mssql-password', help='SQL password')
     parser.add_argument('--mssql-driver', default='ODBC Driver 17 for SQL Server', help='ODBC driver name')
+    # Continuous indexing (Linux only)
+    parser.add_argument('--watch', action='store_true', help='After the initial scan keep the DB current via inotify (Linux only)')
+    parser.add_argument('--watch-debounce', type=float, default=2.0, help='Seconds without events before pending changes are written')
+    parser.add_argument('--watch-max-delay', type=float, default=30.0, help='Maximum seconds changes are held back during continuous event storms')
+    parser.add_argument('--watch-rescan-interval', type=float, default=600.0, help='Seconds between rescans of directories beyond the inotify watch limit')
     args = parser.parse_args(argv)
 
+    if args.watch and not sys.platform.startswith('linux'):
+        print('--watch requires Linux (inotify).')
+        return 2
+
     roots = [os.path.abspath(r) for r in args.roots]
     dbpath = args.db
 
@@ -490,23 +978,33 @@ def main(argv: Optional[List[str]] = None) -> int:
         init_mssql(mssql_conn)
         insert_func = lambda c, rows: insert_batch_mssql(mssql_conn, rows)
         conn = mssql_conn
+        table = 'dbo.files'
     else:
         conn = sqlite3.connect(dbpath, timeout=30)
         init_db(conn)
         insert_func = lambda c, rows: insert_batch(conn, rows)
+        table = 'files'
 
     # Build generator of file paths
     files_iter = iter_files(roots, follow_symlinks=args.follow_symlinks, include=args.include, exclude=args.exclude)
 
     # We'll use a pool to process file metadata (and compute hash if requested)
     worker_count = args.workers if args.hash else 0
+    digests = tuple(dict.fromkeys(args.digests)) if args.hash else ()
+
+    # Register watches before the initial scan so changes made while it runs
+    # are not lost (they are replayed afterwards)
+    indexer = None
+    if args.watch:
+        indexer = WatchIndexer(conn, roots, args, digests, insert_func, table)
+        indexer.start()
 
     if args.hash and worker_count > 0:
         pool = Pool(processes=worker_count)
         try:
-            # Map file paths to worker input tuples
-            mapped = ( (p, True) for p in files_iter )
-            result_iter = pool.imap_unordered(process_path, mapped, chunksize=64)
+            result_iter = hash_in_pool(pool, worker_count, iter_file_entries(files_iter), digests,
+                                       task_bytes=int(args.task_mb * 1024 * 1024), task_files=args.task_files,
+                                       window=args.schedule_window)
 
             batch = []
             for res in result_iter:
@@ -522,10 +1020,10 @@ def main(argv: Optional[List[str]] = None) -> int:
             pool.close()
             pool.join()
     else:
-        # No hashing/workers requested; process inline for minimal overhead
+        # No workers requested; process inline for minimal overhead
         batch = []
         for p in files_iter:
-            path, meta = process_path((p, False))
+            path, meta = process_path((p, digests))
             batch.append((path, meta))
             if len(batch) >= args.batch_size:
                 insert_func(conn, batch)
@@ -535,6 +1033,9 @@ def main(argv: Optional[List[str]] = None) -> int:
             insert_func(conn, batch)
             print(f"Inserted final batch of {len(batch)} rows")
 
+    if indexer:
+        indexer.run()
+
     if mssql_conn:
         mssql_conn.close()
     else:
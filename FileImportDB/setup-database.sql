@@ -45,6 +45,7 @@ BEGIN
         attributes NVARCHAR(4000),
         sha256 NVARCHAR(128),
         md5 NVARCHAR(64),
+        quickxorhash NVARCHAR(64),
         path_length INT,
         path_depth INT,
         owner NVARCHAR(512),
@@ -57,12 +58,25 @@ BEGIN
         INDEX idx_mtime_datetime (mtime_datetime),
         INDEX idx_path_length (path_length),
         INDEX idx_scanned_at (scanned_at_datetime),
-        INDEX idx_sha256 (sha256)
+        INDEX idx_sha256 (sha256),
+        INDEX idx_quickxorhash (quickxorhash)
     );
     PRINT 'Table dbo.files created with extended metadata fields (Unix + DateTime).';
 END
 GO
 
+-- Existing tables from older setups: add the QuickXorHash column
+IF COL_LENGTH('dbo.files', 'quickxorhash') IS NULL
+BEGIN
+    ALTER TABLE dbo.files ADD quickxorhash NVARCHAR(64);
+    PRINT 'Column dbo.files.quickxorhash added.';
+END
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='idx_quickxorhash' AND object_id = OBJECT_ID('dbo.files'))
+    CREATE INDEX idx_quickxorhash ON dbo.files(quickxorhash);
+GO
+
 -- Grant permissions to current Windows user (if using integrated auth)
 -- Replace 'DOMAIN\Username' with your actual login name if needed
 -- Example: EXEC sp_grantdbaccess 'AzureAD\JoergBrors', 'JoergBrors';
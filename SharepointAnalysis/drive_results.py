@@ -0,0 +1,148 @@
+"""
+Shared helpers for Graph drive scan results.
+
+The scanners write `drive_analysis.json` (one JSON array) and the analysis
+scripts read it back. Loading the whole array with `json.load` needs memory
+proportional to the drive, so everything in here works item by item:
+
+- `open_text()` opens plain, gzip (.gz) or zstd (.zst) files
+- `iter_drive_items()` streams items from a JSON array or NDJSON file
+- `normalize_drive_path()` turns Graph paths into a comparable relative form
+
+Standard library only; zstd needs the optional `zstandard` package.
+"""
+from __future__ import annotations
+import gzip
+import io
+import json
+import unicodedata
+from typing import Any, Dict, IO, Iterator, Optional, Tuple
+
+try:
+    import zstandard  # type: ignore
+    _HAS_ZSTD = True
+except Exception:
+    zstandard = None  # type: ignore
+    _HAS_ZSTD = False
+
+
+def open_text(path: str, mode: str = "r") -> IO[str]:
+    """Open a text file for reading ("r") or writing ("w"), picking the
+    compression from the file extension (.gz, .zst)."""
+    lower = path.lower()
+    if lower.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    if lower.endswith(".zst"):
+        if not _HAS_ZSTD:
+            raise RuntimeError("zstandard is not installed. Install 'zstandard' to read or write .zst files.")
+        raw = open(path, mode + "b")
+        if mode == "r":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+
+def _iter_json_array(f: IO[str], chunk_size: int, buf: str = "") -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    pos = 0
+    eof = False
+    in_array = False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            ch = buf[pos]
+            if not in_array:
+                if ch != "[":
+                    raise ValueError("Expected a JSON array")
+                in_array = True
+                pos += 1
+                continue
+            if ch == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # element spans the end of the buffer: read more and retry
+                if eof:
+                    raise
+            else:
+                yield obj
+                pos = end
+                continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_drive_items(path: str, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Stream result items from a scan output file.
+
+    Accepts the JSON array written by `save_json()` as well as NDJSON (one
+    object per line), optionally gzip/zstd compressed.
+    """
+    with open_text(path, "r") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        if not head:
+            return
+        if head == "[":
+            yield from _iter_json_array(f, chunk_size, head)
+            return
+        first = head + f.readline()
+        if first.strip():
+            yield json.loads(first)
+        for ln in f:
+            if ln.strip():
+                yield json.loads(ln)
+
+
+def split_drive_path(path: Optional[str]) -> Tuple[str, str]:
+    """Split a result path into its drive prefix and the drive-relative path.
+
+    Results contain the Graph `parentReference.path` form, e.g.
+    `/drives/<id>/root:/Folder/file.txt` (graph_drive_scanner.py and the
+    PowerShell export) or `/drive/root:/Folder/file.txt`, or are already
+    drive-relative (`/Folder/file.txt`, prefix "")."""
+    if not path:
+        return "", ""
+    if path.startswith("/drive"):
+        idx = path.find("/root:")
+        if idx >= 0:
+            idx += len("/root:")
+            return path[:idx], path[idx:]
+    return "", path
+
+
+def graph_relative_path(path: Optional[str]) -> str:
+    """Strip the drive prefix from a result path (see split_drive_path)."""
+    return split_drive_path(path)[1]
+
+
+def normalize_drive_path(path: Optional[str], root: Optional[str] = None) -> Optional[str]:
+    """Normalise a local or SharePoint path for comparison.
+
+    Backslashes become forward slashes, unicode is NFC-normalised and case is
+    folded (SharePoint URLs are case-insensitive). If `root` is given the path
+    must lie below it and is made relative to it; otherwise None is returned.
+    """
+    if path is None:
+        return None
+    p = unicodedata.normalize("NFC", path.replace("\\", "/")).casefold().strip("/")
+    if root:
+        r = unicodedata.normalize("NFC", root.replace("\\", "/")).casefold().strip("/")
+        if r:
+            if p == r:
+                return ""
+            if not p.startswith(r + "/"):
+                return None
+            p = p[len(r) + 1:]
+    return p
+
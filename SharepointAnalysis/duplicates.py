@@ -0,0 +1,265 @@
+r"""
+Duplicate content analysis over Graph drive scan output
+
+Groups the files of one or more drive_analysis.json / NDJSON outputs by
+(size, quickXorHash) and reports:
+
+- duplicate_sets.csv      one row per copy of every duplicate set
+- wasted_by_folder.csv    bytes held by redundant copies, per folder
+- wasted_by_label.csv     the same per sensitivity label
+- cross_drive.csv         duplicate bytes shared between pairs of drives
+- summary.json            totals and the largest sets
+
+In every set the copy with the smallest (drive, path) counts as the
+original; all other copies are redundant ("wasted" bytes).
+
+Items are streamed into a hash index that keeps up to `--memory-items`
+records in memory. Beyond that the records are spilled to `--partitions`
+files on disk by hash of the key, and each partition is grouped on its own
+afterwards, so memory stays bounded for tens of millions of items.
+
+Usage (PowerShell example):
+  python .\SharepointAnalysis\duplicates.py .\SharepointAnalysis\output --output-dir .\SharepointAnalysis\output\duplicates
+  python .\SharepointAnalysis\duplicates.py siteA\drive_analysis.ndjson.gz=SiteA siteB\drive_analysis.json=SiteB
+
+An input may be a result file, a scanner output directory, or the output
+directory of a site-wide scan (with drives.json). `file=name` sets the
+drive name used in the reports.
+"""
+from __future__ import annotations
+import argparse
+import collections
+import csv
+import heapq
+import itertools
+import json
+import logging
+import os
+import posixpath
+import shutil
+import tempfile
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from drive_results import graph_relative_path, iter_drive_items
+from summarize_output import DEFAULT_NAMES, BoundedTopK
+
+LOG = logging.getLogger("duplicates")
+
+# (drive, path, label) of one copy
+Copy = Tuple[str, str, Optional[str]]
+# (size, quickXorHash)
+Key = Tuple[int, str]
+
+
+class SpillingHashIndex:
+    """Groups (key, record) pairs, spilling to partition files on disk once
+    more than `max_items` records are buffered."""
+
+    def __init__(self, max_items: int = 1000000, partitions: int = 64, work_dir: Optional[str] = None):
+        self.max_items = max_items
+        self.partitions = partitions
+        self.work_dir = work_dir
+        self.buffered = 0
+        self.total = 0
+        self.groups: Dict[Key, List[Copy]] = {}
+        self._dir: Optional[str] = None
+        self._files: List[Any] = []
+
+    def _partition(self, key: Key) -> int:
+        return zlib.crc32(f"{key[0]}:{key[1]}".encode("utf-8")) % self.partitions
+
+    def add(self, key: Key, copy: Copy):
+        self.groups.setdefault(key, []).append(copy)
+        self.buffered += 1
+        self.total += 1
+        if self.buffered >= self.max_items:
+            self.spill()
+
+    def spill(self):
+        if self._dir is None:
+            self._dir = tempfile.mkdtemp(prefix="duplicates-", dir=self.work_dir)
+            self._files = [open(os.path.join(self._dir, f"part-{i:04d}.ndjson"), "w", encoding="utf-8") for i in range(self.partitions)]
+            LOG.info(f"More than {self.max_items} items: spilling to {self.partitions} partitions in {self._dir}")
+        for key, copies in self.groups.items():
+            f = self._files[self._partition(key)]
+            for c in copies:
+                f.write(json.dumps([key[0], key[1], c[0], c[1], c[2]], ensure_ascii=False) + "\n")
+        self.groups = {}
+        self.buffered = 0
+
+    def iter_duplicates(self) -> Iterator[Tuple[Key, List[Copy]]]:
+        """Yield every key with more than one copy."""
+        if self._dir is None:
+            for key, copies in self.groups.items():
+                if len(copies) > 1:
+                    yield key, copies
+            return
+        self.spill()
+        for f in self._files:
+            f.close()
+        for i in range(self.partitions):
+            groups: Dict[Key, List[Copy]] = {}
+            with open(os.path.join(self._dir, f"part-{i:04d}.ndjson"), "r", encoding="utf-8") as f:
+                for ln in f:
+                    size, qxh, drive, path, label = json.loads(ln)
+                    groups.setdefault((size, qxh), []).append((drive, path, label))
+            for key, copies in groups.items():
+                if len(copies) > 1:
+                    yield key, copies
+
+    def close(self):
+        for f in self._files:
+            if not f.closed:
+                f.close()
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def resolve_inputs(specs: List[str]) -> List[Tuple[str, str]]:
+    """Turn command line inputs into (drive name, result file) pairs."""
+    inputs: List[Tuple[str, str]] = []
+    for spec in specs:
+        name = None
+        if "=" in spec and not os.path.exists(spec):
+            spec, name = spec.rsplit("=", 1)
+        if os.path.isdir(spec):
+            index = os.path.join(spec, "drives.json")
+            if os.path.exists(index):
+                # output of a site-wide scan: one partition per drive
+                with open(index, "r", encoding="utf-8") as f:
+                    for d in json.load(f):
+                        part = d.get("outputDir") or ""
+                        if not os.path.isdir(part):
+                            # index moved or copied from another machine
+                            part = os.path.join(spec, "drives", os.path.basename(part.rstrip("/\\")))
+                        found = find_result_file(part)
+                        if found and d.get("status", "ok") == "ok":
+                            inputs.append((d.get("name") or d.get("driveId"), found))
+                continue
+            found = find_result_file(spec)
+            if not found:
+                raise RuntimeError(f"No drive_analysis result file in {spec}")
+            inputs.append((name or os.path.basename(os.path.abspath(spec)), found))
+        else:
+            inputs.append((name or os.path.basename(os.path.dirname(os.path.abspath(spec))), spec))
+    return inputs
+
+
+def find_result_file(directory: str) -> Optional[str]:
+    found = [os.path.join(directory, n) for n in DEFAULT_NAMES if os.path.exists(os.path.join(directory, n))]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def folder_of(path: str, depth: int) -> str:
+    parts = [p for p in posixpath.dirname(path).split("/") if p]
+    return "/" + "/".join(parts[:depth] if depth > 0 else parts)
+
+
+def analyse(index: SpillingHashIndex, output_dir: str, folder_depth: int, capacity: int, top: int) -> Dict[str, Any]:
+    os.makedirs(output_dir, exist_ok=True)
+    folders = BoundedTopK(capacity)
+    labels: collections.Counter = collections.Counter()
+    pairs: Dict[Tuple[str, str], List[int]] = collections.defaultdict(lambda: [0, 0])
+    largest: List[Tuple[int, int, str, int]] = []
+    totals = {"sets": 0, "redundantCopies": 0, "wastedBytes": 0, "crossDriveSets": 0, "crossDriveWastedBytes": 0}
+    with open(os.path.join(output_dir, "duplicate_sets.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["setId", "quickXorHash", "size", "copies", "role", "drive", "path", "sensitivityLabelName"])
+        for set_id, (key, copies) in enumerate(index.iter_duplicates(), 1):
+            size, qxh = key
+            copies.sort()
+            wasted = size * (len(copies) - 1)
+            totals["sets"] += 1
+            totals["redundantCopies"] += len(copies) - 1
+            totals["wastedBytes"] += wasted
+            for i, (drive, path, label) in enumerate(copies):
+                w.writerow([set_id, qxh, size, len(copies), "original" if i == 0 else "copy", drive, path, label or ""])
+                if i > 0:
+                    folders.add(f"{drive}:{folder_of(path, folder_depth)}", (size, 1))
+                    labels[label or "(none)"] += size
+            drives = sorted({c[0] for c in copies})
+            if len(drives) > 1:
+                totals["crossDriveSets"] += 1
+                # redundant bytes outside the drive holding the original
+                totals["crossDriveWastedBytes"] += size * sum(1 for c in copies if c[0] != copies[0][0])
+                for a, b in itertools.combinations(drives, 2):
+                    pairs[(a, b)][0] += 1
+                    pairs[(a, b)][1] += size
+            item = (wasted, set_id, qxh, size)
+            if len(largest) < top:
+                heapq.heappush(largest, item)
+            else:
+                heapq.heappushpop(largest, item)
+
+    with open(os.path.join(output_dir, "wasted_by_folder.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        # wastedBytes may be over-counted by wastedBytesError once the table was pruned
+        w.writerow(["drive", "folder", "wastedBytes", "redundantCopies", "wastedBytesError"])
+        for key, (nbytes, n) in folders.top(len(folders.table)):
+            drive, folder = key.split(":", 1)
+            w.writerow([drive, folder, nbytes, n, folders.error(key)])
+    with open(os.path.join(output_dir, "wasted_by_label.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["sensitivityLabelName", "wastedBytes"])
+        for label, nbytes in labels.most_common():
+            w.writerow([label, nbytes])
+    with open(os.path.join(output_dir, "cross_drive.csv"), "w", encoding="utf-8", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["driveA", "driveB", "sharedSets", "bytesPerCopy"])
+        for (a, b), (n, nbytes) in sorted(pairs.items(), key=lambda kv: kv[1][1], reverse=True):
+            w.writerow([a, b, n, nbytes])
+
+    summary = dict(totals)
+    summary["items"] = index.total
+    summary["largestSets"] = [{"setId": sid, "quickXorHash": qxh, "size": size, "wastedBytes": wasted}
+                              for wasted, sid, qxh, size in sorted(largest, reverse=True)]
+    summary["folderTableApproximate"] = folders.pruned > 0
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Find duplicate files (size + quickXorHash) in Graph drive scan output")
+    p.add_argument("inputs", nargs="+", help="Result files or output directories, optionally as path=drivename")
+    p.add_argument("--output-dir", default=os.path.join(os.path.dirname(__file__), "output", "duplicates"))
+    p.add_argument("--memory-items", type=int, default=1000000, help="Items held in memory before the index spills to disk")
+    p.add_argument("--partitions", type=int, default=64, help="Number of spill partitions")
+    p.add_argument("--work-dir", help="Directory for spill files (default: system temp)")
+    p.add_argument("--folder-depth", type=int, default=0, help="Aggregate wasted bytes at this folder depth (0 = full folder path)")
+    p.add_argument("--capacity", type=int, default=100000, help="Folders tracked exactly in wasted_by_folder.csv")
+    p.add_argument("--include-empty", action="store_true", help="Also treat empty (0 byte) files as duplicates")
+    p.add_argument("--top", type=int, default=20, help="Largest sets listed in summary.json")
+    p.add_argument("--verbose", action="store_true")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    inputs = resolve_inputs(args.inputs)
+    index = SpillingHashIndex(args.memory_items, args.partitions, args.work_dir)
+    try:
+        for drive, path in inputs:
+            n = skipped = 0
+            for item in iter_drive_items(path):
+                qxh = item.get("quickXorHash")
+                size = int(item.get("size") or 0)
+                if item.get("isFolder") or not qxh or (size == 0 and not args.include_empty):
+                    skipped += 1
+                    continue
+                index.add((size, qxh), (drive, graph_relative_path(item.get("path")), item.get("sensitivityLabelName")))
+                n += 1
+            LOG.info(f"{drive}: {n} files indexed, {skipped} skipped (folders, no hash, empty): {path}")
+        summary = analyse(index, args.output_dir, args.folder_depth, args.capacity, args.top)
+    finally:
+        index.close()
+    LOG.info(f"{summary['sets']} duplicate sets, {summary['redundantCopies']} redundant copies, {summary['wastedBytes']} bytes wasted "
+             f"({summary['crossDriveSets']} sets span several drives)")
+    LOG.info(f"Reports written to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,183 @@
+r"""
+Benchmark harness for graph_drive_scanner.py against graph_emulator.py
+
+Starts the local Graph emulator with the given drive size, latency and
+throttling settings, then runs the scanner once per combination of the
+requested settings (concurrency, per-item vs $batch details, batched folder
+listing, pipelined traversal) and reports for every run:
+
+- wall time, time to the first result and files per second
+- HTTP requests seen by the emulator, 429s returned, $batch sub-requests
+- number of results written
+
+Results are printed as a table and written to <output-dir>/benchmark.json.
+
+Usage (PowerShell example):
+  python .\SharepointAnalysis\graph_benchmark.py --concurrency 4 8 16 --modes items batch --batch-traversal both --pipeline both --latency-ms 40 --throttle-rate 0.02
+
+Requires: aiohttp (for the emulator)
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Any, Dict, List
+
+LOG = logging.getLogger("graph_benchmark")
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# emulator options passed through unchanged
+EMULATOR_OPTIONS = ["drives", "folders_per_folder", "depth", "files_per_folder", "label_rate", "latency_ms",
+                    "latency_sigma", "throttle_rate", "batch_throttle_rate", "max_in_flight", "retry_after", "path_format", "seed"]
+
+
+def emulator_stats(base_url: str) -> Dict[str, int]:
+    with urllib.request.urlopen(base_url + "/_emulator/stats", timeout=10) as r:
+        return json.load(r)
+
+
+def start_emulator(args) -> subprocess.Popen:
+    cmd = [sys.executable, os.path.join(HERE, "graph_emulator.py"), "--host", args.host, "--port", str(args.port)]
+    for name in EMULATOR_OPTIONS:
+        cmd += ["--" + name.replace("_", "-"), str(getattr(args, name))]
+    proc = subprocess.Popen(cmd)
+    base_url = f"http://{args.host}:{args.port}"
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            emulator_stats(base_url)
+            return proc
+        except Exception:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                proc.kill()
+                raise RuntimeError("Graph emulator did not start")
+            time.sleep(0.2)
+
+
+def run_scanner(args, base_url: str, concurrency: int, mode: str, batch_traversal: bool, pipeline: bool, outdir: str) -> Dict[str, Any]:
+    cmd = [sys.executable, os.path.join(HERE, "graph_drive_scanner.py"),
+           "--graph-base-url", base_url, "--login-base-url", base_url,
+           "--tenant-id", "emulator", "--client-id", "emulator", "--client-secret", "emulator",
+           "--drive-id", args.drive_id, "--output-dir", outdir, "--concurrency", str(concurrency),
+           "--no-progress", "--progress-interval", "0", "--stream"]
+    if mode == "batch":
+        cmd += ["--use-batch", "--batch-size", str(args.batch_size)]
+    if batch_traversal:
+        cmd += ["--batch-traversal"]
+    if pipeline:
+        cmd += ["--pipeline"]
+    cmd += args.scanner_args
+    before = emulator_stats(base_url)
+    started = time.monotonic()
+    with open(os.path.join(outdir, "scanner.log"), "w", encoding="utf-8") as log:
+        rc = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.monotonic() - started
+    after = emulator_stats(base_url)
+    results = 0
+    ndjson = os.path.join(outdir, "drive_analysis.ndjson")
+    if os.path.exists(ndjson):
+        with open(ndjson, "r", encoding="utf-8") as f:
+            results = sum(1 for ln in f if ln.strip())
+    first_result = None
+    metrics = os.path.join(outdir, "graph_metrics.json")
+    if os.path.exists(metrics):
+        with open(metrics, "r", encoding="utf-8") as f:
+            first_result = json.load(f).get("firstResultSeconds")
+    return {
+        "concurrency": concurrency,
+        "mode": mode,
+        "batchTraversal": batch_traversal,
+        "pipeline": pipeline,
+        "exitCode": rc,
+        "seconds": round(elapsed, 2),
+        "firstResultSeconds": round(first_result, 2) if first_result is not None else None,
+        "results": results,
+        "filesPerSecond": round(results / elapsed, 1) if elapsed > 0 else 0.0,
+        "requests": after["requests"] - before["requests"],
+        "throttled": after["throttled"] - before["throttled"],
+        "batchSubrequests": after["batch_subrequests"] - before["batch_subrequests"],
+    }
+
+
+def print_table(rows: List[Dict[str, Any]]):
+    cols = ["concurrency", "mode", "batchTraversal", "pipeline", "seconds", "firstResultSeconds", "results", "filesPerSecond", "requests", "throttled", "batchSubrequests", "exitCode"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.rjust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in cols))
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Benchmark graph_drive_scanner.py against the local Graph emulator")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[4, 8, 16], help="Concurrency values to test")
+    p.add_argument("--modes", nargs="+", choices=["items", "batch"], default=["items", "batch"], help="File detail modes: per-item GETs and/or $batch")
+    p.add_argument("--batch-traversal", choices=["off", "on", "both"], default="off", help="Run with batched folder listing off, on or both")
+    p.add_argument("--pipeline", choices=["off", "on", "both"], default="off", help="Run with pipelined traversal and detail fetching off, on or both")
+    p.add_argument("--batch-size", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=1, help="Runs per combination")
+    p.add_argument("--output-dir", default=os.path.join(HERE, "output", "benchmark"))
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--drive-id", default="emu-drive-0")
+    # emulator settings (see graph_emulator.py --help)
+    p.add_argument("--drives", type=int, default=1)
+    p.add_argument("--folders-per-folder", type=int, default=5)
+    p.add_argument("--depth", type=int, default=3)
+    p.add_argument("--files-per-folder", type=int, default=20)
+    p.add_argument("--label-rate", type=float, default=0.3)
+    p.add_argument("--latency-ms", type=float, default=30.0)
+    p.add_argument("--latency-sigma", type=float, default=0.5)
+    p.add_argument("--throttle-rate", type=float, default=0.0)
+    p.add_argument("--batch-throttle-rate", type=float, default=0.0)
+    p.add_argument("--max-in-flight", type=int, default=0)
+    p.add_argument("--retry-after", type=float, default=1.0)
+    p.add_argument("--path-format", choices=["drives", "drive"], default="drives", help="parentReference.path form served by the emulator")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("scanner_args", nargs=argparse.REMAINDER, help="Extra scanner arguments after '--'")
+    args = p.parse_args(argv)
+    if args.scanner_args and args.scanner_args[0] == "--":
+        args.scanner_args = args.scanner_args[1:]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    switch = {"off": [False], "on": [True], "both": [False, True]}
+    traversal = switch[args.batch_traversal]
+    pipelines = switch[args.pipeline]
+    base_url = f"http://{args.host}:{args.port}"
+    proc = start_emulator(args)
+    rows: List[Dict[str, Any]] = []
+    try:
+        combos = list(itertools.product(args.concurrency, args.modes, traversal, pipelines, range(args.repeat)))
+        for n, (conc, mode, bt, pl, rep) in enumerate(combos, 1):
+            outdir = os.path.join(args.output_dir, f"c{conc}-{mode}-{'bt' if bt else 'lt'}{'-pl' if pl else ''}-{rep}")
+            os.makedirs(outdir, exist_ok=True)
+            for name in os.listdir(outdir):
+                if name.startswith("drive_analysis") or name == "graph_metrics.json":
+                    os.remove(os.path.join(outdir, name))
+            LOG.info(f"[{n}/{len(combos)}] concurrency={conc} details={mode} batch-traversal={bt} pipeline={pl}")
+            row = run_scanner(args, base_url, conc, mode, bt, pl, outdir)
+            if row["exitCode"] != 0:
+                LOG.warning(f"Scanner exited with {row['exitCode']}, see {os.path.join(outdir, 'scanner.log')}")
+            rows.append(row)
+    finally:
+        proc.terminate()
+        proc.wait()
+    print_table(rows)
+    report = {"emulator": {k: getattr(args, k) for k in EMULATOR_OPTIONS}, "runs": rows}
+    path = os.path.join(args.output_dir, "benchmark.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    LOG.info(f"Benchmark report: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,18 @@ Features:
 - Token caching and automatic refresh
 - Async HTTP using aiohttp with bounded concurrency
 - Retry/backoff and 429 handling (honors Retry-After)
-- Two-step approach: read folder structure first, then fetch file details in parallel
-- Sensitivity label extraction via listItem.fields (fallback to sensitivityLabel)
+- Shared adaptive (AIMD) concurrency limit with a global pause on Retry-After
+- Per-endpoint request metrics (latency histogram, statuses, retries, bytes) logged and written to graph_metrics.json
+- Two-step approach: read folder structure first (concurrent folder listing), then fetch file details in parallel
+- Optional pipelined mode: file details are fetched while the folders are still being listed (--pipeline)
+- Sensitivity label extraction via listItem.fields (fallback to sensitivityLabel); the working source is learned per drive
+- Label names resolved from the tenant label catalogue, cached on disk with a TTL (--label-cache-ttl)
 - Progress bar via tqdm
-- JSON/CSV export
+- JSON/CSV export, or streamed NDJSON/CSV output (optionally gzip/zstd) with --stream
+- SQLite result store with batched upserts (--sqlite-db)
+- Incremental rescans via the delta API (--incremental, deltaLink persisted per drive)
+- Site-wide scans: all document libraries of one or more sites concurrently (--site-drives)
+- Multi-process scans of one drive, split by top-level folders with a shared rate budget (--processes)
 
 Usage (PowerShell example):
   pwsh -NoProfile -Command "python .\SharepointAnalysis\graph_drive_scanner.py --tenant-id <tid> --client-id <cid> --client-secret <secret> --site-id <siteid> --drive-id <driveid> --concurrency 8 --output-dir .\SharepointAnalysis\output --export-json"
@@ -26,13 +34,23 @@ import json
 import logging
 import os
 import math
+import re
 from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta, timezone
 import asyncio
 import sys
 import signal
 import traceback
+import functools
 import getpass
+import heapq
+import multiprocessing
+import shutil
+from urllib.parse import urlsplit
+
+from drive_results import iter_drive_items, open_text, split_drive_path
+from result_store import DriveItemStore
+from scan_checkpoint import CheckpointSink, ScanCheckpoint
 # Optional Azure Key Vault support
 try:
     from azure.identity import DefaultAzureCredential  # type: ignore
@@ -159,141 +177,430 @@ def install_startup_diagnostics():
             pass
 
 
-# Install diagnostics early so we capture signals even if the run is short
-install_startup_diagnostics()
-
-# Asyncio-based live monitor queue. We create an asyncio.Queue that
-# worker coroutines put small update events into. The live display runs
-# as an async task in the main event loop (foreground) and renders a
-# concise status line when events arrive or periodically.
-LIVE_QUEUE: Optional[asyncio.Queue] = None
+# Install diagnostics early so we capture signals even if the run is short (script runs only:
+# importing the module, e.g. from tests, leaves the log alone)
+if __name__ == "__main__":
+    install_startup_diagnostics()
+
+# Live progress counters. Workers bump plain integer attributes of the
+# shared COUNTERS registry (no events, no allocation per item); the
+# LiveMonitor renders them on a fixed tick and can serve them as JSON on a
+# local HTTP status endpoint for headless runs.
+class ProgressCounters:
+    __slots__ = ("folders", "files", "details", "started", "first_result")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.folders = 0
+        self.files = 0
+        self.details = 0
+        self.started = time.monotonic()
+        # monotonic time of the first finished file detail
+        self.first_result: Optional[float] = None
+
+    def first_result_seconds(self) -> Optional[float]:
+        return round(self.first_result - self.started, 2) if self.first_result is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "folders": self.folders,
+            "files": self.files,
+            "details": self.details,
+            "elapsedSeconds": round(elapsed, 1),
+            "detailsPerSecond": round(self.details / elapsed, 1) if elapsed > 0 else 0.0,
+            "firstResultSeconds": self.first_result_seconds(),
+        }
 
 
-def set_live_queue(q: Optional[asyncio.Queue]):
-    global LIVE_QUEUE
-    LIVE_QUEUE = q
+COUNTERS = ProgressCounters()
 
 
 def monitor_set_initial(folders: int, files: int):
-    q = LIVE_QUEUE
-    if q is None:
-        return
-    try:
-        q.put_nowait({"type": "set_initial", "folders": int(folders), "files": int(files)})
-    except Exception:
-        pass
+    """Count the items known when a traversal (or resume) starts."""
+    COUNTERS.folders += folders
+    COUNTERS.files += files
 
 
 def monitor_add_folders(n: int = 1):
-    q = LIVE_QUEUE
-    if q is None:
-        return
-    try:
-        q.put_nowait({"type": "add_folders", "n": int(n)})
-    except Exception:
-        pass
+    COUNTERS.folders += n
 
 
 def monitor_add_files(n: int = 1):
-    q = LIVE_QUEUE
-    if q is None:
-        return
-    try:
-        q.put_nowait({"type": "add_files", "n": int(n)})
-    except Exception:
-        pass
+    COUNTERS.files += n
 
 
 def monitor_add_details(n: int = 1):
-    q = LIVE_QUEUE
-    if q is None:
-        return
-    try:
-        q.put_nowait({"type": "add_details", "n": int(n)})
-    except Exception:
-        pass
+    COUNTERS.details += n
+
+
+class LiveMonitor:
+    """Renders COUNTERS every `interval` seconds (with `show`) and serves
+    them on http://127.0.0.1:<status_port>/status (with a port). `extra`
+    returns additional fields for the status endpoint."""
+
+    def __init__(self, interval: float = 1.0, show: bool = True, status_port: int = 0, extra=None):
+        self.interval = interval
+        self.show = show
+        self.status_port = status_port
+        self.extra = extra
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._runner = None
+
+    async def start(self):
+        COUNTERS.reset()
+        if self.show:
+            self._task = asyncio.create_task(self._render_loop())
+        if self.status_port:
+            from aiohttp import web
+            app = web.Application()
+            app.router.add_get("/status", self._status)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, "127.0.0.1", self.status_port).start()
+            LOG.info(f"Status endpoint: http://127.0.0.1:{self.status_port}/status")
+
+    def status(self) -> Dict[str, Any]:
+        data = COUNTERS.snapshot()
+        if self.extra is not None:
+            try:
+                data.update(self.extra())
+            except Exception as ex:
+                data["error"] = str(ex)
+        return data
 
+    async def _status(self, request):
+        from aiohttp import web
+        return web.json_response(self.status())
 
-async def live_display_loop(queue: asyncio.Queue, interval: float = 1.0):
-    """Runs in the main event loop; consumes events from `queue` and
-    updates a single-line status display. Terminates when it receives a
-    `{'type':'stop'}` event.
-    """
-    folders = 0
-    files = 0
-    details = 0
-    last_print = 0.0
-    try:
-        # Use a small tqdm bar if available; otherwise fallback to carriage-return printing
+    async def _render_loop(self):
         try:
-            pbar = tqdm(total=0, desc="Live status", position=2)
-        except Exception:
-            pbar = None
-
-        while True:
+            # Use a small tqdm bar if available; otherwise fallback to printing a line
             try:
-                ev = await asyncio.wait_for(queue.get(), timeout=interval)
-            except asyncio.TimeoutError:
-                ev = None
+                pbar = tqdm(total=0, desc="Live status", position=2)
+            except Exception:
+                pbar = None
 
-            if ev:
-                et = ev.get("type")
-                if et == "stop":
-                    break
-                if et == "set_initial":
-                    folders = int(ev.get("folders", folders))
-                    files = int(ev.get("files", files))
-                elif et == "add_folders":
-                    folders += int(ev.get("n", 1))
-                elif et == "add_files":
-                    files += int(ev.get("n", 1))
-                elif et == "add_details":
-                    details += int(ev.get("n", 1))
-            # Immediate render on event (responsive) and periodic render
-            def _render():
-                desc = f"Folders: {folders} | Files: {files} | Details: {details}"
+            def _render(prefix: str = ""):
+                c = COUNTERS
+                desc = f"{prefix}Folders: {c.folders} | Files: {c.files} | Details: {c.details}"
                 try:
                     if pbar:
                         pbar.set_description(desc)
                         pbar.refresh()
                     else:
-                        # print a newline so it's visible even if carriage-return
                         print(desc, flush=True)
                 except Exception:
-                    try:
-                        print(desc, flush=True)
-                    except Exception:
-                        LOG.debug(desc)
+                    LOG.debug(desc)
 
-            # If we processed an event, render immediately
-            if ev is not None:
+            while not self._stop.is_set():
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
                 _render()
-                last_print = asyncio.get_event_loop().time()
-            else:
-                # Periodic render if no events
-                now = asyncio.get_event_loop().time()
-                if now - last_print >= interval:
-                    _render()
-                    last_print = now
-
-        # final render before exit
-        final = f"Done. Folders: {folders} | Files: {files} | Details: {details}"
-        try:
+            # final render before exit
+            _render("Done. ")
             if pbar:
-                pbar.set_description(final)
                 pbar.close()
                 print("", flush=True)
-            else:
-                print(final)
-        except Exception:
-            LOG.info(final)
-    except Exception as ex:
-        LOG.exception("Live display loop failed: %s", ex)
+        except Exception as ex:
+            LOG.exception("Live display loop failed: %s", ex)
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
 
 
+class GraphRequestError(RuntimeError):
+    """Raised by GraphClient.request when a request fails for good. `status`
+    holds the HTTP status code so callers can react (e.g. 410 on delta)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class SharedRateState:
+    """Throttling state shared by the processes of a sharded scan.
+
+    Holds the wall-clock time until which all processes pause (the latest
+    Retry-After seen by any of them) and a counter of throttling events, so
+    a 429 in one process also cuts the in-flight limit of the others.
+    """
+
+    def __init__(self, ctx):
+        self.pause_until = ctx.Value("d", 0.0)
+        self.throttle_events = ctx.Value("q", 0)
+
+
+class RateController:
+    """Client-wide AIMD limit on concurrent Graph requests.
+
+    Every request attempt holds a slot while it is on the wire. Healthy
+    responses grow the limit additively (about +1 per `limit` successes),
+    a 429 or 5xx cuts it multiplicatively (at most once per `cooldown`
+    seconds, so a burst of 429s from the same overload counts once) and a
+    Retry-After pauses all senders until it has passed. With `shared` the
+    pause and the cuts apply to all processes of a sharded scan.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease: float = 0.5, cooldown: float = 1.0, shared: Optional[SharedRateState] = None):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self.completed = 0
+        self.throttled = 0
+        self.server_errors = 0
+        self.paused_seconds = 0.0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+        self._sample = (time.monotonic(), 0)
+        self.shared = shared
+        self._seen_events = 0
+
+    def _sync_shared(self):
+        """Adopt pauses and limit cuts caused by other processes."""
+        wait = self.shared.pause_until.value - time.time()
+        if wait > 0:
+            self.pause_until = max(self.pause_until, time.monotonic() + wait)
+        events = self.shared.throttle_events.value
+        if events > self._seen_events:
+            self._seen_events = events
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                self._last_decrease = now
+
+    def _publish_throttle(self, retry_after: Optional[float]):
+        with self.shared.throttle_events.get_lock():
+            self.shared.throttle_events.value += 1
+            self._seen_events = self.shared.throttle_events.value
+        if retry_after:
+            with self.shared.pause_until.get_lock():
+                self.shared.pause_until.value = max(self.shared.pause_until.value, time.time() + retry_after)
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                if self.shared is not None:
+                    self._sync_shared()
+                now = time.monotonic()
+                if now < self.pause_until:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), self.pause_until - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    break
+                await self._cond.wait()
+            self.in_flight += 1
+
+    def _throttle(self, status: int, retry_after: Optional[float]):
+        now = time.monotonic()
+        if status == 429:
+            self.throttled += 1
+        else:
+            self.server_errors += 1
+        if now - self._last_decrease >= self.cooldown:
+            self.limit = max(float(self.min_limit), self.limit * self.decrease)
+            self._last_decrease = now
+        if retry_after:
+            until = now + retry_after
+            if until > self.pause_until:
+                self.paused_seconds += until - max(now, self.pause_until)
+                self.pause_until = until
+                LOG.info(f"Throttled: pausing all requests for {retry_after:.1f}s, in-flight limit now {self.limit:.1f}")
+        if self.shared is not None:
+            self._publish_throttle(retry_after)
+
+    async def release(self, status: Optional[int] = None, retry_after: Optional[float] = None):
+        async with self._cond:
+            self.in_flight -= 1
+            if status is not None and (status == 429 or status >= 500):
+                self._throttle(status, retry_after)
+            elif status is not None and status < 400:
+                self.completed += 1
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            free = int(self.limit) - self.in_flight
+            if free > 0:
+                self._cond.notify(free)
+
+    async def report(self, status: int, retry_after: Optional[float] = None):
+        """Throttling seen inside a successful response (429/5xx $batch
+        sub-responses): cut the limit and pause like a throttled request."""
+        async with self._cond:
+            self._throttle(status, retry_after)
+
+
+    def describe(self) -> str:
+        """Short status for progress logs: request rate since the last call, limit and throttling."""
+        now = time.monotonic()
+        t0, n0 = self._sample
+        rate = (self.completed - n0) / (now - t0) if now > t0 else 0.0
+        self._sample = (now, self.completed)
+        text = f"requests {rate:.1f}/s, in-flight limit {self.limit:.1f} ({self.in_flight} active), throttled {self.throttled}"
+        if self.pause_until > now:
+            text += f", paused {self.pause_until - now:.1f}s"
+        return text
+
+    def summary(self) -> str:
+        return (f"{self.completed} successful requests, {self.throttled} throttled (429), {self.server_errors} server errors, "
+                f"{self.paused_seconds:.1f}s paused, final in-flight limit {self.limit:.1f}/{self.max_limit}")
+
+
+async def report_batch_throttle(client: "GraphClient", responses: List[Dict[str, Any]]):
+    """Pass the worst 429/5xx sub-response of a $batch (and its largest
+    Retry-After) on to the client's rate controller, once per batch."""
+    if client.rate is None:
+        return
+    statuses = []
+    retry_after: Optional[float] = None
+    for r in responses:
+        try:
+            status = int(r.get("status") or 0)
+        except (TypeError, ValueError):
+            continue
+        if status == 429 or status >= 500:
+            statuses.append(status)
+            try:
+                ra = float((r.get("headers") or {}).get("Retry-After"))
+                retry_after = ra if retry_after is None else max(retry_after, ra)
+            except (TypeError, ValueError):
+                pass
+    if statuses:
+        await client.rate.report(429 if 429 in statuses else max(statuses), retry_after)
+
+
+class RequestMetrics:
+    """Per-endpoint statistics of the Graph requests made by one GraphClient.
+
+    Every HTTP attempt is classified by endpoint (children, item, listItem,
+    $batch, token, ...) and adds its latency to a fixed-bucket histogram,
+    its status code and the bytes received. Retries, the time slept before
+    them (Retry-After / backoff) and the time spent waiting for a rate
+    controller slot are totalled as well.
+    """
+
+    # upper bounds of the latency buckets in milliseconds; the last bucket is open
+    BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.endpoints: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def classify(url: str) -> str:
+        path = urlsplit(url).path
+        if "/oauth2/" in path:
+            return "token"
+        if path.endswith("/$batch"):
+            return "$batch"
+        for suffix, name in (("/children", "children"), ("/listItem", "listItem"), ("/delta", "delta"), ("/sensitivityLabels", "labels"), ("/drives", "drives")):
+            if path.endswith(suffix):
+                return name
+        if "/items/" in path or path.endswith("/root"):
+            return "item"
+        return "other"
+
+    def _entry(self, endpoint: str) -> Dict[str, Any]:
+        e = self.endpoints.get(endpoint)
+        if e is None:
+            e = self.endpoints[endpoint] = {
+                "requests": 0, "errors": 0, "statuses": {}, "latencyBuckets": [0] * (len(self.BUCKETS_MS) + 1),
+                "latencySeconds": 0.0, "maxLatencyMs": 0.0, "bytes": 0,
+                "retries": 0, "retrySleepSeconds": 0.0, "slotWaitSeconds": 0.0,
+            }
+        return e
+
+    def record(self, endpoint: str, status: Optional[int], seconds: float, nbytes: int = 0):
+        """One finished attempt; `status` None means a connection error."""
+        e = self._entry(endpoint)
+        e["requests"] += 1
+        if status is None:
+            e["errors"] += 1
+        else:
+            key = str(status)
+            e["statuses"][key] = e["statuses"].get(key, 0) + 1
+        ms = seconds * 1000.0
+        idx = 0
+        while idx < len(self.BUCKETS_MS) and ms > self.BUCKETS_MS[idx]:
+            idx += 1
+        e["latencyBuckets"][idx] += 1
+        e["latencySeconds"] += seconds
+        e["maxLatencyMs"] = max(e["maxLatencyMs"], ms)
+        e["bytes"] += nbytes
+
+    def retry(self, endpoint: str, sleep_seconds: float):
+        e = self._entry(endpoint)
+        e["retries"] += 1
+        e["retrySleepSeconds"] += sleep_seconds
+
+    def slot_wait(self, endpoint: str, seconds: float):
+        self._entry(endpoint)["slotWaitSeconds"] += seconds
+
+    def merge(self, data: Dict[str, Any]):
+        """Add the counters of another client's `to_dict()` (e.g. a shard process)."""
+        for name, d in data.get("endpoints", {}).items():
+            e = self._entry(name)
+            for key in ("requests", "errors", "latencySeconds", "bytes", "retries", "retrySleepSeconds", "slotWaitSeconds"):
+                e[key] += d.get(key, 0)
+            for key, n in d.get("statuses", {}).items():
+                e["statuses"][key] = e["statuses"].get(key, 0) + n
+            for idx, n in enumerate(d.get("latencyBuckets", [])[:len(e["latencyBuckets"])]):
+                e["latencyBuckets"][idx] += n
+            e["maxLatencyMs"] = max(e["maxLatencyMs"], d.get("maxLatencyMs", 0.0))
+
+    def percentile_ms(self, endpoint: str, q: float) -> float:
+        """Approximate latency percentile: upper bound of the bucket holding it
+        (capped at the maximum seen)."""
+        e = self.endpoints[endpoint]
+        target = q * sum(e["latencyBuckets"])
+        seen = 0
+        for idx, n in enumerate(e["latencyBuckets"]):
+            seen += n
+            if n and seen >= target:
+                return min(float(self.BUCKETS_MS[idx]), e["maxLatencyMs"]) if idx < len(self.BUCKETS_MS) else e["maxLatencyMs"]
+        return 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        endpoints = {}
+        for name, e in sorted(self.endpoints.items()):
+            d = dict(e)
+            d["latencyBucketsMs"] = self.BUCKETS_MS
+            d["meanLatencyMs"] = round(e["latencySeconds"] * 1000.0 / e["requests"], 1) if e["requests"] else 0.0
+            for q in (50, 90, 99):
+                d[f"p{q}LatencyMs"] = self.percentile_ms(name, q / 100.0) if e["requests"] else 0.0
+            endpoints[name] = d
+        return {"wallSeconds": round(time.monotonic() - self.started, 2), "endpoints": endpoints}
+
+    def summary(self) -> str:
+        """Table for the end-of-run log."""
+        lines = [f"{'endpoint':<10} {'requests':>8} {'p50ms':>7} {'p90ms':>7} {'p99ms':>7} {'maxms':>7} {'busy s':>8} {'retries':>7} {'sleep s':>8} {'wait s':>8} {'MB':>8}  statuses"]
+        for name, d in self.to_dict()["endpoints"].items():
+            statuses = ", ".join(f"{k}:{v}" for k, v in sorted(d["statuses"].items()))
+            if d["errors"]:
+                statuses += f", errors:{d['errors']}"
+            lines.append(f"{name:<10} {d['requests']:>8} {d['p50LatencyMs']:>7.0f} {d['p90LatencyMs']:>7.0f} {d['p99LatencyMs']:>7.0f} {d['maxLatencyMs']:>7.0f} "
+                         f"{d['latencySeconds']:>8.1f} {d['retries']:>7} {d['retrySleepSeconds']:>8.1f} {d['slotWaitSeconds']:>8.1f} {d['bytes'] / 1e6:>8.2f}  {statuses}")
+        return "\n".join(lines)
+
 
 class GraphClient:
-    def __init__(self, tenant_id: str, client_id: str, client_secret: str, session: aiohttp.ClientSession, use_beta: bool = False, max_retries: int = 6, fail_on_throttle: bool = False):
+    def __init__(self, tenant_id: str, client_id: str, client_secret: str, session: aiohttp.ClientSession, use_beta: bool = False, max_retries: int = 6, fail_on_throttle: bool = False, rate: Optional["RateController"] = None, graph_base_url: str = "https://graph.microsoft.com", login_base_url: str = "https://login.microsoftonline.com"):
         self.tenant_id = tenant_id
         self.client_id = client_id
         self.client_secret = client_secret
@@ -304,21 +611,34 @@ class GraphClient:
         self.lock = asyncio.Lock()
         self.max_retries = max_retries
         self.fail_on_throttle = fail_on_throttle
+        self.rate = rate
+        # overridable for the local emulator (graph_emulator.py)
+        self.graph_base_url = graph_base_url.rstrip("/")
+        self.login_base_url = login_base_url.rstrip("/")
+        self.metrics = RequestMetrics()
 
     async def _acquire_token(self) -> Tuple[str, int]:
-        url = f"https://login.microsoftonline.com/{self.tenant_id}/oauth2/v2.0/token"
+        url = f"{self.login_base_url}/{self.tenant_id}/oauth2/v2.0/token"
         data = {
             "client_id": self.client_id,
             "scope": "https://graph.microsoft.com/.default",
             "client_secret": self.client_secret,
             "grant_type": "client_credentials",
         }
-        async with self.session.post(url, data=data) as r:
-            if r.status != 200:
-                text = await r.text()
-                raise RuntimeError(f"Token request failed: {r.status} {text}")
-            resp = await r.json()
-            return resp["access_token"], int(resp.get("expires_in", 3600))
+        started = time.monotonic()
+        status: Optional[int] = None
+        nbytes = 0
+        try:
+            async with self.session.post(url, data=data) as r:
+                status = r.status
+                nbytes = len(await r.read())
+                if r.status != 200:
+                    text = await r.text()
+                    raise RuntimeError(f"Token request failed: {r.status} {text}")
+                resp = await r.json()
+                return resp["access_token"], int(resp.get("expires_in", 3600))
+        finally:
+            self.metrics.record("token", status, time.monotonic() - started, nbytes)
 
     async def ensure_token(self):
         async with self.lock:
@@ -330,54 +650,73 @@ class GraphClient:
                 self.token_expiry = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
 
     def api_base(self) -> str:
-        return "https://graph.microsoft.com/beta" if self.use_beta else "https://graph.microsoft.com/v1.0"
+        return f"{self.graph_base_url}/beta" if self.use_beta else f"{self.graph_base_url}/v1.0"
 
     async def request(self, method: str, url: str, **kwargs) -> Any:
-        # High-level request with retry/backoff and token refresh on 401
+        # High-level request with retry/backoff and token refresh on 401.
+        # With a rate controller every attempt holds one of its slots, and
+        # 429/5xx responses shrink the shared in-flight limit.
         attempt = 0
         backoff_base = 1.5
+        wait = 0.0
+        rate = self.rate
+        metrics = self.metrics
+        endpoint = metrics.classify(url)
         while True:
+            if wait > 0:
+                await asyncio.sleep(wait)
+                wait = 0.0
             await self.ensure_token()
             headers = kwargs.pop("headers", {}) or {}
             headers.setdefault("Authorization", f"Bearer {self.token}")
             headers.setdefault("Accept", "application/json")
+            status: Optional[int] = None
+            retry_after: Optional[float] = None
+            nbytes = 0
+            if rate is not None:
+                waited = time.monotonic()
+                await rate.acquire()
+                metrics.slot_wait(endpoint, time.monotonic() - waited)
+            started = time.monotonic()
             try:
                 async with self.session.request(method, url, headers=headers, **kwargs) as resp:
+                    status = resp.status
+                    # read the body here so its size and transfer time are measured
+                    nbytes = len(await resp.read())
                     if resp.status == 401 and attempt < self.max_retries:
                         LOG.info("401 received, forcing token refresh and retry")
                         # force refresh next time
                         async with self.lock:
                             self.token = None
                             self.token_expiry = datetime.utcfromtimestamp(0)
+                        metrics.retry(endpoint, 0.0)
                         attempt += 1
                         continue
 
                     if resp.status == 429 or 500 <= resp.status < 600:
-                        # Optionally fail fast instead of retrying when throttled
-                        if getattr(self, "fail_on_throttle", False):
-                            text = await resp.text()
-                            raise RuntimeError(f"Request failed {resp.status} and fail_on_throttle=True: {text}")
-                        if attempt >= self.max_retries:
-                            text = await resp.text()
-                            raise RuntimeError(f"Request failed {resp.status}: {text}")
                         # honor Retry-After if present
-                        retry_after = None
                         try:
                             ra = resp.headers.get("Retry-After")
                             if ra:
                                 retry_after = float(ra)
                         except Exception:
                             retry_after = None
-                        if retry_after is None:
-                            retry_after = math.pow(backoff_base, attempt + 1)
-                        LOG.warning(f"Request {url} returned {resp.status}. Sleeping {retry_after}s and retrying (attempt {attempt+1})")
-                        await asyncio.sleep(retry_after)
+                        # Optionally fail fast instead of retrying when throttled
+                        if getattr(self, "fail_on_throttle", False):
+                            text = await resp.text()
+                            raise GraphRequestError(resp.status, f"Request failed {resp.status} and fail_on_throttle=True: {text}")
+                        if attempt >= self.max_retries:
+                            text = await resp.text()
+                            raise GraphRequestError(resp.status, f"Request failed {resp.status}: {text}")
+                        wait = retry_after if retry_after is not None else math.pow(backoff_base, attempt + 1)
+                        LOG.warning(f"Request {url} returned {resp.status}. Sleeping {wait}s and retrying (attempt {attempt+1})")
+                        metrics.retry(endpoint, wait)
                         attempt += 1
                         continue
 
                     if resp.status >= 400:
                         text = await resp.text()
-                        raise RuntimeError(f"Request failed {resp.status}: {text}")
+                        raise GraphRequestError(resp.status, f"Request failed {resp.status}: {text}")
 
                     # success
                     # try json, fallback to text
@@ -390,8 +729,12 @@ class GraphClient:
                     raise
                 wait = math.pow(backoff_base, attempt + 1)
                 LOG.warning(f"HTTP error {ex}, sleeping {wait}s and retrying")
-                await asyncio.sleep(wait)
+                metrics.retry(endpoint, wait)
                 attempt += 1
+            finally:
+                metrics.record(endpoint, status, time.monotonic() - started, nbytes)
+                if rate is not None:
+                    await rate.release(status, retry_after)
 
 
 async def paged_get(client: GraphClient, url: str) -> List[Dict[str, Any]]:
@@ -409,7 +752,7 @@ async def paged_get(client: GraphClient, url: str) -> List[Dict[str, Any]]:
 
 async def list_drive_children(client: GraphClient, drive_id: str, page_size: int = 200, include_file: bool = True) -> List[Dict[str, Any]]:
     # include_file controls whether the 'file' facet is selected in the listing
-    base_select = "id,name,size,createdDateTime,lastModifiedDateTime,createdBy,lastModifiedBy,parentReference,folder"
+    base_select = "id,name,size,createdDateTime,lastModifiedDateTime,parentReference,folder"
     if include_file:
         select = base_select + ",file"
     else:
@@ -418,17 +761,92 @@ async def list_drive_children(client: GraphClient, drive_id: str, page_size: int
     return await paged_get(client, base)
 
 
-async def list_item_children(client: GraphClient, drive_id: str, item_id: str, page_size: int = 200, include_file: bool = True) -> List[Dict[str, Any]]:
-    base_select = "id,name,size,createdDateTime,lastModifiedDateTime,createdBy,lastModifiedBy,parentReference,folder"
+def children_url(client: GraphClient, drive_id: str, item_id: str, page_size: int = 200, include_file: bool = True, relative: bool = False) -> str:
+    base_select = "id,name,size,createdDateTime,lastModifiedDateTime,parentReference,folder"
     if include_file:
         select = base_select + ",file"
     else:
         select = base_select
-    base = f"{client.api_base()}/drives/{drive_id}/items/{item_id}/children?$select={select}&$top={page_size}"
-    return await paged_get(client, base)
+    url = f"/drives/{drive_id}/items/{item_id}/children?$select={select}&$top={page_size}"
+    # $batch sub-requests take URLs relative to the API version root
+    return url if relative else client.api_base() + url
+
+
+def relative_graph_url(client: GraphClient, url: str) -> str:
+    """Turn an absolute Graph URL (e.g. an @odata.nextLink) into the relative
+    form used inside $batch requests."""
+    base = client.api_base()
+    if url.startswith(base):
+        return url[len(base):]
+    parts = urlsplit(url)
+    path = parts.path
+    # drop the version segment (/v1.0, /beta)
+    idx = path.find("/", 1)
+    rel = path[idx:] if idx > 0 else path
+    return rel + ("?" + parts.query if parts.query else "")
+
+
+async def list_item_children(client: GraphClient, drive_id: str, item_id: str, page_size: int = 200, include_file: bool = True) -> List[Dict[str, Any]]:
+    return await paged_get(client, children_url(client, drive_id, item_id, page_size, include_file))
+
+
+@functools.lru_cache(maxsize=65536)
+def _parent_path(raw: str) -> str:
+    """parentReference.path without the drive root prefix, interned so that
+    all items of a folder share one string."""
+    return sys.intern(raw.replace("/drive/root:", "").rstrip("/"))
+
+
+class ItemRecord:
+    """Compact form of a discovered drive item: only the fields used after
+    the listing, with the parent path interned. The raw Graph JSON of a file
+    (identity blocks, facets, repeated parent paths) is dropped right after
+    its folder page is decoded."""
+
+    __slots__ = ("id", "name", "size", "is_folder", "parent_id", "parent_path", "quick_xor_hash", "created", "modified")
+
+    def __init__(self, id: str, name: str, size: int, is_folder: bool, parent_id: Optional[str], parent_path: Optional[str], quick_xor_hash: Optional[str], created: Optional[str], modified: Optional[str]):
+        self.id = id
+        self.name = name
+        self.size = size
+        self.is_folder = is_folder
+        self.parent_id = parent_id
+        self.parent_path = parent_path
+        self.quick_xor_hash = quick_xor_hash
+        self.created = created
+        self.modified = modified
+
+    @classmethod
+    def from_graph(cls, item: Dict[str, Any]) -> "ItemRecord":
+        pref = item.get("parentReference") or {}
+        raw = pref.get("path")
+        hashes = (item.get("file") or {}).get("hashes") or {}
+        return cls(item.get("id"), item.get("name", ""), item.get("size", 0), item.get("folder") is not None, pref.get("id"),
+                   _parent_path(raw) if raw else None, hashes.get("quickXorHash"), item.get("createdDateTime"), item.get("lastModifiedDateTime"))
+
+    @property
+    def path(self) -> str:
+        return self.name if self.parent_path is None else self.parent_path + "/" + self.name
+
+    def result(self) -> Dict[str, Any]:
+        """Result entry before the details (hash, label) are known."""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "path": self.path,
+            "size": self.size,
+            "isFolder": False,
+            "quickXorHash": None,
+            "sensitivityLabelId": None,
+            "sensitivityLabelName": None,
+            "createdDateTime": self.created,
+            "lastModifiedDateTime": self.modified,
+        }
 
 
 def build_path(item: Dict[str, Any]) -> str:
+    if isinstance(item, ItemRecord):
+        return item.path
     parent = item.get("parentReference", {}).get("path")
     if parent:
         trim = parent.replace("/drive/root:", "")
@@ -438,17 +856,41 @@ def build_path(item: Dict[str, Any]) -> str:
     return item.get("name", "")
 
 
-async def collect_folders_and_files(client: GraphClient, drive_id: str, page_size: int = 200, include_file: bool = True) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
-    """Collects items recursively but returns two lists: folders and files (minimal metadata)."""
-    folders: List[Dict[str, Any]] = []
-    files: List[Dict[str, Any]] = []
-    # BFS queue
-    queue = await list_drive_children(client, drive_id, page_size, include_file=include_file)
-    for item in queue:
-        if item.get("folder") is not None:
-            folders.append(item)
-        else:
-            files.append(item)
+async def collect_folders_and_files(client: GraphClient, drive_id: str, page_size: int = 200, include_file: bool = True, concurrency: int = 8, use_batch: bool = False, batch_size: int = 20, batch_linger: float = 0.05, checkpoint: Optional[ScanCheckpoint] = None, show_progress: bool = True, start_items: Optional[List[Dict[str, Any]]] = None, feed: Optional[FileFeed] = None) -> Tuple[List[ItemRecord], List[ItemRecord]]:
+    """Collects items recursively but returns two lists of ItemRecords: folders and files.
+    Up to `concurrency` folders are listed at the same time; with `use_batch`
+    up to `batch_size` children pages are fetched per $batch request.
+    With a `checkpoint` every listed page is recorded, and a checkpoint
+    holding an unfinished traversal is continued from its frontier.
+    `show_progress=False` hides the folder/file bars (concurrent drive scans).
+    `start_items` replaces the root listing (the part of a sharded scan
+    assigned to one process). With a `feed` every file is also handed to
+    the detail stage as soon as its folder page is listed."""
+    folders: List[ItemRecord] = []
+    files: List[ItemRecord] = []
+    # (folder, absolute nextLink or None for the first page) still to list
+    pending: List[Tuple[ItemRecord, Optional[str]]] = []
+    if checkpoint is not None and checkpoint.get("root_listed"):
+        raw_folders, raw_files, raw_pending = checkpoint.load_discovered()
+        folders = [ItemRecord.from_graph(f) for f in raw_folders]
+        files = [ItemRecord.from_graph(f) for f in raw_files]
+        pending = [(ItemRecord.from_graph(f), url) for f, url in raw_pending]
+        del raw_folders, raw_files, raw_pending
+        LOG.info(f"Resuming traversal: {len(folders)} folders and {len(files)} files known, {len(pending)} folders left to list")
+    else:
+        # BFS queue
+        queue = start_items if start_items is not None else await list_drive_children(client, drive_id, page_size, include_file=include_file)
+        for raw in queue:
+            item = ItemRecord.from_graph(raw)
+            if item.is_folder:
+                folders.append(item)
+                pending.append((item, None))
+            else:
+                files.append(item)
+                if feed is not None:
+                    feed.put(item)
+        if checkpoint is not None:
+            checkpoint.record_root(queue)
 
     # iterate folder queue with progress bars
     total_folders = len(folders)
@@ -457,17 +899,20 @@ async def collect_folders_and_files(client: GraphClient, drive_id: str, page_siz
     try:
         # Create progress bars with different colors and counts
         folder_pbar = tqdm(total=total_folders, desc=f"Folders ({total_folders})", 
-                          colour="blue", position=0, leave=True)
+                          colour="blue", position=0, leave=True, disable=not show_progress)
         file_pbar = tqdm(total=total_files, desc=f"Files ({total_files})", 
-                        colour="green", position=1, leave=True)
+                        colour="green", position=1, leave=True, disable=not show_progress)
     except:
         # Fallback if tqdm doesn't support color
-        folder_pbar = tqdm(total=total_folders, desc=f"Folders ({total_folders})", position=0)
-        file_pbar = tqdm(total=total_files, desc=f"Files ({total_files})", position=1)
+        folder_pbar = tqdm(total=total_folders, desc=f"Folders ({total_folders})", position=0, disable=not show_progress)
+        file_pbar = tqdm(total=total_files, desc=f"Files ({total_files})", position=1, disable=not show_progress)
     # Mark initially-discovered files as already counted on the file progress bar
     try:
         if total_files:
             file_pbar.update(total_files)
+        # folders already listed before a resume
+        if total_folders > len(pending):
+            folder_pbar.update(total_folders - len(pending))
     except Exception:
         pass
 
@@ -478,20 +923,37 @@ async def collect_folders_and_files(client: GraphClient, drive_id: str, page_siz
     except Exception:
         pass
     
-    idx = 0
-    while idx < len(folders):
-        folder = folders[idx]
-        children = await list_item_children(client, drive_id, folder["id"], page_size, include_file=include_file)
+    # Concurrent BFS: a fixed pool of workers shares the folder queue. Each
+    # worker lists one folder (all pages) and queues the subfolders it finds,
+    # so many folders are listed at once instead of one after another.
+    # With use_batch each queue entry is a single page request (first page or
+    # nextLink of a folder) and each worker packs up to batch_size of them
+    # into one $batch call. Entries are (folder, url, attempt); URLs are
+    # relative in batch mode and absolute otherwise.
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def _enqueue(folder: ItemRecord, next_url: Optional[str] = None):
+        url = next_url or children_url(client, drive_id, folder.id, page_size, include_file)
+        queue.put_nowait((folder, relative_graph_url(client, url) if use_batch else url, 0))
+
+    for f, next_url in pending:
+        _enqueue(f, next_url)
+
+    def _add_children(children: List[Dict[str, Any]]):
         new_folders = 0
         new_files = 0
-        for c in children:
-            if c.get("folder") is not None:
+        for raw in children:
+            c = ItemRecord.from_graph(raw)
+            if c.is_folder:
                 folders.append(c)
+                _enqueue(c)
                 new_folders += 1
             else:
                 files.append(c)
+                if feed is not None:
+                    feed.put(c)
                 new_files += 1
-        
+
         # Update progress bars and totals
         if new_folders > 0:
             folder_pbar.total = len(folders)
@@ -502,7 +964,7 @@ async def collect_folders_and_files(client: GraphClient, drive_id: str, page_siz
                 monitor_add_folders(new_folders)
             except Exception:
                 pass
-        
+
         if new_files > 0:
             file_pbar.total = len(files)
             file_pbar.set_description(f"Files ({len(files)})")
@@ -512,10 +974,107 @@ async def collect_folders_and_files(client: GraphClient, drive_id: str, page_siz
                 monitor_add_files(new_files)
             except Exception:
                 pass
-        
-        folder_pbar.update(1)
-        idx += 1
-    
+
+    async def _worker():
+        while True:
+            folder, url, _ = await queue.get()
+            try:
+                # page by page (as paged_get) so each page can be checkpointed
+                while url:
+                    resp = await client.request("GET", url)
+                    if not (isinstance(resp, dict) and "value" in resp):
+                        url = None
+                        children = []
+                    else:
+                        children = resp.get("value", [])
+                        url = resp.get("@odata.nextLink")
+                    _add_children(children)
+                    if checkpoint is not None:
+                        checkpoint.record_page(folder.id, children, url)
+                folder_pbar.update(1)
+            finally:
+                queue.task_done()
+
+    batches_in_flight = 0
+
+    async def _batch_worker():
+        nonlocal batches_in_flight
+        while True:
+            pages = [await queue.get()]
+            deadline = time.monotonic() + batch_linger
+            while len(pages) < batch_size:
+                try:
+                    pages.append(queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                # While other batches are running their results will queue
+                # more pages shortly: wait a little to send fuller batches.
+                wait = deadline - time.monotonic()
+                if batches_in_flight == 0 or wait <= 0:
+                    break
+                try:
+                    pages.append(await asyncio.wait_for(queue.get(), timeout=wait))
+                except asyncio.TimeoutError:
+                    break
+            batches_in_flight += 1
+            try:
+                reqs = [{"id": str(i), "method": "GET", "url": url} for i, (_, url, _) in enumerate(pages)]
+                resp = await client.request("POST", f"{client.api_base()}/$batch", json={"requests": reqs})
+                responses = resp.get("responses", []) if isinstance(resp, dict) else []
+                await report_batch_throttle(client, responses)
+                resp_map = {r.get("id"): r for r in responses}
+                retry: List[Tuple[ItemRecord, str, int]] = []
+                retry_after = 0.0
+                for i, (folder, url, attempt) in enumerate(pages):
+                    r = resp_map.get(str(i)) or {}
+                    status = int(r.get("status") or 0)
+                    body = r.get("body") if isinstance(r.get("body"), dict) else {}
+                    if 200 <= status < 300:
+                        children = body.get("value", [])
+                        _add_children(children)
+                        next_link = body.get("@odata.nextLink")
+                        if checkpoint is not None:
+                            checkpoint.record_page(folder.id, children, next_link)
+                        if next_link:
+                            _enqueue(folder, next_link)
+                        else:
+                            folder_pbar.update(1)
+                    elif (status == 429 or status >= 500 or status == 0) and attempt < client.max_retries:
+                        ra = None
+                        try:
+                            ra = float((r.get("headers") or {}).get("Retry-After"))
+                        except (TypeError, ValueError):
+                            pass
+                        retry_after = max(retry_after, ra if ra is not None else math.pow(1.5, attempt + 1))
+                        retry.append((folder, url, attempt + 1))
+                    else:
+                        raise GraphRequestError(status, f"Listing children of {folder.id} failed in $batch: {status} {body}")
+                if retry:
+                    LOG.warning(f"{len(retry)} folder listings throttled in $batch; retrying in {retry_after:.1f}s")
+                    await asyncio.sleep(retry_after)
+                    for page in retry:
+                        queue.put_nowait(page)
+            finally:
+                batches_in_flight -= 1
+                for _ in pages:
+                    queue.task_done()
+
+    workers = [asyncio.create_task(_batch_worker() if use_batch else _worker()) for _ in range(max(1, concurrency))]
+    join_task = asyncio.create_task(queue.join())
+    try:
+        # Finish when the queue is drained, or stop early if a worker failed
+        # (a failed listing would otherwise leave queue.join() waiting).
+        done, _ = await asyncio.wait([join_task, *workers], return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if t is not join_task:
+                t.result()
+    finally:
+        join_task.cancel()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(join_task, *workers, return_exceptions=True)
+
     # Close progress bars
     folder_pbar.close()
     file_pbar.close()
@@ -523,35 +1082,261 @@ async def collect_folders_and_files(client: GraphClient, drive_id: str, page_siz
     return folders, files
 
 
-async def fetch_file_detail(client: GraphClient, drive_id: str, item: Dict[str, Any], site_id: Optional[str], semaphore: asyncio.Semaphore, delay_ms: int = 0, no_per_item_get: bool = False) -> Dict[str, Any]:
-    """Fetch per-file details: file.hashes.quickXorHash and sensitivity label (via listItem.fields)."""
+# SharePoint columns holding the sensitivity label of a list item
+LABEL_ID_FIELD = "_IpLabelId"
+LABEL_NAME_FIELD = "_DisplayName"
+
+
+class LabelCatalog:
+    """Tenant sensitivity label definitions (id -> name), cached on disk.
+
+    The catalogue is read from /beta/security/informationProtection/sensitivityLabels
+    (application permission InformationProtectionPolicy.Read.All) once per run
+    and kept in `path` for `ttl_hours`. Per-item requests then only need the
+    label id. If the catalogue cannot be fetched, a stale cache is used, and
+    otherwise names fall back to what the per-item response carries.
+    """
+
+    def __init__(self, path: Optional[str], tenant_id: str, ttl_hours: float = 24.0):
+        self.path = path
+        self.tenant_id = tenant_id
+        self.ttl_hours = ttl_hours
+        self.names: Dict[str, str] = {}
+        self.fetched_at: Optional[float] = None
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except Exception as ex:
+            LOG.warning(f"Ignoring unreadable label catalogue cache {self.path}: {ex}")
+            return None
+        if cache.get("tenantId") != self.tenant_id or not isinstance(cache.get("labels"), dict):
+            return None
+        return cache
+
+    async def load(self, client: GraphClient):
+        cache = self._read_cache()
+        if cache is not None and time.time() - float(cache.get("fetchedAt") or 0) < self.ttl_hours * 3600:
+            self.names = cache["labels"]
+            self.fetched_at = float(cache["fetchedAt"])
+            LOG.info(f"Label catalogue: {len(self.names)} labels from cache {self.path}")
+            return
+        try:
+            names: Dict[str, str] = {}
+            url: Optional[str] = f"{client.graph_base_url}/beta/security/informationProtection/sensitivityLabels"
+            while url:
+                resp = await client.request("GET", url)
+                for label in resp.get("value", []):
+                    self._add(names, label)
+                url = resp.get("@odata.nextLink")
+        except Exception as ex:
+            if cache is not None:
+                self.names = cache["labels"]
+                self.fetched_at = float(cache.get("fetchedAt") or 0)
+                LOG.warning(f"Could not refresh the label catalogue ({ex}); using the expired cache {self.path}")
+            else:
+                LOG.warning(f"Could not read the label catalogue ({ex}); label names come from the item responses")
+            return
+        self.names = names
+        self.fetched_at = time.time()
+        LOG.info(f"Label catalogue: {len(names)} labels fetched")
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"tenantId": self.tenant_id, "fetchedAt": self.fetched_at, "labels": names}, f, indent=2, ensure_ascii=False)
+
+    def _add(self, names: Dict[str, str], label: Dict[str, Any]):
+        if label.get("id"):
+            names[label["id"]] = label.get("name") or label.get("displayName") or label["id"]
+        for sub in label.get("sublabels") or []:
+            self._add(names, sub)
+
+    def name(self, label_id: Optional[str], fallback: Optional[str] = None) -> Optional[str]:
+        if not label_id:
+            return fallback
+        return self.names.get(label_id) or fallback
+
+
+def set_label(client: GraphClient, result: Dict[str, Any], label_id: Optional[str], fallback_name: Optional[str] = None):
+    """Fill the label columns of `result`, resolving the name via the client's label catalogue."""
+    catalog: Optional[LabelCatalog] = getattr(client, "label_catalog", None)
+    result["sensitivityLabelId"] = label_id
+    result["sensitivityLabelName"] = catalog.name(label_id, fallback_name) if catalog is not None else fallback_name
+
+
+class LabelSourceSelector:
+    """Learns, per drive, which request returns sensitivity labels.
+
+    Label sources, in probing order:
+    - "listItem":         /drives/{d}/items/{id}/listItem?$expand=fields(_IpLabelId)
+    - "siteListItem":     /sites/{s}/drives/{d}/items/{id}/listItem?$expand=fields(_IpLabelId)
+    - "sensitivityLabel": /drives/{d}/items/{id}?$select=sensitivityLabel
+
+    While probing, every file tries the sources in order until one returns a
+    label (the original behaviour). Once a source has returned `min_hits`
+    labels it becomes the winner and files only use that request. If no
+    label shows up within `probe_limit` files, the first source that answers
+    without errors wins (or none, if all of them fail). Every
+    `reprobe_every` files one file is probed again; the scanner relearns when
+    another source finds a label the winner missed or the winner keeps failing.
+    """
+
+    SOURCES = ("listItem", "siteListItem", "sensitivityLabel")
+
+    def __init__(self, drive_id: str, min_hits: int = 3, probe_limit: int = 100, reprobe_every: int = 500, max_errors: int = 5):
+        self.drive_id = drive_id
+        self.min_hits = min_hits
+        self.probe_limit = probe_limit
+        self.reprobe_every = reprobe_every
+        self.max_errors = max_errors
+        self.reset()
+
+    def reset(self):
+        self.winner: Optional[str] = None
+        self.decided = False
+        self.probes = 0
+        self.since_probe = 0
+        self.winner_errors = 0
+        self.stats: Dict[str, Dict[str, int]] = {src: {"hit": 0, "empty": 0, "error": 0} for src in self.SOURCES}
+
+    def sources(self, has_site: bool) -> Tuple[List[str], bool]:
+        """Sources to try for the next file and whether this is a probe."""
+        avail = [src for src in self.SOURCES if has_site or src != "siteListItem"]
+        if self.decided:
+            self.since_probe += 1
+            if self.since_probe < self.reprobe_every:
+                return ([self.winner] if self.winner else []), False
+            self.since_probe = 0
+            if self.winner in avail:
+                # re-probe with the current winner first
+                avail.remove(self.winner)
+                avail.insert(0, self.winner)
+        return avail, True
+
+    def record(self, outcomes: Dict[str, str], probe: bool):
+        """Record per-source outcomes ("hit", "empty", "error") for one file."""
+        if not probe:
+            if self.winner and outcomes.get(self.winner) == "error":
+                self.winner_errors += 1
+                if self.winner_errors >= self.max_errors:
+                    LOG.info(f"Label source '{self.winner}' failed {self.winner_errors} times in a row on drive {self.drive_id}; probing again")
+                    self.reset()
+            else:
+                self.winner_errors = 0
+            return
+        self.probes += 1
+        for src, outcome in outcomes.items():
+            self.stats[src][outcome] += 1
+        if self.decided:
+            hit = next((src for src, o in outcomes.items() if o == "hit"), None)
+            if hit and hit != self.winner:
+                LOG.info(f"Label source '{hit}' returned a label that '{self.winner}' did not on drive {self.drive_id}; probing again")
+                self.reset()
+            return
+        for src in self.SOURCES:
+            if self.stats[src]["hit"] >= self.min_hits:
+                self._decide(src)
+                return
+        if self.probes >= self.probe_limit:
+            # No labels seen yet: keep one request that works, preferring a
+            # source with hits, then one that never failed.
+            ranked = [src for src in self.SOURCES if self.stats[src]["hit"]]
+            ranked += [src for src in self.SOURCES if self.stats[src]["empty"] and not self.stats[src]["error"]]
+            self._decide(ranked[0] if ranked else None)
+
+    def _decide(self, winner: Optional[str]):
+        self.winner = winner
+        self.decided = True
+        self.since_probe = 0
+        self.winner_errors = 0
+        LOG.info(f"Label source for drive {self.drive_id}: {winner or 'none (no source returns labels)'} after {self.probes} probed files {self.stats}")
+
+
+def label_selector(client: GraphClient, drive_id: str) -> Optional[LabelSourceSelector]:
+    """Per-drive LabelSourceSelector kept on the client (None if adaptive selection is disabled)."""
+    if not getattr(client, "adaptive_labels", True):
+        return None
+    selectors = getattr(client, "label_selectors", None)
+    if selectors is None:
+        selectors = {}
+        setattr(client, "label_selectors", selectors)
+    sel = selectors.get(drive_id)
+    if sel is None:
+        sel = LabelSourceSelector(drive_id, reprobe_every=getattr(client, "label_reprobe_every", 500))
+        selectors[drive_id] = sel
+    return sel
+
+
+async def fetch_label(client: GraphClient, source: str, drive_id: str, site_id: Optional[str], item_id: str, result: Dict[str, Any], with_file: bool = False) -> str:
+    """Query one label source and fill `result`. Returns "hit", "empty" or "error".
+    For "sensitivityLabel", `with_file` also selects file.hashes in the same request."""
+    api = client.api_base()
+    try:
+        if source == "sensitivityLabel":
+            select = "file,sensitivityLabel" if with_file else "sensitivityLabel"
+            resp = await client.request("GET", f"{api}/drives/{drive_id}/items/{item_id}?$select={select}")
+            if not isinstance(resp, dict):
+                return "empty"
+            ff = resp.get("file")
+            if with_file and isinstance(ff, dict):
+                hashes = ff.get("hashes")
+                if hashes and hashes.get("quickXorHash"):
+                    result["quickXorHash"] = hashes.get("quickXorHash")
+            sl = resp.get("sensitivityLabel")
+            if sl and sl.get("id"):
+                set_label(client, result, sl.get("id"), sl.get("name") or sl.get("displayName"))
+                return "hit"
+            return "empty"
+
+        # Only the label columns; the name column is needed only without a catalogue
+        catalog = getattr(client, "label_catalog", None)
+        columns = LABEL_ID_FIELD if catalog is not None and catalog.names else f"{LABEL_ID_FIELD},{LABEL_NAME_FIELD}"
+        if source == "siteListItem":
+            url = f"{api}/sites/{site_id}/drives/{drive_id}/items/{item_id}/listItem?$expand=fields($select={columns})"
+        else:
+            url = f"{api}/drives/{drive_id}/items/{item_id}/listItem?$expand=fields($select={columns})"
+        resp = await client.request("GET", url)
+        fields = resp.get("fields") if isinstance(resp, dict) else None
+        if fields and fields.get(LABEL_ID_FIELD):
+            set_label(client, result, fields[LABEL_ID_FIELD], fields.get(LABEL_NAME_FIELD))
+            return "hit"
+        return "empty"
+    except Exception as ex:
+        LOG.debug(f"Label source {source} failed for {item_id}: {ex}")
+        return "error"
+
+
+async def fetch_file_detail(client: GraphClient, drive_id: str, item: ItemRecord, site_id: Optional[str], semaphore: asyncio.Semaphore, delay_ms: int = 0, no_per_item_get: bool = False) -> Dict[str, Any]:
+    """Fetch per-file details: file.hashes.quickXorHash and sensitivity label (via listItem.fields).
+    The label request is chosen by the drive's LabelSourceSelector."""
     async with semaphore:
         if delay_ms > 0:
             await asyncio.sleep(delay_ms / 1000.0 * (0.5 + 0.5 * (os.getpid() % 5)))
-        result = {
-            "id": item.get("id"),
-            "name": item.get("name"),
-            "path": build_path(item),
-            "size": item.get("size", 0),
-            "isFolder": False,
-            "quickXorHash": None,
-            "sensitivityLabelId": None,
-            "sensitivityLabelName": None,
-            "createdDateTime": item.get("createdDateTime"),
-            "lastModifiedDateTime": item.get("lastModifiedDateTime"),
-        }
+        result = item.result()
+        # Use file.hashes from the listing if present
+        result["quickXorHash"] = item.quick_xor_hash
 
-        # Try to use existing file.hashes from listing
-        file_facet = item.get("file")
-        if file_facet and isinstance(file_facet, dict):
-            hashes = file_facet.get("hashes")
-            if hashes and hashes.get("quickXorHash"):
-                result["quickXorHash"] = hashes.get("quickXorHash")
+        selector = label_selector(client, drive_id)
+        if selector is not None:
+            sources, probe = selector.sources(bool(site_id))
+        else:
+            sources, probe = [src for src in LabelSourceSelector.SOURCES if site_id or src != "siteListItem"], False
+        need_hash = not result["quickXorHash"] and not no_per_item_get
+
+        # Winner is the item's sensitivityLabel: fetch hash and label in one request
+        if need_hash and not probe and sources == ["sensitivityLabel"]:
+            outcome = await fetch_label(client, "sensitivityLabel", drive_id, site_id, item.id, result, with_file=True)
+            if selector is not None:
+                selector.record({"sensitivityLabel": outcome}, probe)
+            return result
 
         # If missing, request item with file select (unless disabled)
-        if not result["quickXorHash"] and not no_per_item_get:
+        if need_hash:
             try:
-                url = f"{client.api_base()}/drives/{drive_id}/items/{item['id']}?$select=file"
+                url = f"{client.api_base()}/drives/{drive_id}/items/{item.id}?$select=file"
                 resp = await client.request("GET", url)
                 if resp and isinstance(resp, dict):
                     ff = resp.get("file")
@@ -560,58 +1345,116 @@ async def fetch_file_detail(client: GraphClient, drive_id: str, item: Dict[str,
                         if hashes and hashes.get("quickXorHash"):
                             result["quickXorHash"] = hashes.get("quickXorHash")
             except Exception as ex:
-                LOG.debug(f"Could not fetch file.hashes for {item['id']}: {ex}")
+                LOG.debug(f"Could not fetch file.hashes for {item.id}: {ex}")
 
-        # Sensitivity label: try listItem?expand=fields (drives-based), then fallback to drive item sensitivityLabel
-        if site_id:
-            list_urls = [f"{client.api_base()}/drives/{drive_id}/items/{item['id']}/listItem?$expand=fields",
-                         f"{client.api_base()}/sites/{site_id}/drives/{drive_id}/items/{item['id']}/listItem?$expand=fields"]
-        else:
-            list_urls = [f"{client.api_base()}/drives/{drive_id}/items/{item['id']}/listItem?$expand=fields"]
+        # Sensitivity label: try the sources in order until one returns a label
+        outcomes: Dict[str, str] = {}
+        for src in sources:
+            outcomes[src] = await fetch_label(client, src, drive_id, site_id, item.id, result)
+            if outcomes[src] == "hit":
+                break
+        if selector is not None:
+            selector.record(outcomes, probe)
 
-        label_found = False
-        for lu in list_urls:
-            try:
-                resp = await client.request("GET", lu)
-                fields = resp.get("fields") if isinstance(resp, dict) else None
-                if fields:
-                    # search likely property names
-                    for k, v in fields.items():
-                        if not v:
-                            continue
-                        if k.lower().endswith("id") and ("compliance" in k.lower() or "label" in k.lower()):
-                            result["sensitivityLabelId"] = v
-                        if ("label" in k.lower() or "compliance" in k.lower() or k.lower().endswith("displayname") or k.lower().endswith("display_name")):
-                            if not result.get("sensitivityLabelName"):
-                                result["sensitivityLabelName"] = v
-                    if result.get("sensitivityLabelId") or result.get("sensitivityLabelName"):
-                        label_found = True
-                        break
-            except Exception:
-                continue
+        return result
 
-        if not label_found:
-            try:
-                url = f"{client.api_base()}/drives/{drive_id}/items/{item['id']}?$select=sensitivityLabel"
-                resp = await client.request("GET", url)
-                if resp and isinstance(resp, dict) and resp.get("sensitivityLabel"):
-                    sl = resp.get("sensitivityLabel")
-                    result["sensitivityLabelId"] = sl.get("id")
-                    result["sensitivityLabelName"] = sl.get("name") or sl.get("displayName") or sl.get("label")
-            except Exception:
-                pass
 
-        return result
+
+_WORKERS_DONE = object()
+
+
+class FileFeed:
+    """Files handed from the traversal to the detail stage while the drive
+    is still being listed (--pipeline). An async iterable that ends after
+    close(); unlike an async generator, a cancelled wait for the next item
+    (asyncio.wait_for) loses nothing."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    def put(self, item: ItemRecord):
+        self.queue.put_nowait(item)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.queue.put_nowait(_WORKERS_DONE)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> ItemRecord:
+        it = await self.queue.get()
+        if it is _WORKERS_DONE:
+            # keep the end marker for further readers
+            self.queue.put_nowait(_WORKERS_DONE)
+            raise StopAsyncIteration
+        return it
+
+
+async def iter_items(items):
+    """Iterate a list/iterable or an async iterable in the same way."""
+    if hasattr(items, "__aiter__"):
+        async for it in items:
+            yield it
+    else:
+        for it in items:
+            yield it
+
+
+async def iter_chunks(items, size: int):
+    chunk: List[Any] = []
+    async for it in iter_items(items):
+        chunk.append(it)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
+async def run_worker_pool(items, handler, workers: int, queue_size: int = 0):
+    """Run `handler(item)` for every item of `items` (iterable or async
+    iterable) on a fixed number of worker coroutines.
 
-async def gather_file_details(client: GraphClient, drive_id: str, files: List[Dict[str, Any]], site_id: Optional[str], concurrency: int, delay_ms: int, show_progress: bool, no_per_item_get: bool = False) -> List[Dict[str, Any]]:
+    A producer feeds a bounded asyncio.Queue, so the number of pending
+    objects stays at about `queue_size` regardless of how many items there
+    are. The first handler exception cancels the pool and is re-raised.
+    """
+    workers = max(1, workers)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or workers * 2)
+
+    async def _producer():
+        async for it in iter_items(items):
+            await queue.put(it)
+        for _ in range(workers):
+            await queue.put(_WORKERS_DONE)
+
+    async def _worker():
+        while True:
+            it = await queue.get()
+            if it is _WORKERS_DONE:
+                return
+            await handler(it)
+
+    tasks = [asyncio.create_task(_producer())] + [asyncio.create_task(_worker()) for _ in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def gather_file_details(client: GraphClient, drive_id: str, files: List[ItemRecord], site_id: Optional[str], concurrency: int, delay_ms: int, show_progress: bool, no_per_item_get: bool = False, sink: Optional["ResultSink"] = None) -> List[Dict[str, Any]]:
+    """Fetch details for `files` (list or async iterable) on `concurrency`
+    workers. Results are returned as a list, or handed to `sink` as they
+    complete (the returned list is then empty)."""
     sem = asyncio.Semaphore(concurrency)
-    tasks = []
     results: List[Dict[str, Any]] = []
 
-    it = files
-    total = len(it)
+    total = len(files) if hasattr(files, "__len__") else None
     if show_progress:
         pbar = tqdm(total=total, desc="Files")
     else:
@@ -628,28 +1471,34 @@ async def gather_file_details(client: GraphClient, drive_id: str, files: List[Di
     async def progress_reporter():
         start = time.time()
         while not progress_done.is_set():
-            await asyncio.sleep(progress_interval)
+            try:
+                await asyncio.wait_for(progress_done.wait(), timeout=progress_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
             now = time.time()
             elapsed = now - start
             rate = (completed / elapsed) if elapsed > 0 else 0.0
-            remaining = max(0, total - completed)
-            eta = int(remaining / rate) if rate > 0 else None
+            remaining = max(0, total - completed) if total is not None else 0
+            eta = int(remaining / rate) if rate > 0 and total is not None else None
+            limiter = f"; {client.rate.describe()}" if client.rate is not None else ""
             if eta is not None:
-                LOG.info(f"Processed {completed}/{total} files; rate {rate:.2f}/s; ETA {eta}s")
+                LOG.info(f"Processed {completed}/{total} files; rate {rate:.2f}/s; ETA {eta}s{limiter}")
             else:
-                LOG.info(f"Processed {completed}/{total} files; rate {rate:.2f}/s")
+                LOG.info(f"Processed {completed}/{total if total is not None else '?'} files; rate {rate:.2f}/s{limiter}")
 
     async def _wrap(item):
         nonlocal completed
         try:
             r = await fetch_file_detail(client, drive_id, item, site_id, sem, delay_ms, no_per_item_get=no_per_item_get)
-            results.append(r)
+            if sink is not None:
+                await sink.put(r)
+            else:
+                results.append(r)
         finally:
-            # update monitor for each processed detail
-            try:
-                monitor_add_details(1)
-            except Exception:
-                pass
+            if COUNTERS.first_result is None:
+                COUNTERS.first_result = time.monotonic()
+            COUNTERS.details += 1
             completed += 1
             if pbar:
                 pbar.update(1)
@@ -658,14 +1507,12 @@ async def gather_file_details(client: GraphClient, drive_id: str, files: List[Di
     if progress_interval and progress_interval > 0:
         reporter_task = asyncio.create_task(progress_reporter())
 
-    for item in it:
-        tasks.append(asyncio.create_task(_wrap(item)))
-
-    # wait with concurrency controls
-    await asyncio.gather(*tasks)
-
-    # finish reporter
-    progress_done.set()
+    # fixed set of workers pulling from a bounded queue
+    try:
+        await run_worker_pool(files, _wrap, concurrency)
+    finally:
+        # finish reporter
+        progress_done.set()
     if reporter_task:
         try:
             await reporter_task
@@ -677,111 +1524,440 @@ async def gather_file_details(client: GraphClient, drive_id: str, files: List[Di
     return results
 
 
-async def batch_gather_file_details(client: GraphClient, drive_id: str, files: List[Dict[str, Any]], site_id: Optional[str], batch_size: int, concurrency: int, delay_ms: int, show_progress: bool) -> List[Dict[str, Any]]:
+async def batch_gather_file_details(client: GraphClient, drive_id: str, files: List[ItemRecord], site_id: Optional[str], batch_size: int, concurrency: int, delay_ms: int, show_progress: bool, sink: Optional["ResultSink"] = None, batch_linger: float = 0.05) -> List[Dict[str, Any]]:
     """Use Graph $batch endpoint to fetch per-item details in batches.
     This sends one GET per item requesting `file` and `sensitivityLabel`.
     Batch size should be <= 20 (Graph limit for requests per batch).
+    With a `sink`, results are streamed to it instead of being returned.
+    `files` may be a list or an async iterable; batches are processed by
+    `concurrency` workers fed from a bounded queue.
+
+    Sub-requests answered with 429/5xx (or missing from the response) wait
+    for their own Retry-After and are packed into later batches together
+    with fresh items; a failed $batch POST retries all of its items the
+    same way. The throttling of each batch is also reported to the rate
+    controller (limit cut, largest Retry-After as a global pause). Items
+    still failing after `client.max_retries` attempts are fetched with
+    per-item GETs.
     """
     sem = asyncio.Semaphore(concurrency)
+    fallback_sem = asyncio.Semaphore(concurrency)
     results: List[Dict[str, Any]] = []
-    total = len(files)
+    total = len(files) if hasattr(files, "__len__") else None
     if show_progress:
         pbar = tqdm(total=total, desc="Files(batch)")
     else:
         pbar = None
-
-    # chunk items into batches of batch_size
-    batches = [files[i:i+batch_size] for i in range(0, total, batch_size)]
-
-    async def _process_batch(batch_items: List[Dict[str, Any]]):
-        async with sem:
-            if delay_ms > 0:
-                await asyncio.sleep(delay_ms / 1000.0)
-            # build batch body
-            reqs = []
-            for idx, it in enumerate(batch_items):
-                # request item selecting file and sensitivityLabel
-                url = f"/drives/{drive_id}/items/{it['id']}?$select=file,sensitivityLabel"
-                reqs.append({"id": it['id'], "method": "GET", "url": url})
-
-            body = {"requests": reqs}
+    # items waiting for a retry: (ready at, sequence, attempt, item)
+    retry_heap: List[Tuple[float, int, int, ItemRecord]] = []
+    seq = 0
+    outstanding = 0
+    changed = asyncio.Event()
+    stats = {"retried": 0, "fallback": 0}
+
+    async def _emit(entry: Dict[str, Any]):
+        if sink is not None:
+            await sink.put(entry)
+        else:
+            results.append(entry)
+        if pbar:
+            pbar.update(1)
+        if COUNTERS.first_result is None:
+            COUNTERS.first_result = time.monotonic()
+        COUNTERS.details += 1
+
+    async def _retry_later(it: ItemRecord, attempt: int, delay: Optional[float]):
+        nonlocal seq
+        if attempt > client.max_retries:
+            # give up on $batch for this item; per-item GETs have their own retries
+            stats["fallback"] += 1
             try:
-                resp = await client.request("POST", f"{client.api_base()}/$batch", json=body)
+                r = await fetch_file_detail(client, drive_id, it, site_id, fallback_sem, delay_ms, no_per_item_get=False)
             except Exception as ex:
-                LOG.warning(f"Batch request failed: {ex}")
-                # on failure, fallback to per-item fetch
-                for it in batch_items:
-                    try:
-                        r = await fetch_file_detail(client, drive_id, it, site_id, asyncio.Semaphore(1), delay_ms, no_per_item_get=False)
-                        results.append(r)
-                    except Exception as ex2:
-                        LOG.debug(f"Fallback per-item failed for {it.get('id')}: {ex2}")
-                    finally:
-                        if pbar:
-                            pbar.update(1)
-                        try:
-                            monitor_add_details(1)
-                        except Exception:
-                            pass
+                LOG.warning(f"Details of {it.id} could not be fetched: {ex}")
+                r = it.result()
+            await _emit(r)
+            return
+        stats["retried"] += 1
+        seq += 1
+        wait = delay if delay is not None else math.pow(1.5, attempt)
+        heapq.heappush(retry_heap, (time.monotonic() + wait, seq, attempt, it))
+
+    async def _next_or_wake(feed: FileFeed) -> Optional[ItemRecord]:
+        """Next file of the feed, or None once a retry is due or a running
+        batch finished (it may have queued retries) before one arrived."""
+        changed.clear()
+        get = asyncio.ensure_future(feed.__anext__())
+        wake = asyncio.ensure_future(changed.wait())
+        timeout = max(0.0, retry_heap[0][0] - time.monotonic()) if retry_heap else None
+        try:
+            await asyncio.wait({get, wake}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            wake.cancel()
+            if not get.done():
+                get.cancel()
+                try:
+                    await get
+                except asyncio.CancelledError:
+                    pass
+        if get.cancelled():
+            return None
+        return get.result()
+
+    async def _batches():
+        """Yield batches of (attempt, item): retries that are due first,
+        topped up with fresh items. Ends when all items are done."""
+        nonlocal outstanding
+        fresh = files if isinstance(files, FileFeed) else iter_items(files).__aiter__()
+        fresh_done = False
+        while True:
+            batch: List[Tuple[int, ItemRecord]] = []
+            now = time.monotonic()
+            while retry_heap and retry_heap[0][0] <= now and len(batch) < batch_size:
+                _, _, attempt, it = heapq.heappop(retry_heap)
+                batch.append((attempt, it))
+            while not fresh_done and len(batch) < batch_size:
+                try:
+                    if batch and isinstance(fresh, FileFeed):
+                        # files still being discovered: send a partial batch
+                        # rather than wait long for the listing of more files
+                        batch.append((0, await asyncio.wait_for(fresh.__anext__(), batch_linger)))
+                    elif isinstance(fresh, FileFeed) and (retry_heap or outstanding):
+                        # do not let a slow listing hold back retries
+                        it = await _next_or_wake(fresh)
+                        if it is None:
+                            break
+                        batch.append((0, it))
+                    else:
+                        batch.append((0, await fresh.__anext__()))
+                except asyncio.TimeoutError:
+                    break
+                except StopAsyncIteration:
+                    fresh_done = True
+            if batch:
+                outstanding += 1
+                yield batch
+                continue
+            if not fresh_done:
+                # woken for retries that are not due yet or ready at once
+                continue
+            if not retry_heap and outstanding == 0:
                 return
+            # only retries left: wait until one is due or a running batch finishes
+            changed.clear()
+            timeout = max(0.0, retry_heap[0][0] - time.monotonic()) if retry_heap else None
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-            # process batch responses
-            responses = resp.get("responses", []) if isinstance(resp, dict) else []
-            # map responses by id
-            resp_map = {r.get("id"): r for r in responses}
-            for it in batch_items:
-                rid = it['id']
-                entry = {
-                    "id": it.get("id"),
-                    "name": it.get("name"),
-                    "path": build_path(it),
-                    "size": it.get("size", 0),
-                    "isFolder": False,
-                    "quickXorHash": None,
-                    "sensitivityLabelId": None,
-                    "sensitivityLabelName": None,
-                    "createdDateTime": it.get("createdDateTime"),
-                    "lastModifiedDateTime": it.get("lastModifiedDateTime"),
-                }
-                r = resp_map.get(rid)
-                if not r:
-                    LOG.debug(f"No batch response for {rid}")
-                    results.append(entry)
-                    if pbar:
-                        pbar.update(1)
-                    continue
-
-                status = r.get("status")
-                if status and 200 <= int(status) < 300:
-                    body = r.get("body") or {}
-                    ff = body.get("file") if isinstance(body, dict) else None
-                    if ff and isinstance(ff, dict):
-                        hashes = ff.get("hashes")
-                        if hashes and hashes.get("quickXorHash"):
-                            entry["quickXorHash"] = hashes.get("quickXorHash")
-                    sl = body.get("sensitivityLabel") if isinstance(body, dict) else None
-                    if sl:
-                        entry["sensitivityLabelId"] = sl.get("id")
-                        entry["sensitivityLabelName"] = sl.get("name") or sl.get("displayName") or sl.get("label")
-                else:
-                    # non-success: log and leave fields empty
-                    LOG.debug(f"Batch item {rid} returned status {status}")
+    async def _process_batch(batch: List[Tuple[int, ItemRecord]]):
+        nonlocal outstanding
+        try:
+            async with sem:
+                await _send_batch(batch)
+        finally:
+            outstanding -= 1
+            changed.set()
 
-                results.append(entry)
-                if pbar:
-                    pbar.update(1)
+    async def _send_batch(batch: List[Tuple[int, ItemRecord]]):
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000.0)
+        reqs = []
+        for attempt, it in batch:
+            # request item selecting file and sensitivityLabel
+            url = f"/drives/{drive_id}/items/{it.id}?$select=file,sensitivityLabel"
+            reqs.append({"id": it.id, "method": "GET", "url": url})
+        try:
+            resp = await client.request("POST", f"{client.api_base()}/$batch", json={"requests": reqs})
+        except Exception as ex:
+            LOG.warning(f"Batch request failed: {ex}; retrying its {len(batch)} items")
+            for attempt, it in batch:
+                await _retry_later(it, attempt + 1, None)
+            return
+
+        # process batch responses, mapped by id
+        responses = resp.get("responses", []) if isinstance(resp, dict) else []
+        await report_batch_throttle(client, responses)
+        resp_map = {r.get("id"): r for r in responses}
+        throttled = 0
+        for attempt, it in batch:
+            r = resp_map.get(it.id) or {}
+            try:
+                status = int(r.get("status") or 0)
+            except (TypeError, ValueError):
+                status = 0
+            if status == 429 or status >= 500 or status == 0:
+                ra = None
                 try:
-                    monitor_add_details(1)
-                except Exception:
+                    ra = float((r.get("headers") or {}).get("Retry-After"))
+                except (TypeError, ValueError):
                     pass
+                throttled += 1
+                await _retry_later(it, attempt + 1, ra)
+                continue
+            entry = it.result()
+            if 200 <= status < 300:
+                body = r.get("body") or {}
+                ff = body.get("file") if isinstance(body, dict) else None
+                if ff and isinstance(ff, dict):
+                    hashes = ff.get("hashes")
+                    if hashes and hashes.get("quickXorHash"):
+                        entry["quickXorHash"] = hashes.get("quickXorHash")
+                sl = body.get("sensitivityLabel") if isinstance(body, dict) else None
+                if sl and sl.get("id"):
+                    set_label(client, entry, sl.get("id"), sl.get("name") or sl.get("displayName"))
+            else:
+                # e.g. 404 for an item deleted since the listing: keep it with empty fields
+                LOG.debug(f"Batch item {it.id} returned status {status}")
+            await _emit(entry)
+        if throttled:
+            LOG.debug(f"{throttled} of {len(batch)} $batch sub-requests throttled; queued for retry")
 
-    # launch batches with concurrency limit
-    tasks = [asyncio.create_task(_process_batch(b)) for b in batches]
-    await asyncio.gather(*tasks)
+    await run_worker_pool(_batches(), _process_batch, concurrency)
     if pbar:
         pbar.close()
+    if stats["retried"] or stats["fallback"]:
+        LOG.info(f"$batch details: {stats['retried']} sub-request retries, {stats['fallback']} items fetched individually after repeated failures")
     return results
 
+async def fetch_details(client: GraphClient, args, files: List[ItemRecord], sink: Optional["ResultSink"] = None) -> List[Dict[str, Any]]:
+    """Fetch file details with $batch or parallel per-item GETs, as selected on the command line."""
+    if args.use_batch:
+        return await batch_gather_file_details(client, args.drive_id, files, args.site_id, args.batch_size, args.concurrency, args.request_delay_ms, show_progress=not args.no_progress, sink=sink)
+    # parallel per-item GETs; if --no-per-item-get is set we will not perform per-item GETs
+    return await gather_file_details(client, args.drive_id, files, args.site_id, args.concurrency, args.request_delay_ms, show_progress=not args.no_progress, no_per_item_get=args.no_per_item_get, sink=sink)
+
+
+async def pipelined_scan(client: GraphClient, args, traversal_concurrency: int, sink: Optional["ResultSink"] = None, start_items: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[ItemRecord], List[ItemRecord], List[Dict[str, Any]]]:
+    """Traversal and detail stage running at the same time (--pipeline):
+    every listed file goes straight into a FileFeed that the detail stage
+    (per-item GETs or $batch groups) consumes. Both stages send their
+    requests through the client's rate controller, so they share one
+    in-flight budget. Returns (folders, files, details)."""
+    feed = FileFeed()
+    started = time.monotonic()
+    traversal = asyncio.create_task(collect_folders_and_files(client, args.drive_id, args.page_size, include_file=True, concurrency=traversal_concurrency, use_batch=args.batch_traversal, batch_size=min(args.batch_size, 20), show_progress=not args.no_progress, start_items=start_items, feed=feed))
+    # also ends the detail stage if the traversal fails
+    traversal.add_done_callback(lambda _: feed.close())
+    try:
+        details = await fetch_details(client, args, feed, sink=sink)
+    except BaseException:
+        traversal.cancel()
+        await asyncio.gather(traversal, return_exceptions=True)
+        raise
+    folders, files = await traversal
+    LOG.info(f"Collected {len(folders)} folders and {len(files)} files; details finished {time.monotonic() - started:.1f}s after the traversal started")
+    return folders, files, details
+
+
+# --- Incremental scans via the delta API ---------------------------------
+#
+# After a full scan the state file stores, per drive, the deltaLink obtained
+# just before the scan started, the root item id and a folder map
+# (id -> [name, parentId]). Delta responses carry no parentReference.path,
+# so paths of changed files are rebuilt from the folder map, and folder
+# renames/moves rewrite the paths of the previous results below them.
+
+def load_delta_state(path: str) -> Dict[str, Any]:
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            if isinstance(state, dict) and isinstance(state.get("drives"), dict):
+                return state
+            LOG.warning(f"Ignoring delta state with unexpected format: {path}")
+        except Exception as ex:
+            LOG.warning(f"Could not read delta state {path}: {ex}")
+    return {"version": 1, "drives": {}}
+
+
+def save_delta_state(state: Dict[str, Any], path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+async def get_root_id(client: GraphClient, drive_id: str) -> Optional[str]:
+    resp = await client.request("GET", f"{client.api_base()}/drives/{drive_id}/root?$select=id")
+    return resp.get("id") if isinstance(resp, dict) else None
+
+
+async def get_latest_delta_link(client: GraphClient, drive_id: str) -> Optional[str]:
+    """Return a deltaLink for the current state of the drive without enumerating it."""
+    url = f"{client.api_base()}/drives/{drive_id}/root/delta?token=latest"
+    while url:
+        resp = await client.request("GET", url)
+        if not isinstance(resp, dict):
+            break
+        if resp.get("@odata.deltaLink"):
+            return resp["@odata.deltaLink"]
+        url = resp.get("@odata.nextLink")
+    return None
+
+
+async def fetch_delta_changes(client: GraphClient, delta_link: str) -> Tuple[Dict[str, Dict[str, Any]], Optional[str]]:
+    """Follow a deltaLink through all pages. Returns the changed items by id
+    (latest state wins) and the new deltaLink. Raises GraphRequestError with
+    status 410 when the link has expired and a full resync is required."""
+    changes: Dict[str, Dict[str, Any]] = {}
+    new_link: Optional[str] = None
+    url: Optional[str] = delta_link
+    while url:
+        resp = await client.request("GET", url)
+        if not isinstance(resp, dict):
+            break
+        for it in resp.get("value", []):
+            iid = it.get("id")
+            if iid:
+                changes.pop(iid, None)
+                changes[iid] = it
+        new_link = resp.get("@odata.deltaLink") or new_link
+        url = resp.get("@odata.nextLink")
+    return changes, new_link
+
+
+def build_folder_map(folders: List[ItemRecord]) -> Dict[str, List[Any]]:
+    return {f.id: [f.name, f.parent_id] for f in folders if f.id}
+
+
+def folder_path(folder_map: Dict[str, List[Any]], root_id: Optional[str], folder_id: Optional[str], cache: Dict[str, Optional[str]]) -> Optional[str]:
+    """Path of a folder below the drive root ("" for the root itself, "/A/B"
+    otherwise), or None if the folder is not connected to the root."""
+    chain: List[str] = []
+    fid = folder_id
+    prefix: Optional[str] = ""
+    while fid != root_id:
+        if fid in cache:
+            prefix = cache[fid]
+            break
+        entry = folder_map.get(fid) if fid else None
+        if entry is None or fid in chain:
+            prefix = None
+            break
+        chain.append(fid)
+        fid = entry[1]
+    for cid in reversed(chain):
+        if prefix is not None:
+            prefix = prefix + "/" + folder_map[cid][0]
+        cache[cid] = prefix
+    return prefix
+
+
+def rewrite_path(path: str, moved: Dict[str, Optional[str]]) -> Optional[str]:
+    """Apply folder moves (old path -> new path, None = deleted) to a
+    drive-relative path ("/A/B/file.txt") using the deepest matching
+    ancestor. Returns None if deleted."""
+    p = path
+    while True:
+        idx = p.rfind("/")
+        if idx <= 0:
+            return path
+        p = p[:idx]
+        if p in moved:
+            new = moved[p]
+            return None if new is None else new + path[len(p):]
+
+
+async def incremental_scan(client: GraphClient, args, drive_state: Dict[str, Any], previous_results: str, sink: Optional["ResultSink"] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Apply delta changes since the stored deltaLink to the previous results
+    (JSON array or NDJSON). With a `sink` the merged results are streamed to
+    it and the returned list is empty.
+
+    Folder moves are matched on drive-relative paths; previous entries keep
+    their drive prefix (e.g. `/drives/<id>/root:`), and refreshed files get
+    the prefix found in the previous results."""
+    changes, new_link = await fetch_delta_changes(client, drive_state["deltaLink"])
+    root_id = drive_state.get("rootId")
+    old_map: Dict[str, List[Any]] = drive_state.get("folders") or {}
+    new_map = dict(old_map)
+
+    changed_folders: List[str] = []
+    changed_files: List[Dict[str, Any]] = []
+    removed_files = set()
+    for it in changes.values():
+        iid = it["id"]
+        if it.get("root") is not None or iid == root_id:
+            continue
+        if it.get("deleted") is not None:
+            if iid in old_map:
+                new_map.pop(iid, None)
+                changed_folders.append(iid)
+            else:
+                removed_files.add(iid)
+        elif it.get("folder") is not None:
+            new_map[iid] = [it.get("name", ""), (it.get("parentReference") or {}).get("id")]
+            changed_folders.append(iid)
+        else:
+            changed_files.append(it)
+
+    old_cache: Dict[str, Optional[str]] = {}
+    new_cache: Dict[str, Optional[str]] = {}
+    moved: Dict[str, Optional[str]] = {}
+    for fid in changed_folders:
+        if fid not in old_map:
+            continue
+        old = folder_path(old_map, root_id, fid, old_cache)
+        new = folder_path(new_map, root_id, fid, new_cache) if fid in new_map else None
+        if old is not None and old != new:
+            moved[old] = new
+    # drop folders that were deleted together with an ancestor
+    new_map = {fid: v for fid, v in new_map.items() if folder_path(new_map, root_id, fid, new_cache) is not None}
+
+    skip_ids = removed_files | {it["id"] for it in changed_files}
+    details: List[Dict[str, Any]] = []
+    kept = 0
+    removed = 0
+    stored_prefix: Optional[str] = None
+    for entry in iter_drive_items(previous_results):
+        prefix, rel = split_drive_path(entry.get("path"))
+        if stored_prefix is None and rel:
+            stored_prefix = prefix
+        eid = entry.get("id")
+        if eid in skip_ids:
+            if eid in removed_files:
+                removed += 1
+            continue
+        if moved:
+            p = rewrite_path(rel, moved)
+            if p is None:
+                removed += 1
+                continue
+            entry["path"] = prefix + p
+        kept += 1
+        if sink is not None:
+            await sink.put(entry)
+        else:
+            details.append(entry)
+
+    # Delta items have no parentReference.path: rebuild it from the folder
+    # map, in the form of the previous results (what Graph returns for
+    # /drives/{id} requests if there were none)
+    if stored_prefix is None:
+        stored_prefix = f"/drives/{args.drive_id}/root:"
+    for it in changed_files:
+        pref = it.setdefault("parentReference", {})
+        parent = folder_path(new_map, root_id, pref.get("id"), new_cache)
+        if parent is None:
+            LOG.debug(f"Parent of changed item {it['id']} is unknown; recording it at the drive root")
+            parent = ""
+        pref["path"] = (stored_prefix or "/drive/root:") + parent
+
+    LOG.info(f"Delta: {len(changed_files)} changed files, {len(removed_files)} deleted items, {len(changed_folders)} changed folders ({len(moved)} moved/renamed/deleted paths)")
+    if changed_files:
+        details.extend(await fetch_details(client, args, [ItemRecord.from_graph(it) for it in changed_files], sink=sink))
+    LOG.info(f"Incremental result: {kept} unchanged, {len(changed_files)} refreshed, {removed} removed")
+
+    new_state = {
+        "deltaLink": new_link or drive_state["deltaLink"],
+        "rootId": root_id,
+        "folders": new_map,
+        "updated": datetime.now(timezone.utc).isoformat(),
+    }
+    return details, new_state
+
 
 def save_json(items: List[Dict[str, Any]], path: str):
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -789,6 +1965,548 @@ def save_json(items: List[Dict[str, Any]], path: str):
         json.dump(items, f, indent=2, default=str, ensure_ascii=False)
 
 
+CSV_FIELDS = ["id", "name", "path", "size", "quickXorHash", "sensitivityLabelId", "sensitivityLabelName", "createdDateTime", "lastModifiedDateTime"]
+COMPRESS_EXT = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+_SINK_STOP = object()
+
+
+class ResultSink:
+    """Streams results to NDJSON and/or CSV while the scan runs.
+
+    Producers `await put(item)`; a single writer task drains the bounded
+    queue in chunks and writes them in a worker thread, so compression and
+    file I/O stay off the event loop. Files are written as
+    `<name>.partial[.gz|.zst]` and renamed on a successful `close()`; after a
+    crash the partial files still hold everything written so far. With a
+    `store` the chunks are also upserted into the SQLite result store.
+    """
+
+    def __init__(self, ndjson_path: Optional[str] = None, csv_path: Optional[str] = None, chunk_size: int = 500, queue_size: int = 10000, store: Optional[DriveItemStore] = None):
+        self.ndjson_path = ndjson_path
+        self.csv_path = csv_path
+        self.store = store
+        self.chunk_size = chunk_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.count = 0
+        self._files: List[Tuple[Any, str]] = []
+        self._json_f = None
+        self._csv_w = None
+        self._task: Optional[asyncio.Task] = None
+        self._error: Optional[BaseException] = None
+
+    @staticmethod
+    def partial_path(path: str) -> str:
+        # keep the compression extension last so open_text() still applies it
+        for ext in COMPRESS_EXT.values():
+            if ext and path.endswith(ext):
+                return path[:-len(ext)] + ".partial" + ext
+        return path + ".partial"
+
+    async def start(self):
+        import csv
+        if self.ndjson_path:
+            self._json_f = open_text(self.partial_path(self.ndjson_path), "w")
+            self._files.append((self._json_f, self.ndjson_path))
+        if self.csv_path:
+            cf = open_text(self.partial_path(self.csv_path), "w")
+            self._files.append((cf, self.csv_path))
+            self._csv_w = csv.DictWriter(cf, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            self._csv_w.writeheader()
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, item: Dict[str, Any]):
+        if self._error is not None:
+            raise RuntimeError(f"Result writer failed: {self._error}")
+        await self.queue.put(item)
+
+    def _write(self, chunk: List[Dict[str, Any]]):
+        if self._json_f is not None:
+            self._json_f.write("".join(json.dumps(r, default=str, ensure_ascii=False) + "\n" for r in chunk))
+        if self._csv_w is not None:
+            self._csv_w.writerows(chunk)
+        if self.store is not None:
+            for r in chunk:
+                self.store.add(r)
+        # flush per chunk so a killed run leaves readable partial output
+        for f, _ in self._files:
+            f.flush()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = [await self.queue.get()]
+            while len(chunk) < self.chunk_size:
+                try:
+                    chunk.append(self.queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            stop = chunk[-1] is _SINK_STOP
+            if stop:
+                chunk.pop()
+            if chunk and self._error is None:
+                try:
+                    await loop.run_in_executor(None, self._write, chunk)
+                    self.count += len(chunk)
+                except Exception as ex:
+                    # keep draining so producers do not block on a full queue
+                    LOG.error(f"Result writer failed: {ex}")
+                    self._error = ex
+            if stop:
+                return
+
+    async def close(self, commit: bool = True):
+        """Flush outstanding results and close the files. With `commit` the
+        partial files are renamed to their final names."""
+        if self._task is not None:
+            await self.queue.put(_SINK_STOP)
+            await self._task
+            self._task = None
+        for f, _ in self._files:
+            f.close()
+        if self._error is not None:
+            raise RuntimeError(f"Result writer failed: {self._error}")
+        if commit:
+            for _, path in self._files:
+                os.replace(self.partial_path(path), path)
+        self._files = []
+
+
+def ndjson_to_json_array(src: str, dest: str):
+    """Convert streamed NDJSON results to the JSON array format written by
+    save_json(), one item at a time."""
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    with open(dest, "w", encoding="utf-8") as f:
+        f.write("[")
+        first = True
+        for item in iter_drive_items(src):
+            body = json.dumps(item, indent=2, default=str, ensure_ascii=False).replace("\n", "\n  ")
+            f.write(("\n  " if first else ",\n  ") + body)
+            first = False
+        f.write("]" if first else "\n]")
+
+
+def find_previous_results(outdir: str) -> Optional[str]:
+    """Most recent result file in `outdir` (JSON array or streamed NDJSON)."""
+    names = ["drive_analysis.json"] + ["drive_analysis.ndjson" + ext for ext in COMPRESS_EXT.values()]
+    found = [os.path.join(outdir, n) for n in names if os.path.exists(os.path.join(outdir, n))]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+async def scan_drive(client: GraphClient, args, start_items: Optional[List[Dict[str, Any]]] = None) -> int:
+    """Scan one drive (args.drive_id) and write its results to args.output_dir.
+    With `start_items` only those items and their subtrees are scanned.
+    Returns the number of results."""
+    outdir = args.output_dir or "./output"
+    # Upsert results into the SQLite result store (drive_items)
+    store = None
+    if args.sqlite_db and not args.only_progress:
+        store = DriveItemStore(args.sqlite_db, args.drive_id)
+    # Stream results to disk as they complete (NDJSON and/or CSV)
+    sink = None
+    if args.stream and not args.only_progress:
+        os.makedirs(outdir, exist_ok=True)
+        ext = COMPRESS_EXT[args.compress]
+        fmt = args.stream_format
+        ndjson_path = os.path.join(outdir, "drive_analysis.ndjson" + ext) if fmt in ("ndjson", "both") or args.export_json or args.incremental else None
+        csv_path = os.path.join(outdir, "drive_analysis.csv" + ext) if fmt in ("csv", "both") or args.export_csv else None
+        sink = ResultSink(ndjson_path, csv_path, store=store)
+        await sink.start()
+
+    details = None
+    drive_state = None
+    checkpoint = None
+    state_path = args.delta_state or os.path.join(outdir, "delta_state.json")
+    previous_results = find_previous_results(outdir)
+    if args.incremental:
+        delta_state = load_delta_state(state_path)
+        prev_state = delta_state["drives"].get(args.drive_id)
+        if prev_state and prev_state.get("deltaLink") and previous_results:
+            LOG.info(f"Incremental mode: fetching changes since the last scan (delta), previous results: {previous_results}")
+            try:
+                details, drive_state = await incremental_scan(client, args, prev_state, previous_results, sink=sink)
+            except GraphRequestError as ex:
+                if ex.status != 410:
+                    raise
+                LOG.warning("Stored deltaLink expired (410 Gone); running a full scan")
+                details = None
+        else:
+            LOG.info("Incremental mode: no previous delta state or results found; running a full scan")
+
+    if details is None:
+        # Checkpoint store: record progress, or continue an interrupted scan
+        if args.checkpoint or args.resume:
+            cp_path = args.checkpoint_db or os.path.join(outdir, "scan_checkpoint.db")
+            checkpoint = ScanCheckpoint(cp_path)
+            if args.resume and checkpoint.can_resume(args.drive_id):
+                LOG.info(f"Resuming scan from checkpoint {cp_path}: {checkpoint.counts()}")
+            else:
+                if args.resume:
+                    LOG.info(f"No unfinished scan of this drive in {cp_path}; starting a new scan")
+                checkpoint.reset(args.drive_id)
+
+        delta_link = checkpoint.get("delta_link") if checkpoint is not None else None
+        if args.incremental and not delta_link:
+            # Obtain the deltaLink before enumerating so that changes made
+            # while the full scan runs are picked up by the next run.
+            delta_link = await get_latest_delta_link(client, args.drive_id)
+            if checkpoint is not None:
+                checkpoint.set("delta_link", delta_link)
+        LOG.info("Collecting folder structure and file list (fast scan)")
+        # Request the file facet in listings to reduce per-item GETs
+        traversal_concurrency = args.traversal_concurrency or args.concurrency
+        if args.pipeline:
+            # details start as soon as the first folder pages are listed
+            folders, files, details = await pipelined_scan(client, args, traversal_concurrency, sink=sink, start_items=start_items)
+        else:
+            folders, files = await collect_folders_and_files(client, args.drive_id, args.page_size, include_file=True, concurrency=traversal_concurrency, use_batch=args.batch_traversal, batch_size=min(args.batch_size, 20), checkpoint=checkpoint, show_progress=not args.no_progress, start_items=start_items)
+            LOG.info(f"Collected {len(folders)} folders and {len(files)} files (initial scan)")
+
+            # Now fetch file details
+            if checkpoint is None:
+                details = await fetch_details(client, args, files, sink=sink)
+            else:
+                checkpoint.set("phase", "details")
+                # results finished before the interruption are replayed, not fetched again
+                done_ids = checkpoint.done_ids()
+                details = []
+                for r in checkpoint.iter_results():
+                    if sink is not None:
+                        await sink.put(r)
+                    else:
+                        details.append(r)
+                if done_ids:
+                    LOG.info(f"Skipping {len(done_ids)} files with details from the checkpoint")
+                    files = [f for f in files if f.id not in done_ids]
+                tee = CheckpointSink(checkpoint, sink)
+                await fetch_details(client, args, files, sink=tee)
+                details.extend(tee.items)
+                checkpoint.set("phase", "fetched")
+        if args.incremental and delta_link:
+            drive_state = {
+                "deltaLink": delta_link,
+                "rootId": await get_root_id(client, args.drive_id),
+                "folders": build_folder_map(folders),
+                "updated": datetime.now(timezone.utc).isoformat(),
+            }
+    if sink is not None:
+        await sink.close()
+    # Export or show only progress
+    if args.only_progress:
+        # Show a final progress bar for the number of processed items
+        total_final = len(details)
+        try:
+            final_pbar = tqdm(total=total_final, desc="Finalizing (no files)")
+        except Exception:
+            final_pbar = None
+        for _ in range(total_final):
+            if final_pbar:
+                final_pbar.update(1)
+            else:
+                # small sleep to make a readable log stream
+                time.sleep(0.01)
+        if final_pbar:
+            final_pbar.close()
+        LOG.info(f"Done: processed {total_final} items (no files written)")
+    elif sink is not None:
+        for path in (sink.ndjson_path, sink.csv_path):
+            if path:
+                LOG.info(f"Streamed {sink.count} results: {path}")
+        if args.export_json:
+            # compatibility: the JSON array consumed by existing tooling
+            json_path = os.path.join(outdir, "drive_analysis.json")
+            ndjson_to_json_array(sink.ndjson_path, json_path)
+            LOG.info(f"JSON exported: {json_path}")
+        if args.incremental and drive_state:
+            delta_state["drives"][args.drive_id] = drive_state
+            save_delta_state(delta_state, state_path)
+            LOG.info(f"Delta state saved: {state_path}")
+    else:
+        os.makedirs(outdir, exist_ok=True)
+        if args.export_json:
+            json_path = os.path.join(outdir, "drive_analysis.json")
+            save_json(details, json_path)
+            LOG.info(f"JSON exported: {json_path}")
+            # Only advance the delta state once the matching results are on disk
+            if args.incremental and drive_state:
+                delta_state["drives"][args.drive_id] = drive_state
+                save_delta_state(delta_state, state_path)
+                LOG.info(f"Delta state saved: {state_path}")
+        if args.export_csv:
+            csv_path = os.path.join(outdir, "drive_analysis.csv")
+            # write simple CSV
+            import csv
+            with open(csv_path, "w", encoding="utf-8", newline="") as cf:
+                w = csv.DictWriter(cf, fieldnames=CSV_FIELDS, extrasaction="ignore")
+                w.writeheader()
+                for r in details:
+                    w.writerow(r)
+            LOG.info(f"CSV exported: {csv_path}")
+        if store is not None:
+            store.add_all(details)
+    if store is not None:
+        removed = store.finish()
+        store.close()
+        LOG.info(f"SQLite result store: {store.count} items upserted, {removed} stale items removed: {args.sqlite_db}")
+    if checkpoint is not None:
+        # results are written: a later --resume starts a new scan
+        checkpoint.set("phase", "done")
+        checkpoint.close()
+    return sink.count if sink is not None else len(details)
+
+
+# --- Site-wide scans ------------------------------------------------------
+#
+# With --site-drives every document library of the given sites is scanned in
+# this process. All drives share the GraphClient (one token, one connection
+# pool, one rate controller); each drive writes to its own output partition
+# <output-dir>/drives/<drive id>/ and drives.json indexes them.
+
+def drive_partition_dir(outdir: str, drive_id: str) -> str:
+    safe = re.sub(r"[^A-Za-z0-9._-]", "_", drive_id)
+    return os.path.join(outdir, "drives", safe)
+
+
+async def list_site_drives(client: GraphClient, site_id: str) -> List[Dict[str, Any]]:
+    """Document libraries of a site (other drive types are skipped)."""
+    url = f"{client.api_base()}/sites/{site_id}/drives?$select=id,name,driveType,webUrl"
+    drives = await paged_get(client, url)
+    return [d for d in drives if d.get("driveType", "documentLibrary") == "documentLibrary"]
+
+
+async def scan_sites(client: GraphClient, args, outdir: str) -> List[Dict[str, Any]]:
+    """Scan all document libraries of args.site_drives, up to
+    args.drive_concurrency drives at a time. A failing drive is logged and
+    recorded in drives.json without stopping the others."""
+    targets: List[Tuple[str, Dict[str, Any]]] = []
+    for site_id in args.site_drives:
+        drives = await list_site_drives(client, site_id)
+        LOG.info(f"Site {site_id}: {len(drives)} document libraries")
+        targets.extend((site_id, d) for d in drives)
+    sem = asyncio.Semaphore(max(1, args.drive_concurrency))
+    index: List[Dict[str, Any]] = []
+
+    async def _scan(site_id: str, drive: Dict[str, Any]):
+        entry = {"siteId": site_id, "driveId": drive["id"], "name": drive.get("name"), "webUrl": drive.get("webUrl"), "outputDir": drive_partition_dir(outdir, drive["id"])}
+        index.append(entry)
+        async with sem:
+            drive_args = argparse.Namespace(**vars(args))
+            drive_args.site_id = site_id
+            drive_args.drive_id = drive["id"]
+            drive_args.output_dir = entry["outputDir"]
+            drive_args.delta_state = None
+            drive_args.checkpoint_db = None
+            # concurrent drives would fight over the tqdm bars; the live monitor shows the totals
+            drive_args.no_progress = True
+            LOG.info(f"Scanning drive {drive.get('name')} ({drive['id']})")
+            started = time.monotonic()
+            try:
+                entry["items"] = await scan_drive(client, drive_args)
+                entry["status"] = "ok"
+            except Exception as ex:
+                LOG.error(f"Scan of drive {drive.get('name')} ({drive['id']}) failed: {ex}")
+                entry["status"] = "failed"
+                entry["error"] = str(ex)
+            entry["seconds"] = round(time.monotonic() - started, 1)
+            LOG.info(f"Drive {drive.get('name')}: {entry['status']}, {entry.get('items', 0)} items in {entry['seconds']}s")
+
+    await asyncio.gather(*(_scan(site_id, d) for site_id, d in targets))
+    os.makedirs(outdir, exist_ok=True)
+    index_path = os.path.join(outdir, "drives.json")
+    save_json(index, index_path)
+    failed = sum(1 for e in index if e["status"] != "ok")
+    LOG.info(f"Scanned {len(index) - failed} of {len(index)} drives; index: {index_path}")
+    return index
+
+
+# --- Process-sharded scans ------------------------------------------------
+#
+# With --processes N one drive is scanned by N child processes, each with its
+# own event loop, session and GraphClient, so JSON decoding and result
+# building use N cores. The coordinator (this process) splits the top of the
+# drive into units, assigns them to the shards, and merges the shard outputs
+# <output-dir>/shards/shard-NN/drive_analysis.ndjson into the usual result
+# files. The request budget (--concurrency) is divided between the shards,
+# and Retry-After pauses and limit cuts are shared through SharedRateState.
+
+async def shard_units(client: GraphClient, args, shards: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Root children, with the largest folders replaced by their children
+    until no folder holds more than 1/(2*shards) of the bytes (at most
+    4*shards listings). Returns the units and the number of folders listed."""
+    units = await list_drive_children(client, args.drive_id, args.page_size)
+    total = sum(int(u.get("size") or 0) for u in units)
+    expanded = 0
+    while expanded < 4 * shards:
+        folders = [u for u in units if u.get("folder") is not None and (u.get("folder") or {}).get("childCount", 1)]
+        if not folders:
+            break
+        largest = max(folders, key=lambda u: int(u.get("size") or 0))
+        if len(units) >= 4 * shards and int(largest.get("size") or 0) * 2 * shards <= total:
+            break
+        units.remove(largest)
+        units.extend(await list_item_children(client, args.drive_id, largest["id"], args.page_size))
+        expanded += 1
+    return units, expanded
+
+
+def plan_shards(units: List[Dict[str, Any]], shards: int) -> List[List[Dict[str, Any]]]:
+    """Assign units to shards, largest first to the shard with the fewest
+    bytes so far (folder sizes are subtree sizes)."""
+    plan: List[List[Dict[str, Any]]] = [[] for _ in range(shards)]
+    heap = [(0, i) for i in range(shards)]
+    for unit in sorted(units, key=lambda u: int(u.get("size") or 0), reverse=True):
+        load, i = heapq.heappop(heap)
+        plan[i].append(unit)
+        heapq.heappush(heap, (load + int(unit.get("size") or 0), i))
+    return plan
+
+
+def shard_args(args, shard: int, client_secret: str) -> argparse.Namespace:
+    """Arguments of one shard process: a plain NDJSON stream into its own directory."""
+    sa = argparse.Namespace(**vars(args))
+    shards = args.processes
+    sa.client_secret = client_secret
+    sa.use_keyvault = False
+    sa.output_dir = os.path.join(args.output_dir or "./output", "shards", f"shard-{shard:02d}")
+    sa.concurrency = max(1, math.ceil(args.concurrency / shards))
+    sa.traversal_concurrency = max(1, math.ceil(args.traversal_concurrency / shards)) if args.traversal_concurrency else 0
+    sa.stream = True
+    sa.stream_format = "ndjson"
+    sa.compress = "none"
+    sa.export_json = False
+    sa.export_csv = False
+    sa.sqlite_db = None
+    sa.only_progress = False
+    sa.no_progress = True
+    sa.progress_interval = 0
+    sa.status_port = 0
+    sa.metrics_file = None
+    # the coordinator has just fetched the label catalogue into this cache
+    sa.label_cache = args.label_cache or os.path.join(args.output_dir or "./output", "label_catalog.json")
+    return sa
+
+
+def run_shard(args, shard: int, items: List[Dict[str, Any]], shared_rate: SharedRateState, progress):
+    """Entry point of a shard process."""
+    logging.basicConfig(level=logging.INFO if not args.verbose else logging.DEBUG, format=f"%(levelname)s:shard-{shard:02d}:%(message)s")
+    asyncio.run(scan_shard(args, shard, items, shared_rate, progress))
+
+
+async def scan_shard(args, shard: int, items: List[Dict[str, Any]], shared_rate: SharedRateState, progress):
+    async def _report():
+        # publish this shard's counters for the coordinator's live monitor
+        while True:
+            progress[3 * shard:3 * shard + 3] = [COUNTERS.folders, COUNTERS.files, COUNTERS.details]
+            await asyncio.sleep(0.5)
+
+    async with aiohttp.ClientSession() as session:
+        client = await create_client(args, session, args.client_secret, shared_rate)
+        reporter = asyncio.create_task(_report())
+        try:
+            await scan_drive(client, args, start_items=items)
+        finally:
+            reporter.cancel()
+            progress[3 * shard:3 * shard + 3] = [COUNTERS.folders, COUNTERS.files, COUNTERS.details]
+            save_json(client.metrics.to_dict(), os.path.join(args.output_dir, "graph_metrics.json"))
+
+
+async def scan_drive_sharded(client: GraphClient, args, client_secret: str, shared_rate: SharedRateState) -> int:
+    """Scan args.drive_id with args.processes shard processes and merge their results."""
+    outdir = args.output_dir or "./output"
+    shards = args.processes
+    units, expanded = await shard_units(client, args, shards)
+    plan = [p for p in plan_shards(units, shards) if p]
+    LOG.info(f"Sharded scan: {len(units)} top-level units ({expanded} folders expanded) in {len(plan)} processes")
+    ctx = multiprocessing.get_context("spawn")
+    progress = ctx.Array("q", 3 * len(plan), lock=False)
+    procs = []
+    for i, items in enumerate(plan):
+        sa = shard_args(args, i, client_secret)
+        if os.path.isdir(sa.output_dir):
+            shutil.rmtree(sa.output_dir)
+        proc = ctx.Process(target=run_shard, args=(sa, i, items, shared_rate, progress), name=f"shard-{i:02d}")
+        proc.start()
+        procs.append((proc, sa))
+    base_folders = expanded
+    started = time.monotonic()
+    while any(proc.is_alive() for proc, _ in procs):
+        COUNTERS.folders = base_folders + sum(progress[0::3])
+        COUNTERS.files = sum(progress[1::3])
+        COUNTERS.details = sum(progress[2::3])
+        if COUNTERS.details and COUNTERS.first_result is None:
+            # seen at the next poll, so up to 0.5s late
+            COUNTERS.first_result = time.monotonic()
+        await asyncio.sleep(0.5)
+    COUNTERS.folders = base_folders + sum(progress[0::3])
+    COUNTERS.files = sum(progress[1::3])
+    COUNTERS.details = sum(progress[2::3])
+    failed = [proc.name for proc, _ in procs if proc.exitcode != 0]
+    for proc, sa in procs:
+        metrics_path = os.path.join(sa.output_dir, "graph_metrics.json")
+        if os.path.exists(metrics_path):
+            with open(metrics_path, "r", encoding="utf-8") as f:
+                client.metrics.merge(json.load(f))
+    if failed:
+        raise RuntimeError(f"Shard processes failed: {', '.join(failed)}; partial results in {os.path.join(outdir, 'shards')}")
+    LOG.info(f"All shards finished in {time.monotonic() - started:.1f}s; merging results")
+    count = await merge_shards(args, [sa.output_dir for _, sa in procs])
+    shutil.rmtree(os.path.join(outdir, "shards"), ignore_errors=True)
+    return count
+
+
+async def merge_shards(args, shard_dirs: List[str]) -> int:
+    """Write the results of all shards to the output files selected by `args`."""
+    outdir = args.output_dir or "./output"
+    if args.only_progress:
+        count = sum(1 for d in shard_dirs for _ in iter_drive_items(os.path.join(d, "drive_analysis.ndjson")))
+        LOG.info(f"Done: processed {count} items (no files written)")
+        return count
+    store = DriveItemStore(args.sqlite_db, args.drive_id) if args.sqlite_db else None
+    os.makedirs(outdir, exist_ok=True)
+    ext = COMPRESS_EXT[args.compress] if args.stream else ""
+    fmt = args.stream_format if args.stream else ""
+    ndjson_path = os.path.join(outdir, "drive_analysis.ndjson" + ext) if fmt in ("ndjson", "both") or args.export_json else None
+    csv_path = os.path.join(outdir, "drive_analysis.csv" + ext) if fmt in ("csv", "both") or args.export_csv else None
+    sink = ResultSink(ndjson_path, csv_path, store=store)
+    await sink.start()
+    for d in shard_dirs:
+        for item in iter_drive_items(os.path.join(d, "drive_analysis.ndjson")):
+            await sink.put(item)
+    await sink.close()
+    for path in (ndjson_path, csv_path):
+        if path:
+            LOG.info(f"Merged {sink.count} results: {path}")
+    if args.export_json:
+        json_path = os.path.join(outdir, "drive_analysis.json")
+        ndjson_to_json_array(ndjson_path, json_path)
+        LOG.info(f"JSON exported: {json_path}")
+        if fmt not in ("ndjson", "both"):
+            # only needed for the conversion
+            os.remove(ndjson_path)
+    if store is not None:
+        removed = store.finish()
+        store.close()
+        LOG.info(f"SQLite result store: {store.count} items upserted, {removed} stale items removed: {args.sqlite_db}")
+    return sink.count
+
+
+async def create_client(args, session: aiohttp.ClientSession, client_secret: str, shared_rate: Optional[SharedRateState] = None) -> GraphClient:
+    """GraphClient with the rate controller, label settings and label catalogue of `args`."""
+    # One adaptive limit for all requests of this client (traversal and details)
+    rate = None
+    if not args.no_rate_control:
+        rate = RateController(max(args.concurrency, args.traversal_concurrency or 0), shared=shared_rate)
+    client = GraphClient(args.tenant_id, args.client_id, client_secret, session, use_beta=args.use_beta, max_retries=args.max_retry, fail_on_throttle=args.fail_on_throttle, rate=rate, graph_base_url=args.graph_base_url, login_base_url=args.login_base_url)
+    # attach progress interval from args so gather_file_details can read it
+    setattr(client, "progress_interval", args.progress_interval)
+    setattr(client, "adaptive_labels", not args.no_adaptive_labels)
+    setattr(client, "label_reprobe_every", args.label_reprobe_every)
+    # Tenant label definitions, shared by all drives of this run
+    catalog = LabelCatalog(args.label_cache or os.path.join(args.output_dir or "./output", "label_catalog.json"), args.tenant_id, args.label_cache_ttl)
+    await catalog.load(client)
+    setattr(client, "label_catalog", catalog)
+    return client
+
+
 async def main_async(args):
     logging.basicConfig(level=logging.INFO if not args.verbose else logging.DEBUG)
     # Optionally ignore SIGINT for a short period to work around external killers
@@ -827,6 +2545,12 @@ async def main_async(args):
         # synchronous sleep here on purpose so signal handlers can be observed
         import time as _t
         _t.sleep(hold)
+    outdir = args.output_dir or "./output"
+    if args.incremental and not args.dry_run and (args.only_progress or not (args.export_json or args.stream)):
+        # incremental runs update the previous results
+        LOG.info("--incremental implies --export-json")
+        args.export_json = True
+        args.only_progress = False
     # Dry-run mode: generate mock items and export without calling Graph
     if args.dry_run:
         LOG.info("DryRun mode: loading mock items locally (no network calls)")
@@ -838,12 +2562,8 @@ async def main_async(args):
             mock = json.load(mf)
 
         # Optionally start the live monitor for dry-run so we can test it
-        monitor_queue = None
-        monitor_task = None
-        if not args.no_progress and args.progress_interval and args.progress_interval > 0:
-            monitor_queue = asyncio.Queue()
-            set_live_queue(monitor_queue)
-            monitor_task = asyncio.create_task(live_display_loop(monitor_queue, interval=1.0))
+        monitor = LiveMonitor(interval=1.0, show=not args.no_progress and args.progress_interval > 0, status_port=args.status_port)
+        await monitor.start()
 
         # build details directly from loaded mock
         details = []
@@ -870,27 +2590,13 @@ async def main_async(args):
                     d["quickXorHash"] = hashes.get("quickXorHash")
             # optionally map a sample label if present in mock
             fields = it.get("fields")
-            if fields and isinstance(fields, dict):
-                # copy some common names
-                for k in fields:
-                    if k.lower().endswith('displayname') or 'label' in k.lower() or 'compliance' in k.lower():
-                        if not d.get('sensitivityLabelName'):
-                            d['sensitivityLabelName'] = fields[k]
+            if fields and isinstance(fields, dict) and fields.get(LABEL_ID_FIELD):
+                d["sensitivityLabelId"] = fields[LABEL_ID_FIELD]
+                d["sensitivityLabelName"] = fields.get(LABEL_NAME_FIELD)
             details.append(d)
-            try:
-                monitor_add_details(1)
-            except Exception:
-                pass
+            COUNTERS.details += 1
 
-        # stop monitor if running
-        try:
-            if monitor_task and monitor_queue:
-                await monitor_queue.put({"type": "stop"})
-                await monitor_task
-        except Exception:
-            pass
-        finally:
-            set_live_queue(None)
+        await monitor.stop()
     else:
         async with aiohttp.ClientSession() as session:
             # Resolve client secret: CLI -> env -> Key Vault
@@ -913,73 +2619,48 @@ async def main_async(args):
             if not client_secret:
                 raise RuntimeError("Client secret not provided. Pass --client-secret, set GRAPH_CLIENT_SECRET env var, or use --use-keyvault.")
 
-            client = GraphClient(args.tenant_id, args.client_id, client_secret, session, use_beta=args.use_beta, max_retries=args.max_retry, fail_on_throttle=args.fail_on_throttle)
-            # attach progress interval from args so gather_file_details can read it
-            setattr(client, "progress_interval", args.progress_interval)
+            shared_rate = SharedRateState(multiprocessing.get_context("spawn")) if args.processes > 1 else None
+            client = await create_client(args, session, client_secret, shared_rate)
+            rate = client.rate
 
-            LOG.info("Collecting folder structure and file list (fast scan)")
             # Start a background live monitor showing folders/files/details if
-            # progress is enabled. Use a short interval for responsive updates.
-            monitor_queue = None
-            monitor_task = None
-            if not args.no_progress and args.progress_interval and args.progress_interval > 0:
-                monitor_queue = asyncio.Queue()
-                set_live_queue(monitor_queue)
-                monitor_task = asyncio.create_task(live_display_loop(monitor_queue, interval=1.0))
-            # Request the file facet in listings to reduce per-item GETs
-            folders, files = await collect_folders_and_files(client, args.drive_id, args.page_size, include_file=True)
-            LOG.info(f"Collected {len(folders)} folders and {len(files)} files (initial scan)")
+            # progress is enabled, and/or the local status endpoint.
+            def _status_extra() -> Dict[str, Any]:
+                extra: Dict[str, Any] = {"requests": {k: e["requests"] for k, e in client.metrics.endpoints.items()}}
+                if rate is not None:
+                    extra["rate"] = {"limit": round(rate.limit, 1), "inFlight": rate.in_flight, "completed": rate.completed, "throttled": rate.throttled}
+                return extra
+            monitor = LiveMonitor(interval=1.0, show=not args.no_progress and args.progress_interval > 0, status_port=args.status_port, extra=_status_extra)
+            await monitor.start()
 
-            # Now fetch file details
-            if args.use_batch:
-                details = await batch_gather_file_details(client, args.drive_id, files, args.site_id, args.batch_size, args.concurrency, args.request_delay_ms, show_progress=not args.no_progress)
-            else:
-                # parallel per-item GETs; if --no-per-item-get is set we will not perform per-item GETs
-                details = await gather_file_details(client, args.drive_id, files, args.site_id, args.concurrency, args.request_delay_ms, show_progress=not args.no_progress, no_per_item_get=args.no_per_item_get)
-            # Stop live monitor (if any) now that details are complete
             try:
-                if monitor_task and monitor_queue:
-                    await monitor_queue.put({"type": "stop"})
-                    await monitor_task
-            except Exception:
-                pass
-            finally:
-                set_live_queue(None)
-        # Export or show only progress
-        outdir = args.output_dir or "./output"
-        if args.only_progress:
-            # Show a final progress bar for the number of processed items
-            total_final = len(details)
-            try:
-                final_pbar = tqdm(total=total_final, desc="Finalizing (no files)")
-            except Exception:
-                final_pbar = None
-            for _ in range(total_final):
-                if final_pbar:
-                    final_pbar.update(1)
+                if args.site_drives:
+                    await scan_sites(client, args, outdir)
+                elif args.processes > 1:
+                    await scan_drive_sharded(client, args, client_secret, shared_rate)
                 else:
-                    # small sleep to make a readable log stream
-                    time.sleep(0.01)
-            if final_pbar:
-                final_pbar.close()
-            LOG.info(f"Done: processed {total_final} items (no files written)")
-        else:
-            os.makedirs(outdir, exist_ok=True)
-            if args.export_json:
-                json_path = os.path.join(outdir, "drive_analysis.json")
-                save_json(details, json_path)
-                LOG.info(f"JSON exported: {json_path}")
-            if args.export_csv:
-                csv_path = os.path.join(outdir, "drive_analysis.csv")
-                # write simple CSV
-                import csv
-                keys = ["id", "name", "path", "size", "quickXorHash", "sensitivityLabelId", "sensitivityLabelName", "createdDateTime", "lastModifiedDateTime"]
-                with open(csv_path, "w", encoding="utf-8", newline="") as cf:
-                    w = csv.DictWriter(cf, fieldnames=keys, extrasaction="ignore")
-                    w.writeheader()
-                    for r in details:
-                        w.writerow(r)
-                LOG.info(f"CSV exported: {csv_path}")
+                    await scan_drive(client, args)
+            finally:
+                # Stop live monitor (if any) now that all scans are complete
+                try:
+                    await monitor.stop()
+                except Exception:
+                    pass
+                if rate is not None:
+                    LOG.info(f"Rate controller: {rate.summary()}")
+                first_result = COUNTERS.first_result_seconds()
+                if first_result is not None:
+                    LOG.info(f"Time to first result: {first_result:.2f}s")
+                # where the time went, also for runs that failed
+                LOG.info("Graph request metrics:\n" + client.metrics.summary())
+                metrics_path = args.metrics_file or os.path.join(outdir, "graph_metrics.json")
+                try:
+                    metrics = client.metrics.to_dict()
+                    metrics["firstResultSeconds"] = first_result
+                    save_json(metrics, metrics_path)
+                    LOG.info(f"Request metrics written: {metrics_path}")
+                except Exception as ex:
+                    LOG.warning(f"Could not write request metrics {metrics_path}: {ex}")
 
 
 def parse_args():
@@ -990,29 +2671,60 @@ def parse_args():
     p.add_argument("--dry-run", action="store_true", help="Run local dry-run without calling Graph (uses mock data)")
     p.add_argument("--dry-run-file", required=False, help="Path to a JSON file with mock items to use for --dry-run (default: ./SharepointAnalysis/dryrun_mock.json)")
     p.add_argument("--site-id", required=False)
-    p.add_argument("--drive-id", required=True)
+    p.add_argument("--drive-id", required=False, help="Drive to scan (required unless --site-drives is given)")
+    p.add_argument("--site-drives", nargs="+", metavar="SITE_ID", required=False, help="Scan every document library of these sites concurrently, sharing one client and rate limit; results go to <output-dir>/drives/<drive id>/")
+    p.add_argument("--drive-concurrency", type=int, default=4, help="Number of drives scanned at the same time with --site-drives")
+    p.add_argument("--processes", type=int, default=1, help="Scan the drive with N processes (split by top-level folders); --concurrency is shared between them")
     p.add_argument("--page-size", type=int, default=200)
     p.add_argument("--hold-start-seconds", type=int, default=0, help="Seconds to wait before starting network calls (useful for diagnostic PID observation)")
     p.add_argument("--ignore-sigint-seconds", type=int, default=0, help="Temporarily ignore SIGINT for N seconds at startup (diagnostic)")
     p.add_argument("--concurrency", type=int, default=8, help="Number of concurrent file detail requests")
+    p.add_argument("--traversal-concurrency", type=int, default=0, help="Number of folders listed concurrently during discovery (default: same as --concurrency)")
     p.add_argument("--request-delay-ms", type=int, default=0, help="Max random delay per request (ms)")
     p.add_argument("--output-dir", default="./SharepointAnalysis/output")
     p.add_argument("--progress-interval", type=int, default=10, help="Seconds between textual progress logs (0 disables)")
     p.add_argument("--use-batch", action="store_true", help="Use Microsoft Graph $batch endpoint to fetch file details in batches")
     p.add_argument("--batch-size", type=int, default=20, help="Number of items per batch request (max 20 requests per batch)")
+    p.add_argument("--batch-traversal", action="store_true", help="List folder children through $batch (up to --batch-size folder pages per request)")
+    p.add_argument("--pipeline", action="store_true", help="Fetch file details while the folders are still being listed; both stages share the rate controller's in-flight limit")
+    p.add_argument("--no-rate-control", action="store_true", help="Disable the shared adaptive (AIMD) limit on in-flight requests and the global pause on Retry-After")
     p.add_argument("--fail-on-throttle", action="store_true", help="Do not retry on 429/5xx; fail immediately (useful when another sync is causing transient errors)")
     p.add_argument("--export-json", dest="export_json", action="store_true")
     p.add_argument("--export-csv", dest="export_csv", action="store_true")
+    p.add_argument("--stream", action="store_true", help="Write results to disk as they complete (drive_analysis.ndjson / .csv) instead of collecting them in memory; --export-json then converts the stream to the JSON array at the end")
+    p.add_argument("--sqlite-db", required=False, help="Upsert results into the drive_items table of this SQLite database (indexed by path, quickXorHash and label)")
+    p.add_argument("--stream-format", choices=["ndjson", "csv", "both"], default="ndjson", help="Format(s) written with --stream")
+    p.add_argument("--compress", choices=list(COMPRESS_EXT), default="none", help="Compress streamed output (gzip, or zstd with the 'zstandard' package)")
     p.add_argument("--use-beta", action="store_true")
+    p.add_argument("--graph-base-url", default="https://graph.microsoft.com", help="Graph endpoint (e.g. http://127.0.0.1:8765 for graph_emulator.py)")
+    p.add_argument("--login-base-url", default="https://login.microsoftonline.com", help="Token endpoint host (e.g. http://127.0.0.1:8765 for graph_emulator.py)")
+    p.add_argument("--incremental", action="store_true", help="Use the delta API: after a first full scan, only fetch items changed since the last run and update drive_analysis.json")
+    p.add_argument("--delta-state", required=False, help="Path of the delta state file (default: <output-dir>/delta_state.json)")
     p.add_argument("--use-keyvault", action="store_true", help="Retrieve client secret from Azure Key Vault (requires --keyvault-name and --keyvault-secret-name)")
     p.add_argument("--keyvault-name", required=False, help="Azure Key Vault name (no .vault.azure.net suffix)")
     p.add_argument("--keyvault-secret-name", required=False, help="Name of the secret in Key Vault to read the client secret from")
     p.add_argument("--no-per-item-get", action="store_true", help="Do not perform per-item GETs for file.hashes; rely on file facet from the initial listing")
+    p.add_argument("--no-adaptive-labels", action="store_true", help="Query every label source for every file instead of learning per drive which one returns labels")
+    p.add_argument("--label-reprobe-every", type=int, default=500, help="Re-check all label sources on one in every N files once a source has been selected")
+    p.add_argument("--label-cache", required=False, help="Sensitivity label catalogue cache file (default: <output-dir>/label_catalog.json)")
+    p.add_argument("--label-cache-ttl", type=float, default=24.0, help="Hours before the label catalogue is fetched again (0 always refetches)")
     p.add_argument("--no-progress", action="store_true")
+    p.add_argument("--status-port", type=int, default=0, help="Serve live counters as JSON on http://127.0.0.1:<port>/status (for headless runs)")
     p.add_argument("--only-progress", action="store_true", help="Do not write JSON/CSV files; only show a final progress bar and summary")
     p.add_argument("--max-retry", type=int, default=6)
+    p.add_argument("--checkpoint", action="store_true", help="Record scan progress (folders, pending pages, finished details) in a SQLite checkpoint so an interrupted scan can be resumed")
+    p.add_argument("--resume", action="store_true", help="Continue an interrupted scan from the checkpoint (implies --checkpoint)")
+    p.add_argument("--checkpoint-db", required=False, help="Checkpoint file (default: <output-dir>/scan_checkpoint.db)")
+    p.add_argument("--metrics-file", required=False, help="Per-endpoint request metrics (latency histogram, statuses, retries, bytes) as JSON (default: <output-dir>/graph_metrics.json)")
     p.add_argument("--verbose", action="store_true")
-    return p.parse_args()
+    args = p.parse_args()
+    if not args.drive_id and not args.site_drives and not args.dry_run:
+        p.error("one of --drive-id or --site-drives is required")
+    if args.processes > 1 and (args.site_drives or args.incremental or args.checkpoint or args.resume or args.dry_run):
+        p.error("--processes cannot be combined with --site-drives, --incremental, --checkpoint/--resume or --dry-run")
+    if args.pipeline and (args.checkpoint or args.resume):
+        p.error("--pipeline cannot be combined with --checkpoint/--resume")
+    return args
 
 
 def main():
@@ -1111,19 +2823,34 @@ if __name__ == "__main__":
         '--client-secret': ['GRAPH_CLIENT_SECRET', 'CLIENT_SECRET', 'MS_GRAPH_CLIENT_SECRET'],
         '--site-id': ['GRAPH_SITE_ID', 'SITE_ID'],
         '--drive-id': ['GRAPH_DRIVE_ID', 'DRIVE_ID'],
+        '--site-drives': ['GRAPH_SITE_DRIVES', 'SITE_DRIVES'],
+        '--drive-concurrency': ['GRAPH_DRIVE_CONCURRENCY', 'DRIVE_CONCURRENCY'],
+        '--processes': ['GRAPH_PROCESSES', 'PROCESSES'],
         '--output-dir': ['GRAPH_OUTPUT_DIR', 'OUTPUT_DIR'],
+        '--graph-base-url': ['GRAPH_BASE_URL'],
+        '--login-base-url': ['GRAPH_LOGIN_BASE_URL'],
         '--batch-size': ['GRAPH_BATCH_SIZE', 'BATCH_SIZE'],
         '--concurrency': ['GRAPH_CONCURRENCY', 'CONCURRENCY'],
+        '--traversal-concurrency': ['GRAPH_TRAVERSAL_CONCURRENCY', 'TRAVERSAL_CONCURRENCY'],
         '--page-size': ['GRAPH_PAGE_SIZE', 'PAGE_SIZE'],
         '--export-json': ['GRAPH_EXPORT_JSON', 'EXPORT_JSON'],
         '--export-csv': ['GRAPH_EXPORT_CSV', 'EXPORT_CSV'],
         '--use-batch': ['GRAPH_USE_BATCH', 'USE_BATCH'],
+        '--batch-traversal': ['GRAPH_BATCH_TRAVERSAL', 'BATCH_TRAVERSAL'],
+        '--pipeline': ['GRAPH_PIPELINE', 'PIPELINE'],
         '--use-beta': ['GRAPH_USE_BETA', 'USE_BETA'],
+        '--incremental': ['GRAPH_INCREMENTAL', 'INCREMENTAL'],
+        '--checkpoint': ['GRAPH_CHECKPOINT', 'CHECKPOINT'],
+        '--stream': ['GRAPH_STREAM', 'STREAM'],
+        '--compress': ['GRAPH_COMPRESS', 'COMPRESS'],
+        '--sqlite-db': ['GRAPH_SQLITE_DB', 'SQLITE_DB'],
+        '--label-cache': ['GRAPH_LABEL_CACHE'],
+        '--label-cache-ttl': ['GRAPH_LABEL_CACHE_TTL'],
     }
 
     # Options that are flags (no value expected). If the env var is truthy,
     # we add the option name alone. All other options are key/value pairs.
-    flag_options = {'--export-json', '--export-csv', '--use-batch', '--use-beta', '--no-per-item-get', '--no-progress', '--dry-run', '--verbose', '--fail-on-throttle'}
+    flag_options = {'--export-json', '--export-csv', '--use-batch', '--batch-traversal', '--pipeline', '--use-beta', '--incremental', '--stream', '--checkpoint', '--no-per-item-get', '--no-progress', '--dry-run', '--verbose', '--fail-on-throttle'}
 
     env_args: List[str] = []
     for opt, env_vars in env_map.items():
@@ -1149,6 +2876,10 @@ if __name__ == "__main__":
         if opt in flag_options:
             if str(val).lower() in ("1", "true", "yes", "on"):
                 env_args.append(opt)
+        elif opt == '--site-drives':
+            # comma or space separated list of site ids
+            env_args.append(opt)
+            env_args.extend(val.replace(',', ' ').split())
         else:
             env_args.extend([opt, val])
 
@@ -3,10 +3,12 @@ Simple synchronous Microsoft Graph Drive scanner.
 
 Features:
 - App-only client_credentials token via requests
-- Recursive drive listing (paging)
-- Parallel per-file enrichment using ThreadPoolExecutor
+- One pooled requests.Session shared by all worker threads (keep-alive, no per-call TLS handshake)
+- Recursive drive listing (paging); folders are listed in parallel on the same
+  ThreadPoolExecutor that enriches files, so details start while traversal runs
+- Retry on 429/5xx honoring Retry-After
 - Dry-run mode using existing `dryrun_mock.json`
-- JSON export
+- JSON export, optional SQLite result store (--sqlite-db)
 
 This script is a simpler alternative to the async scanner and is
 designed to be more predictable on Windows terminals and easier to
@@ -21,11 +23,15 @@ import time
 import logging
 from typing import List, Dict, Any, Optional
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 import signal
 import traceback
 import getpass
 
+from result_store import DriveItemStore
+
 try:
     from tqdm import tqdm
 except Exception:
@@ -35,6 +41,10 @@ except Exception:
 
 LOG = logging.getLogger("graph_drive_scanner_simple")
 
+GRAPH_BASE_URL = "https://graph.microsoft.com"
+LOGIN_BASE_URL = "https://login.microsoftonline.com"
+SELECT = "id,name,folder,file,parentReference,size,createdDateTime,lastModifiedDateTime"
+
 # Diagnostic startup log for the simple scanner
 DIAG_SIMPLE_PATH = os.path.join(os.path.dirname(__file__), 'diagnostic_simple_startup.log')
 
@@ -110,29 +120,61 @@ def install_simple_startup_diagnostics():
             pass
 
 
-# Install simple diagnostics early
-install_simple_startup_diagnostics()
+# Install simple diagnostics early (script runs only:
+# importing the module, e.g. from tests, leaves the log alone)
+if __name__ == "__main__":
+    install_simple_startup_diagnostics()
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """Session whose connection pool serves `pool_size` threads.
+
+    The session is shared by all worker threads. It is only used for its
+    connection pool: auth headers are passed per request and no session
+    state (headers, cookies) is changed after creation."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
-def acquire_token(tenant_id: str, client_id: str, client_secret: str) -> str:
-    url = f"https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+def acquire_token(session: requests.Session, tenant_id: str, client_id: str, client_secret: str, login_base_url: str = LOGIN_BASE_URL) -> str:
+    url = f"{login_base_url}/{tenant_id}/oauth2/v2.0/token"
     data = {
         "client_id": client_id,
         "scope": "https://graph.microsoft.com/.default",
         "client_secret": client_secret,
         "grant_type": "client_credentials",
     }
-    r = requests.post(url, data=data, timeout=30)
+    r = session.post(url, data=data, timeout=30)
     if r.status_code != 200:
         raise RuntimeError(f"Token request failed: {r.status_code} {r.text}")
     return r.json()["access_token"]
 
 
-def paged_get(access_token: str, url: str) -> List[Dict[str, Any]]:
+def graph_get(session: requests.Session, access_token: str, url: str, max_retries: int = 6) -> requests.Response:
+    """GET with retry on 429/5xx (honors Retry-After, else exponential backoff)."""
     headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
+    attempt = 0
+    while True:
+        r = session.get(url, headers=headers, timeout=30)
+        if (r.status_code == 429 or r.status_code >= 500) and attempt < max_retries:
+            try:
+                wait_s = float(r.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                wait_s = 1.5 ** (attempt + 1)
+            LOG.debug(f"{url} returned {r.status_code}; retrying in {wait_s:.1f}s")
+            time.sleep(wait_s)
+            attempt += 1
+            continue
+        return r
+
+
+def paged_get(session: requests.Session, access_token: str, url: str) -> List[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
     while url:
-        r = requests.get(url, headers=headers, timeout=30)
+        r = graph_get(session, access_token, url)
         r.raise_for_status()
         j = r.json()
         if isinstance(j, dict) and "value" in j:
@@ -153,31 +195,77 @@ def build_path(item: Dict[str, Any]) -> str:
     return item.get("name", "")
 
 
-def list_all_items(access_token: str, drive_id: str, page_size: int = 200) -> (List[Dict[str, Any]], List[Dict[str, Any]]):
-    api_base = "https://graph.microsoft.com/v1.0"
-    # initial children of root
-    url = f"{api_base}/drives/{drive_id}/root/children?$top={page_size}&$select=id,name,folder,file,parentReference,size,createdDateTime,lastModifiedDateTime"
-    all_items = paged_get(access_token, url)
-    folders = [it for it in all_items if it.get("folder")]
-    files = [it for it in all_items if not it.get("folder")]
-
-    idx = 0
-    while idx < len(folders):
-        f = folders[idx]
-        children_url = f"{api_base}/drives/{drive_id}/items/{f['id']}/children?$top={page_size}&$select=id,name,folder,file,parentReference,size,createdDateTime,lastModifiedDateTime"
-        children = paged_get(access_token, children_url)
-        for c in children:
-            if c.get("folder"):
-                folders.append(c)
-            else:
-                files.append(c)
-        idx += 1
-
-    return folders, files
-
-
-def fetch_file_detail(access_token: str, drive_id: str, item: Dict[str, Any]) -> Dict[str, Any]:
-    api_base = "https://graph.microsoft.com/v1.0"
+def list_children(session: requests.Session, access_token: str, drive_id: str, folder: Optional[Dict[str, Any]], page_size: int = 200, api_base: str = GRAPH_BASE_URL + "/v1.0") -> List[Dict[str, Any]]:
+    """All children of `folder` (None = drive root), following nextLinks."""
+    target = "root" if folder is None else f"items/{folder['id']}"
+    return paged_get(session, access_token, f"{api_base}/drives/{drive_id}/{target}/children?$top={page_size}&$select={SELECT}")
+
+
+def scan_drive_items(session: requests.Session, access_token: str, drive_id: str, page_size: int = 200, concurrency: int = 8, api_base: str = GRAPH_BASE_URL + "/v1.0", show_progress: bool = True):
+    """List the drive and fetch file details on one thread pool.
+
+    The calling thread coordinates: it keeps up to `concurrency` tasks
+    running, preferring folder listings over file details so the traversal
+    frontier grows quickly, and submits details for the files of every
+    listed folder right away. Folders that still cannot be listed after
+    retries are logged and skipped like failed details.
+    Returns (folders, files, details, unlisted folders).
+    """
+    folders: List[Dict[str, Any]] = []
+    files: List[Dict[str, Any]] = []
+    details: List[Dict[str, Any]] = []
+    unlisted: List[Optional[Dict[str, Any]]] = []
+    to_list: deque = deque([None])
+    to_fetch: deque = deque()
+    running: Dict[Any, Any] = {}
+    pbar = tqdm(total=0, desc="Files") if show_progress else None
+    if not hasattr(pbar, "update"):
+        pbar = None
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        while to_list or to_fetch or running:
+            while len(running) < concurrency and (to_list or to_fetch):
+                if to_list:
+                    folder = to_list.popleft()
+                    running[ex.submit(list_children, session, access_token, drive_id, folder, page_size, api_base)] = ("list", folder)
+                else:
+                    item = to_fetch.popleft()
+                    running[ex.submit(fetch_file_detail, session, access_token, drive_id, item, api_base)] = ("detail", item)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                kind, obj = running.pop(fut)
+                if kind == "list":
+                    try:
+                        children = fut.result()
+                    except Exception as exc:
+                        where = "drive root" if obj is None else f"folder {obj.get('id')} ({build_path(obj)})"
+                        LOG.warning(f"Listing {where} failed, skipping it: {exc}")
+                        unlisted.append(obj)
+                        continue
+                    new_files = 0
+                    for c in children:
+                        if c.get("folder"):
+                            folders.append(c)
+                            to_list.append(c)
+                        else:
+                            files.append(c)
+                            to_fetch.append(c)
+                            new_files += 1
+                    if pbar is not None and new_files:
+                        pbar.total += new_files
+                        pbar.refresh()
+                else:
+                    try:
+                        details.append(fut.result())
+                    except Exception as exc:
+                        LOG.warning(f"Per-item fetch failed: {exc}")
+                    if pbar is not None:
+                        pbar.update(1)
+    if pbar is not None:
+        pbar.close()
+    return folders, files, details, unlisted
+
+
+def fetch_file_detail(session: requests.Session, access_token: str, drive_id: str, item: Dict[str, Any], api_base: str = GRAPH_BASE_URL + "/v1.0") -> Dict[str, Any]:
     base = {
         "id": item.get("id"),
         "name": item.get("name"),
@@ -200,8 +288,7 @@ def fetch_file_detail(access_token: str, drive_id: str, item: Dict[str, Any]) ->
     if base["quickXorHash"] is None:
         # perform per-item GET
         url = f"{api_base}/drives/{drive_id}/items/{item['id']}?$select=file,sensitivityLabel"
-        headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/json"}
-        r = requests.get(url, headers=headers, timeout=30)
+        r = graph_get(session, access_token, url)
         if r.status_code == 200:
             j = r.json()
             ffacet = j.get("file")
@@ -230,13 +317,17 @@ def parse_args():
     p.add_argument("--client-secret", required=False)
     p.add_argument("--drive-id", required=False)
     p.add_argument("--page-size", type=int, default=200)
-    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--concurrency", type=int, default=8, help="Worker threads for folder listing and file details")
+    p.add_argument("--graph-base-url", default=GRAPH_BASE_URL, help="Graph endpoint (e.g. http://127.0.0.1:8765 for graph_emulator.py)")
+    p.add_argument("--login-base-url", default=LOGIN_BASE_URL, help="Token endpoint host")
+    p.add_argument("--no-progress", action="store_true")
     p.add_argument("--hold-start-seconds", type=int, default=0, help="Seconds to wait before starting network calls (diagnostic)")
     p.add_argument("--ignore-sigint-seconds", type=int, default=0, help="Temporarily ignore SIGINT for N seconds at startup (diagnostic)")
     p.add_argument("--dry-run", action="store_true")
     p.add_argument("--dry-run-file", default=os.path.join(os.path.dirname(__file__), "dryrun_mock.json"))
     p.add_argument("--output", default=os.path.join(os.path.dirname(__file__), "output", "drive_analysis_simple.json"))
     p.add_argument("--export-csv", action="store_true")
+    p.add_argument("--sqlite-db", required=False, help="Upsert results into the drive_items table of this SQLite database")
     p.add_argument("--verbose", action="store_true")
     return p.parse_args()
 
@@ -326,23 +417,17 @@ def main():
     if not tenant_id or not client_id or not client_secret or not drive_id:
         raise RuntimeError("Missing required credentials/drive id. Provide --tenant-id, --client-id, --client-secret and --drive-id or set env vars.")
 
-    token = acquire_token(tenant_id, client_id, client_secret)
+    session = make_session(args.concurrency)
+    token = acquire_token(session, tenant_id, client_id, client_secret, args.login_base_url.rstrip("/"))
     LOG.info("Acquired access token")
 
-    LOG.info("Collecting items...")
-    folders, files = list_all_items(token, drive_id, page_size=args.page_size)
-    LOG.info(f"Found {len(folders)} folders and {len(files)} files")
-
-    # fetch details in parallel
-    details = []
-    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
-        futures = {ex.submit(fetch_file_detail, token, drive_id, it): it for it in files}
-        for fut in tqdm(as_completed(futures), total=len(futures)):
-            try:
-                r = fut.result()
-                details.append(r)
-            except Exception as ex:
-                LOG.warning(f"Per-item fetch failed: {ex}")
+    LOG.info("Collecting items and fetching details...")
+    started = time.time()
+    api_base = args.graph_base_url.rstrip("/") + "/v1.0"
+    folders, files, details, unlisted = scan_drive_items(session, token, drive_id, page_size=args.page_size, concurrency=args.concurrency, api_base=api_base, show_progress=not args.no_progress)
+    LOG.info(f"Found {len(folders)} folders and {len(files)} files; {len(details)} details in {time.time() - started:.1f}s")
+    if unlisted:
+        LOG.warning(f"{len(unlisted)} folders could not be listed; their contents are missing from the results")
 
     save_json(details, args.output)
     LOG.info(f"Exported results to {args.output}")
@@ -356,6 +441,15 @@ def main():
             for r in details:
                 w.writerow(r)
         LOG.info(f"CSV exported: {csv_path}")
+    if args.sqlite_db:
+        store = DriveItemStore(args.sqlite_db, drive_id)
+        try:
+            store.add_all(details)
+            # files whose details or folders failed are missing: keep their previous rows
+            removed = store.finish() if len(details) == len(files) and not unlisted else 0
+        finally:
+            store.close()
+        LOG.info(f"SQLite result store: {store.count} items upserted, {removed} stale items removed: {args.sqlite_db}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,419 @@
+r"""
+Local Microsoft Graph emulator for scanner benchmarks
+
+Serves a synthetic SharePoint drive over the Graph endpoints used by
+graph_drive_scanner.py and graph_drive_scanner_simple.py:
+
+- POST /{tenant}/oauth2/v2.0/token            client_credentials token
+- GET  /v1.0|beta/sites/{site}/drives           document libraries of a site
+- GET  .../drives/{d}/root/children             paged with @odata.nextLink
+- GET  .../drives/{d}/items/{id}/children       paged with @odata.nextLink
+- GET  .../drives/{d}/items/{id}                item ($select=file,sensitivityLabel)
+- GET  .../drives/{d}/items/{id}/listItem       listItem?$expand=fields
+- GET  .../drives/{d}/root/delta                delta query (token=latest supported)
+- POST .../$batch                               up to 20 sub-requests
+- GET  /beta/security/informationProtection/sensitivityLabels
+
+Drive size, latency distribution and throttling (random 429s and a
+concurrency ceiling, both with Retry-After) are configurable, so the
+scanners can be load-tested without a tenant. parentReference.path has the
+form Graph returns for /drives/{id} requests (`/drives/{id}/root:/A`);
+`--path-format drive` switches to the short `/drive/root:/A` form.
+
+Usage:
+  python .\SharepointAnalysis\graph_emulator.py --port 8765 --folders-per-folder 5 --depth 3 --files-per-folder 20 --latency-ms 40 --throttle-rate 0.02
+  python .\SharepointAnalysis\graph_drive_scanner.py --graph-base-url http://127.0.0.1:8765 --login-base-url http://127.0.0.1:8765 --tenant-id t --client-id c --client-secret s --drive-id emu-drive-0 ...
+
+Requires: aiohttp
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from aiohttp import web
+
+LOG = logging.getLogger("graph_emulator")
+
+LABELS = [
+    ("9fbde396-1a24-4c79-8edf-9254a0f35055", "Public"),
+    ("87ba5c36-b7cf-4793-bbc2-bd5b3a9f95ca", "General"),
+    ("1fd2d1bd-8d3f-4b9a-9c73-3b0bd1f2b4b0", "Confidential"),
+    ("5a2e9d1c-22b3-4f1e-8a27-5e6b0f0f4c11", "Highly Confidential"),
+]
+LABEL_NAMES = dict(LABELS)
+
+
+class Item:
+    __slots__ = ("id", "name", "parent", "is_folder", "size", "qxh", "label", "children", "modified", "version", "deleted")
+
+    def __init__(self, id: str, name: str, parent: Optional["Item"], is_folder: bool, size: int = 0,
+                 qxh: Optional[str] = None, label: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.parent = parent
+        self.is_folder = is_folder
+        self.size = size
+        self.qxh = qxh
+        self.label = label
+        self.children: List[Item] = []
+        self.modified = "2024-01-01T00:00:00Z"
+        self.version = 0
+        self.deleted = False
+
+    def path(self, prefix: str) -> str:
+        parts = []
+        node = self.parent
+        while node is not None and node.parent is not None:
+            parts.append(node.name)
+            node = node.parent
+        return prefix + ("/" + "/".join(reversed(parts)) if parts else "")
+
+
+class Drive:
+    """Deterministic synthetic drive tree."""
+
+    def __init__(self, drive_id: str, folders_per_folder: int, depth: int, files_per_folder: int,
+                 label_rate: float, seed: int, path_format: str = "drives"):
+        self.id = drive_id
+        self.path_prefix = f"/drives/{drive_id}/root:" if path_format == "drives" else "/drive/root:"
+        self.rnd = random.Random(seed)
+        self.root = Item("root-" + drive_id, "root", None, True)
+        self.items: Dict[str, Item] = {self.root.id: self.root}
+        self.label_rate = label_rate
+        self.counter = 0
+        # change log for delta: list of (seq, item_id)
+        self.changes: List[Tuple[int, str]] = []
+        self.seq = 0
+        self._build(self.root, depth, folders_per_folder, files_per_folder)
+
+    def _new_id(self) -> str:
+        self.counter += 1
+        return f"{self.id}-{self.counter:08d}"
+
+    def _add(self, parent: Item, name: str, is_folder: bool) -> Item:
+        iid = self._new_id()
+        if is_folder:
+            it = Item(iid, name, parent, True)
+        else:
+            size = int(math.exp(self.rnd.gauss(11, 2))) + 1
+            digest = hashlib.sha1(f"{iid}:{size}".encode()).digest()
+            qxh = base64.b64encode(digest).decode()
+            label = LABELS[self.rnd.randrange(len(LABELS))][0] if self.rnd.random() < self.label_rate else None
+            it = Item(iid, name, parent, False, size, qxh, label)
+        parent.children.append(it)
+        self.items[iid] = it
+        self._grow(parent, it.size)
+        return it
+
+    @staticmethod
+    def _grow(folder: Optional[Item], delta: int) -> None:
+        """Keep folder sizes (total bytes below, as Graph reports them) current."""
+        while folder is not None:
+            folder.size += delta
+            folder = folder.parent
+
+    def _build(self, folder: Item, depth: int, fpf: int, files: int) -> None:
+        for i in range(files):
+            self._add(folder, f"file_{i:04d}.docx", False)
+        if depth <= 0:
+            return
+        for i in range(fpf):
+            sub = self._add(folder, f"folder_{i:03d}", True)
+            self._build(sub, depth - 1, fpf, files)
+
+    def mutate(self, n: int) -> None:
+        """Apply n random changes (modify / rename folder / add / delete) for delta testing."""
+        files = [it for it in self.items.values() if not it.is_folder and not it.deleted]
+        folders = [it for it in self.items.values() if it.is_folder and not it.deleted]
+        for _ in range(n):
+            self.seq += 1
+            r = self.rnd.random()
+            if r < 0.5 and files:
+                it = self.rnd.choice(files)
+                it.size += 1
+                self._grow(it.parent, 1)
+                it.version += 1
+                it.qxh = base64.b64encode(hashlib.sha1(f"{it.id}:{it.size}".encode()).digest()).decode()
+                it.modified = "2025-01-01T00:00:00Z"
+            elif r < 0.6 and len(folders) > 1:
+                it = self.rnd.choice(folders[1:])
+                it.name = it.name + "_renamed"
+                it.version += 1
+            elif r < 0.85:
+                it = self._add(self.rnd.choice(folders), f"new_{self.seq}.xlsx", False)
+                files.append(it)
+            elif files:
+                it = files.pop(self.rnd.randrange(len(files)))
+                it.deleted = True
+                it.parent.children.remove(it)
+                self._grow(it.parent, -it.size)
+            self.changes.append((self.seq, it.id))
+
+    def to_json(self, it: Item, select: Optional[List[str]] = None) -> Dict[str, Any]:
+        d: Dict[str, Any] = {
+            "id": it.id,
+            "name": it.name,
+            "size": it.size,
+            "createdDateTime": "2023-01-01T00:00:00Z",
+            "lastModifiedDateTime": it.modified,
+            "createdBy": {"user": {"displayName": "Emulator User", "email": "emu@example.com", "id": "u-1"}},
+            "lastModifiedBy": {"user": {"displayName": "Emulator User", "email": "emu@example.com", "id": "u-1"}},
+            "parentReference": {"driveId": self.id, "driveType": "documentLibrary",
+                                "id": it.parent.id if it.parent else None, "path": it.path(self.path_prefix) if it.parent else None},
+        }
+        if it.is_folder:
+            d["folder"] = {"childCount": len(it.children)}
+        else:
+            d["file"] = {"mimeType": "application/octet-stream", "hashes": {"quickXorHash": it.qxh}}
+        if select:
+            keep = set(select) | {"id"}
+            if "sensitivityLabel" in keep and not it.is_folder:
+                d["sensitivityLabel"] = {"id": it.label, "displayName": LABEL_NAMES.get(it.label)} if it.label else None
+            d = {k: v for k, v in d.items() if k in keep}
+        return d
+
+
+class Emulator:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.drives: Dict[str, Drive] = {}
+        for i in range(args.drives):
+            did = f"emu-drive-{i}"
+            self.drives[did] = Drive(did, args.folders_per_folder, args.depth, args.files_per_folder,
+                                     args.label_rate, args.seed + i, args.path_format)
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {"requests": 0, "throttled": 0, "batch_subrequests": 0}
+        self.throttle_until = 0.0
+
+    # --- behaviour knobs -------------------------------------------------
+    async def latency(self) -> None:
+        a = self.args
+        if a.latency_ms <= 0:
+            return
+        ms = a.latency_ms * math.exp(self.rnd.gauss(0, a.latency_sigma))
+        await asyncio.sleep(ms / 1000.0)
+
+    def should_throttle(self) -> Optional[float]:
+        a = self.args
+        now = time.monotonic()
+        if now < self.throttle_until:
+            return max(0.0, self.throttle_until - now)
+        if a.max_in_flight and self.in_flight > a.max_in_flight:
+            self.throttle_until = now + a.retry_after
+            return a.retry_after
+        if a.throttle_rate and self.rnd.random() < a.throttle_rate:
+            return a.retry_after
+        return None
+
+    # --- HTTP handlers ---------------------------------------------------
+    @web.middleware
+    async def middleware(self, request: web.Request, handler):
+        if request.path.startswith("/_emulator"):
+            return await handler(request)
+        self.stats["requests"] += 1
+        if not request.path.endswith("/token"):
+            self.in_flight += 1
+        try:
+            if not request.path.endswith("/token"):
+                ra = self.should_throttle()
+                if ra is not None:
+                    self.stats["throttled"] += 1
+                    await self.latency()
+                    return web.json_response({"error": {"code": "TooManyRequests"}}, status=429,
+                                             headers={"Retry-After": f"{ra:.1f}"})
+            await self.latency()
+            return await handler(request)
+        finally:
+            if not request.path.endswith("/token"):
+                self.in_flight -= 1
+
+    async def token(self, request: web.Request):
+        return web.json_response({"token_type": "Bearer", "expires_in": 3599, "access_token": "emulator-token"})
+
+    async def graph(self, request: web.Request):
+        status, body, headers = self.dispatch("GET", request.path_qs, base=self.base_url(request))
+        return web.json_response(body, status=status, headers=headers)
+
+    async def batch(self, request: web.Request):
+        payload = await request.json()
+        reqs = payload.get("requests", [])
+        if len(reqs) > 20:
+            return web.json_response({"error": {"code": "BadRequest", "message": "Too many requests in batch"}}, status=400)
+        base = self.base_url(request)
+        responses = []
+        for r in reqs:
+            self.stats["batch_subrequests"] += 1
+            ra = None
+            if self.args.batch_throttle_rate and self.rnd.random() < self.args.batch_throttle_rate:
+                ra = self.args.retry_after
+            if ra is not None:
+                responses.append({"id": r.get("id"), "status": 429, "headers": {"Retry-After": f"{ra:.1f}"},
+                                  "body": {"error": {"code": "TooManyRequests"}}})
+                continue
+            url = r.get("url", "")
+            ver = request.path.split("/")[1]
+            status, body, headers = self.dispatch(r.get("method", "GET"), f"/{ver}" + url, base=base)
+            responses.append({"id": r.get("id"), "status": status, "headers": headers, "body": body})
+        return web.json_response({"responses": responses})
+
+    def base_url(self, request: web.Request) -> str:
+        return f"{request.scheme}://{request.host}"
+
+    def dispatch(self, method: str, path_qs: str, base: str) -> Tuple[int, Any, Dict[str, str]]:
+        parts = urlsplit(path_qs)
+        qs = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        segs = [s for s in parts.path.split("/") if s]
+        if not segs:
+            return 404, {"error": {"code": "itemNotFound"}}, {}
+        ver = segs[0]
+        segs = segs[1:]
+        if segs[:3] == ["security", "informationProtection", "sensitivityLabels"]:
+            return 200, {"value": [{"id": i, "name": n, "displayName": n, "isActive": True} for i, n in LABELS]}, {}
+        if len(segs) == 3 and segs[0] == "sites" and segs[2] == "drives":
+            return 200, {"value": [{"id": d, "name": f"Documents {d}", "driveType": "documentLibrary"} for d in self.drives]}, {}
+        if len(segs) >= 2 and segs[0] == "sites":
+            segs = segs[2:]
+        if len(segs) < 3 or segs[0] != "drives":
+            return 404, {"error": {"code": "invalidRequest", "message": parts.path}}, {}
+        drive = self.drives.get(segs[1])
+        if drive is None:
+            return 404, {"error": {"code": "itemNotFound", "message": "drive"}}, {}
+        rest = segs[2:]
+        select = qs.get("$select", "").split(",") if qs.get("$select") else None
+        if rest[0] == "root":
+            item = drive.root
+            rest = rest[1:]
+        elif rest[0] == "items" and len(rest) >= 2:
+            item = drive.items.get(rest[1])
+            rest = rest[2:]
+            if item is None or item.deleted:
+                return 404, {"error": {"code": "itemNotFound"}}, {}
+        else:
+            return 404, {"error": {"code": "invalidRequest"}}, {}
+
+        if not rest:
+            return 200, drive.to_json(item, select), {}
+        if rest == ["children"]:
+            top = int(qs.get("$top", 200))
+            skip = int(qs.get("$skiptoken", 0))
+            kids = item.children[skip:skip + top]
+            body: Dict[str, Any] = {"value": [drive.to_json(c, select) for c in kids]}
+            if skip + top < len(item.children):
+                body["@odata.nextLink"] = (f"{base}/{ver}/drives/{drive.id}/items/{item.id}/children"
+                                           f"?$top={top}&$skiptoken={skip + top}" + (f"&$select={qs['$select']}" if select else ""))
+            return 200, body, {}
+        if rest == ["listItem"]:
+            fields: Dict[str, Any] = {"FileLeafRef": item.name}
+            if item.label:
+                fields["_IpLabelId"] = item.label
+                fields["_DisplayName"] = LABEL_NAMES.get(item.label)
+            if self.args.listitem_without_labels:
+                fields = {"FileLeafRef": item.name}
+            return 200, {"id": "1", "fields": fields}, {}
+        if rest == ["delta"]:
+            return self.delta(drive, ver, qs, base)
+        return 404, {"error": {"code": "invalidRequest"}}, {}
+
+    def delta(self, drive: Drive, ver: str, qs: Dict[str, str], base: str) -> Tuple[int, Any, Dict[str, str]]:
+        token = qs.get("token")
+        top = int(qs.get("$top", 500))
+        link = f"{base}/{ver}/drives/{drive.id}/root/delta"
+        if token == "latest":
+            return 200, {"value": [], "@odata.deltaLink": f"{link}?token={drive.seq}"}, {}
+        if token is None:
+            # full enumeration: every item once, paged
+            ids = [i for i, it in drive.items.items() if not it.deleted]
+            start = int(qs.get("$skiptoken", 0))
+            page = ids[start:start + top]
+            body: Dict[str, Any] = {"value": [self._delta_json(drive, drive.items[i]) for i in page]}
+            if start + top < len(ids):
+                body["@odata.nextLink"] = f"{link}?$skiptoken={start + top}&$top={top}"
+            else:
+                body["@odata.deltaLink"] = f"{link}?token={drive.seq}"
+            return 200, body, {}
+        try:
+            since = int(token)
+        except ValueError:
+            since = -1
+        if since < 0 or since > drive.seq:
+            return 410, {"error": {"code": "resyncRequired", "message": "Resync required."}}, {}
+        changed = list(dict.fromkeys(i for s, i in drive.changes if s > since))
+        start = int(qs.get("$skiptoken", 0))
+        page = changed[start:start + top]
+        body = {"value": [self._delta_json(drive, drive.items[i]) for i in page]}
+        if start + top < len(changed):
+            body["@odata.nextLink"] = f"{link}?token={since}&$skiptoken={start + top}&$top={top}"
+        else:
+            body["@odata.deltaLink"] = f"{link}?token={drive.seq}"
+        return 200, body, {}
+
+    def _delta_json(self, drive: Drive, it: Item) -> Dict[str, Any]:
+        d = drive.to_json(it)
+        # like SharePoint: delta responses carry no parentReference.path
+        d["parentReference"].pop("path", None)
+        if it is drive.root:
+            d["root"] = {}
+        if it.deleted:
+            d = {"id": it.id, "deleted": {"state": "deleted"}, "parentReference": {"id": it.parent.id if it.parent else None}}
+        return d
+
+    async def admin(self, request: web.Request):
+        if request.method == "POST":
+            payload = await request.json()
+            n = int(payload.get("mutate", 0))
+            for d in self.drives.values():
+                d.mutate(n)
+        return web.json_response(self.stats)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware], client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/{tenant}/oauth2/v2.0/token", self.token)
+        app.router.add_route("*", "/_emulator/stats", self.admin)
+        app.router.add_post("/{ver}/$batch", self.batch)
+        app.router.add_get("/{tail:.*}", self.graph)
+        return app
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Local Graph API emulator for scanner benchmarks")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--drives", type=int, default=1, help="Number of document libraries (drive ids emu-drive-0..N-1)")
+    p.add_argument("--folders-per-folder", type=int, default=5)
+    p.add_argument("--depth", type=int, default=3, help="Folder tree depth below the root")
+    p.add_argument("--files-per-folder", type=int, default=20)
+    p.add_argument("--label-rate", type=float, default=0.3, help="Fraction of files carrying a sensitivity label")
+    p.add_argument("--latency-ms", type=float, default=30.0, help="Median response latency")
+    p.add_argument("--latency-sigma", type=float, default=0.5, help="Log-normal sigma of the latency distribution")
+    p.add_argument("--throttle-rate", type=float, default=0.0, help="Probability of a random 429 per request")
+    p.add_argument("--batch-throttle-rate", type=float, default=0.0, help="Probability of a 429 per $batch sub-request")
+    p.add_argument("--max-in-flight", type=int, default=0, help="Return 429 while more requests than this are in flight (0 = off)")
+    p.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    p.add_argument("--listitem-without-labels", action="store_true", help="listItem fields carry no label columns (labels only via sensitivityLabel)")
+    p.add_argument("--path-format", choices=["drives", "drive"], default="drives",
+                   help="parentReference.path as /drives/{id}/root:... (like Graph for /drives/{id} requests) or /drive/root:...")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--verbose", action="store_true")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    emu = Emulator(args)
+    total = sum(len(d.items) for d in emu.drives.values())
+    LOG.info(f"Serving {len(emu.drives)} drive(s) with {total} items on http://{args.host}:{args.port}")
+    web.run_app(emu.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+r"""
+Reconcile FileImportDB against Graph drive scan output
+
+Compares the `files` table written by FileImportDB/scanner.py with the
+results of graph_drive_scanner.py (drive_analysis.json or NDJSON) and sorts
+every file into one of four sets:
+
+- matched   on both sides with equal content (quickXorHash, or size when a
+            side has no hash). Also files found by hash at another path
+            (moved/renamed), reported with match=hash
+- changed   same relative path, different size or hash
+- missing   only in the scanner DB (not migrated). Local files whose path
+            collides with an already matched one after case folding and
+            normalisation are reported here with match=collision
+- orphaned  only in SharePoint
+
+The Graph items are loaded into an on-disk SQLite index (by normalised
+relative path and by quickXorHash) and the scanner DB is streamed against
+it, so memory stays bounded even with 10M+ rows on each side. Path matches
+take priority; hash matching runs in a second pass over the leftovers.
+
+Usage (PowerShell example):
+  python .\SharepointAnalysis\reconcile.py --scanner-db .\fileindex.db --graph-output .\SharepointAnalysis\output\drive_analysis.json --local-root C:\share\General --remote-root /General --output-dir .\SharepointAnalysis\output\reconcile
+
+Local QuickXorHash values require `scanner.py --hash --digests quickxor ...`.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from drive_results import graph_relative_path, iter_drive_items, normalize_drive_path
+
+# Optional import for SQL Server support
+try:
+    import pyodbc  # type: ignore
+    _HAS_PYODBC = True
+except Exception:
+    pyodbc = None  # type: ignore
+    _HAS_PYODBC = False
+
+LOG = logging.getLogger("reconcile")
+
+SETS = ("matched", "changed", "missing", "orphaned")
+CSV_COLUMNS = ["relativePath", "match", "localPath", "localSize", "localQuickXorHash", "remoteId", "remotePath", "remoteSize", "remoteQuickXorHash"]
+
+# (local path, size, quickxorhash)
+LocalRow = Tuple[str, int, Optional[str]]
+
+
+class GraphIndex:
+    """On-disk index of Graph result items, keyed by relative path and hash."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+        PRAGMA journal_mode=OFF;
+        PRAGMA synchronous=OFF;
+        PRAGMA cache_size=-65536;
+        DROP TABLE IF EXISTS graph_items;
+        DROP TABLE IF EXISTS local_unmatched;
+        CREATE TABLE graph_items (
+            id INTEGER PRIMARY KEY,
+            rel_path TEXT,
+            item_id TEXT,
+            path TEXT,
+            size INTEGER,
+            qxh TEXT,
+            claimed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE local_unmatched (
+            rel_path TEXT,
+            path TEXT,
+            size INTEGER,
+            qxh TEXT
+        );
+        """)
+
+    def load(self, items: Iterable[Dict[str, Any]], remote_root: Optional[str], batch_size: int) -> int:
+        """Bulk-load file items (folders are skipped). Call `build_indexes()`
+        once all sources are loaded."""
+        count = 0
+        batch: List[Tuple[Any, ...]] = []
+        sql = "INSERT INTO graph_items(rel_path, item_id, path, size, qxh) VALUES (?,?,?,?,?)"
+        for it in items:
+            if it.get("isFolder") or it.get("folder"):
+                continue
+            rel = normalize_drive_path(graph_relative_path(it.get("path")), remote_root)
+            if rel is None:
+                continue
+            batch.append((rel, it.get("id"), it.get("path"), int(it.get("size") or 0), it.get("quickXorHash") or None))
+            if len(batch) >= batch_size:
+                self.conn.executemany(sql, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            self.conn.executemany(sql, batch)
+            count += len(batch)
+        self.conn.commit()
+        return count
+
+    def build_indexes(self) -> None:
+        # Building after the bulk load is much faster than maintaining them
+        self.conn.executescript("""
+        CREATE INDEX idx_graph_rel_path ON graph_items(rel_path);
+        CREATE INDEX idx_graph_qxh ON graph_items(qxh, size) WHERE qxh IS NOT NULL;
+        """)
+
+    def by_path(self, rel: str) -> Optional[Tuple[Any, ...]]:
+        # Only unclaimed items: each Graph item matches at most one local file
+        return self.conn.execute(
+            "SELECT id, item_id, path, size, qxh FROM graph_items WHERE rel_path = ? AND claimed = 0 LIMIT 1", (rel,)
+        ).fetchone()
+
+    def path_claimed(self, rel: str) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM graph_items WHERE rel_path = ? AND claimed = 1 LIMIT 1", (rel,)
+        ).fetchone() is not None
+
+    def by_hash(self, qxh: str, size: int) -> Optional[Tuple[Any, ...]]:
+        return self.conn.execute(
+            "SELECT id, item_id, path, size, qxh FROM graph_items WHERE qxh = ? AND size = ? AND claimed = 0 LIMIT 1", (qxh, size)
+        ).fetchone()
+
+    def claim(self, item_rowid: int) -> None:
+        self.conn.execute("UPDATE graph_items SET claimed = 1 WHERE id = ?", (item_rowid,))
+
+    def defer_local(self, rows: List[Tuple[str, str, int, Optional[str]]]) -> None:
+        self.conn.executemany("INSERT INTO local_unmatched(rel_path, path, size, qxh) VALUES (?,?,?,?)", rows)
+
+    def iter_deferred_local(self, fetch_size: int) -> Iterator[Tuple[str, str, int, Optional[str]]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT rel_path, path, size, qxh FROM local_unmatched")
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def iter_unclaimed(self, fetch_size: int) -> Iterator[Tuple[Any, ...]]:
+        cur = self.conn.cursor()
+        cur.execute("SELECT rel_path, item_id, path, size, qxh FROM graph_items WHERE claimed = 0")
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def iter_scanner_rows(conn: Any, table: str, fetch_size: int) -> Iterator[LocalRow]:
+    """Stream (path, size, quickxorhash) from the scanner `files` table.
+
+    Databases scanned before the quickxorhash column existed are read
+    without it (size-only comparison)."""
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT path, size, quickxorhash FROM {table}")
+    except Exception:
+        LOG.warning("Scanner DB has no quickxorhash column; comparing by size only")
+        cur = conn.cursor()
+        cur.execute(f"SELECT path, size, NULL FROM {table}")
+    while True:
+        rows = cur.fetchmany(fetch_size)
+        if not rows:
+            break
+        for path, size, qxh in rows:
+            yield path, int(size or 0), qxh or None
+
+
+class SetWriter:
+    """Streams each result set to `<set>.csv` and keeps counts/byte totals."""
+
+    def __init__(self, output_dir: str):
+        os.makedirs(output_dir, exist_ok=True)
+        self.files = {}
+        self.writers = {}
+        self.counts = {s: 0 for s in SETS}
+        self.bytes = {s: 0 for s in SETS}
+        for s in SETS:
+            f = open(os.path.join(output_dir, f"{s}.csv"), "w", encoding="utf-8", newline="")
+            self.files[s] = f
+            self.writers[s] = csv.writer(f)
+            self.writers[s].writerow(CSV_COLUMNS)
+
+    def add(self, set_name: str, rel: str, match: str, local: Optional[LocalRow], remote: Optional[Tuple[Any, ...]]) -> None:
+        lpath, lsize, lqxh = local if local else (None, None, None)
+        # remote: (id or rel_path, item_id, path, size, qxh)
+        rid, rpath, rsize, rqxh = remote[1:] if remote else (None, None, None, None)
+        self.writers[set_name].writerow([rel, match, lpath, lsize, lqxh, rid, rpath, rsize, rqxh])
+        self.counts[set_name] += 1
+        self.bytes[set_name] += int((rsize if set_name == "orphaned" else lsize) or 0)
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        return {s: {"count": self.counts[s], "bytes": self.bytes[s]} for s in SETS}
+
+
+def same_content(lsize: int, lqxh: Optional[str], rsize: int, rqxh: Optional[str]) -> bool:
+    if lqxh and rqxh:
+        return lqxh == rqxh and lsize == rsize
+    return lsize == rsize
+
+
+def reconcile(index: GraphIndex, local_rows: Iterable[LocalRow], local_root: Optional[str], out: SetWriter,
+              batch_size: int) -> int:
+    """Stream local rows against the Graph index; returns rows outside the root."""
+    skipped = 0
+    pending = 0
+    deferred: List[Tuple[str, str, int, Optional[str]]] = []
+
+    # Pass 1: match by relative path
+    for local in local_rows:
+        rel = normalize_drive_path(local[0], local_root)
+        if rel is None:
+            skipped += 1
+            continue
+        remote = index.by_path(rel)
+        if remote is None and index.path_claimed(rel):
+            # another local file with the same normalised path took the item
+            out.add("missing", rel, "collision", local, None)
+            continue
+        if remote is None:
+            deferred.append((rel, local[0], local[1], local[2]))
+            if len(deferred) >= batch_size:
+                index.defer_local(deferred)
+                deferred = []
+            continue
+        index.claim(remote[0])
+        if same_content(local[1], local[2], remote[3], remote[4]):
+            out.add("matched", rel, "path", local, remote)
+        else:
+            out.add("changed", rel, "path", local, remote)
+        pending += 1
+        if pending >= batch_size:
+            index.conn.commit()
+            pending = 0
+    if deferred:
+        index.defer_local(deferred)
+    index.conn.commit()
+
+    # Pass 2: leftovers, match by content hash (moved / renamed files)
+    for rel, path, size, qxh in index.iter_deferred_local(batch_size):
+        local = (path, size, qxh)
+        remote = index.by_hash(qxh, size) if qxh else None
+        if remote is None:
+            out.add("missing", rel, "", local, None)
+            continue
+        index.claim(remote[0])
+        out.add("matched", rel, "hash", local, remote)
+    index.conn.commit()
+
+    # Everything SharePoint has that nobody claimed
+    for remote in index.iter_unclaimed(batch_size):
+        out.add("orphaned", remote[0], "", None, remote)
+    return skipped
+
+
+def connect_scanner_db(args) -> Tuple[Any, str]:
+    if args.mssql_server and args.mssql_database:
+        if not _HAS_PYODBC:
+            raise RuntimeError("pyodbc is not installed or could not be imported. Install pyodbc to read from SQL Server.")
+        if args.mssql_user:
+            conn_str = (
+                f"DRIVER={{{args.mssql_driver}}};SERVER={args.mssql_server};DATABASE={args.mssql_database};UID={args.mssql_user};PWD={args.mssql_password};"
+                f"Encrypt=YES;TrustServerCertificate=YES"
+            )
+        else:
+            conn_str = (
+                f"DRIVER={{{args.mssql_driver}}};SERVER={args.mssql_server};DATABASE={args.mssql_database};Trusted_Connection=Yes;"
+                f"Encrypt=YES;TrustServerCertificate=YES"
+            )
+        return pyodbc.connect(conn_str, autocommit=True), "dbo.files"
+    if not args.scanner_db:
+        raise RuntimeError("Provide --scanner-db or --mssql-server/--mssql-database")
+    if not os.path.exists(args.scanner_db):
+        raise RuntimeError(f"Scanner DB not found: {args.scanner_db}")
+    return sqlite3.connect(args.scanner_db), "files"
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Reconcile FileImportDB files against Graph drive scan output")
+    p.add_argument("--scanner-db", help="SQLite DB written by FileImportDB/scanner.py")
+    p.add_argument("--mssql-server", help="SQL Server host or instance (instead of --scanner-db)")
+    p.add_argument("--mssql-database", help="SQL Server database name")
+    p.add_argument("--mssql-user", help="SQL user (omit for integrated auth)")
+    p.add_argument("--mssql-password", help="SQL password")
+    p.add_argument("--mssql-driver", default="ODBC Driver 17 for SQL Server", help="ODBC driver name")
+    p.add_argument("--graph-output", nargs="+", required=True, help="drive_analysis.json / NDJSON files (optionally .gz/.zst)")
+    p.add_argument("--local-root", help="Local directory that was migrated (e.g. C:\\share\\General); only files below it are compared")
+    p.add_argument("--remote-root", help="Folder in the drive that corresponds to --local-root (e.g. /General); default: drive root")
+    p.add_argument("--output-dir", default=os.path.join(os.path.dirname(__file__), "output", "reconcile"))
+    p.add_argument("--work-db", help="Path for the temporary index DB (default: temp file, deleted afterwards)")
+    p.add_argument("--batch-size", type=int, default=10000, help="Rows per insert/commit batch")
+    p.add_argument("--verbose", action="store_true")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    start = time.time()
+
+    scanner_conn, table = connect_scanner_db(args)
+    work_db = args.work_db
+    tmp_dir = None
+    if not work_db:
+        tmp_dir = tempfile.mkdtemp(prefix="reconcile_")
+        work_db = os.path.join(tmp_dir, "graph_index.db")
+
+    index = GraphIndex(work_db)
+    out = SetWriter(args.output_dir)
+    try:
+        for src in args.graph_output:
+            n = index.load(iter_drive_items(src), args.remote_root, args.batch_size)
+            LOG.info(f"Loaded {n} Graph file items from {src}")
+        index.build_indexes()
+        skipped = reconcile(index, iter_scanner_rows(scanner_conn, table, args.batch_size), args.local_root, out, args.batch_size)
+        if skipped:
+            LOG.info(f"Skipped {skipped} scanner rows outside --local-root")
+    finally:
+        out.close()
+        index.close()
+        scanner_conn.close()
+        if tmp_dir:
+            try:
+                os.remove(work_db)
+                os.rmdir(tmp_dir)
+            except Exception:
+                pass
+
+    summary = {
+        "localRoot": args.local_root,
+        "remoteRoot": args.remote_root,
+        "graphOutput": args.graph_output,
+        "elapsedSeconds": round(time.time() - start, 1),
+        "sets": out.summary(),
+    }
+    with open(os.path.join(args.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    for s in SETS:
+        LOG.info(f"{s:9s} {out.counts[s]:>10} files {out.bytes[s]:>16} bytes")
+    LOG.info(f"Results written to {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
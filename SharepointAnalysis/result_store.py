@@ -0,0 +1,136 @@
+"""
+SQLite result store for Graph drive scans.
+
+Both scanners can write their results to an indexed `drive_items` table
+(`--sqlite-db`) in addition to or instead of JSON/CSV files:
+
+- one row per item, keyed by (drive_id, id), so re-scans upsert in place
+- indexes on path, dir, quickxorhash and the label columns, so follow-up
+  questions (duplicates, unlabelled folders, ...) are plain SQL queries
+- rows are written in batches (`batch_size`) inside one transaction each
+- `finish()` removes rows of the drive that the completed scan did not see
+  (deleted or moved away since the previous scan)
+
+Column names follow FileImportDB's `files` table where they overlap (name,
+dir, extension, size, quickxorhash). Standard library only.
+"""
+from __future__ import annotations
+import os
+import posixpath
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+SCHEMA = """
+PRAGMA journal_mode=WAL;
+CREATE TABLE IF NOT EXISTS drive_items (
+    drive_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    path TEXT,
+    dir TEXT,
+    extension TEXT,
+    size INTEGER,
+    is_folder INTEGER,
+    quickxorhash TEXT,
+    label_id TEXT,
+    label_name TEXT,
+    created_datetime TEXT,
+    modified_datetime TEXT,
+    scanned_at_unix REAL,
+    PRIMARY KEY (drive_id, id)
+);
+CREATE INDEX IF NOT EXISTS idx_drive_items_path ON drive_items(path);
+CREATE INDEX IF NOT EXISTS idx_drive_items_dir ON drive_items(dir);
+CREATE INDEX IF NOT EXISTS idx_drive_items_quickxorhash ON drive_items(quickxorhash);
+CREATE INDEX IF NOT EXISTS idx_drive_items_label_id ON drive_items(label_id);
+CREATE INDEX IF NOT EXISTS idx_drive_items_label_name ON drive_items(label_name);
+"""
+
+UPSERT = """
+INSERT INTO drive_items (drive_id, id, name, path, dir, extension, size, is_folder, quickxorhash,
+                         label_id, label_name, created_datetime, modified_datetime, scanned_at_unix)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (drive_id, id) DO UPDATE SET
+    name = excluded.name, path = excluded.path, dir = excluded.dir, extension = excluded.extension,
+    size = excluded.size, is_folder = excluded.is_folder, quickxorhash = excluded.quickxorhash,
+    label_id = excluded.label_id, label_name = excluded.label_name,
+    created_datetime = excluded.created_datetime, modified_datetime = excluded.modified_datetime,
+    scanned_at_unix = excluded.scanned_at_unix
+"""
+
+
+class DriveItemStore:
+    """Batched upserts of scan results of one drive into `drive_items`.
+
+    The connection may be used from a worker thread other than the one that
+    created it (the async scanner writes from its result writer thread), but
+    only from one thread at a time. Several stores (drives) can share one
+    database file; SQLite serialises their transactions.
+    """
+
+    def __init__(self, path: str, drive_id: str, batch_size: int = 1000):
+        self.path = path
+        self.drive_id = drive_id
+        self.batch_size = batch_size
+        self.scan_started = time.time()
+        self.count = 0
+        self._pending: List[Tuple[Any, ...]] = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _row(self, item: Dict[str, Any]) -> Tuple[Any, ...]:
+        path = item.get("path") or ""
+        name = item.get("name") or posixpath.basename(path)
+        ext = os.path.splitext(name)[1].lower() if not item.get("isFolder") else ""
+        return (
+            self.drive_id,
+            item.get("id"),
+            name,
+            path,
+            posixpath.dirname(path),
+            ext,
+            item.get("size"),
+            1 if item.get("isFolder") else 0,
+            item.get("quickXorHash"),
+            item.get("sensitivityLabelId"),
+            item.get("sensitivityLabelName"),
+            item.get("createdDateTime"),
+            item.get("lastModifiedDateTime"),
+            time.time(),
+        )
+
+    def add(self, item: Dict[str, Any]):
+        self._pending.append(self._row(item))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_all(self, items: Iterable[Dict[str, Any]]):
+        for item in items:
+            self.add(item)
+        self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(UPSERT, self._pending)
+        self.count += len(self._pending)
+        self._pending = []
+
+    def finish(self) -> int:
+        """Flush and delete the rows of this drive not written by this scan.
+        Call only after a complete scan. Returns the number of rows removed."""
+        self.flush()
+        with self.conn:
+            cur = self.conn.execute("DELETE FROM drive_items WHERE drive_id = ? AND scanned_at_unix < ?", (self.drive_id, self.scan_started))
+        return cur.rowcount
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
@@ -0,0 +1,156 @@
+"""
+Checkpoint store for graph_drive_scanner.py.
+
+Records the progress of a full drive scan in a local SQLite file so that an
+interrupted run can continue with `--resume` instead of starting again from
+the drive root:
+
+- folders:  every discovered folder, the nextLink of its next unlisted
+            children page and whether it has been listed completely
+- files:    every discovered file (the listing item as JSON)
+- results:  completed file details
+- meta:     drive id, scan phase (traversal, details, fetched, done),
+            deltaLink for --incremental
+
+Writes are committed at most every `commit_interval` seconds; after a kill
+the scan repeats at most that much work. Standard library only.
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE IF NOT EXISTS folders (id TEXT PRIMARY KEY, item TEXT NOT NULL, next_url TEXT, done INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS files (id TEXT PRIMARY KEY, item TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, result TEXT NOT NULL)",
+]
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+class ScanCheckpoint:
+    def __init__(self, path: str, commit_interval: float = 1.0):
+        self.path = path
+        self.commit_interval = commit_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in SCHEMA:
+            self.conn.execute(stmt)
+        self.conn.commit()
+        self._last_commit = time.monotonic()
+
+    # --- meta ------------------------------------------------------------
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: Optional[str]):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+        self.commit()
+
+    def reset(self, drive_id: str):
+        """Discard any previous state and start a new scan of `drive_id`."""
+        for table in ("meta", "folders", "files", "results"):
+            self.conn.execute(f"DELETE FROM {table}")
+        self.conn.execute("INSERT INTO meta (key, value) VALUES ('drive_id', ?), ('phase', 'traversal')", (drive_id,))
+        self.commit()
+
+    def can_resume(self, drive_id: str) -> bool:
+        return self.get("drive_id") == drive_id and self.get("phase") in ("traversal", "details", "fetched")
+
+    # --- traversal -------------------------------------------------------
+    def _add_children(self, children: List[Dict[str, Any]]):
+        folders = [(c["id"], _dumps(c)) for c in children if c.get("folder") is not None]
+        files = [(c["id"], _dumps(c)) for c in children if c.get("folder") is None]
+        if folders:
+            # keep the listing state of folders already known (re-listed page)
+            self.conn.executemany("INSERT OR IGNORE INTO folders (id, item) VALUES (?, ?)", folders)
+        if files:
+            self.conn.executemany("INSERT OR REPLACE INTO files (id, item) VALUES (?, ?)", files)
+
+    def record_root(self, children: List[Dict[str, Any]]):
+        self._add_children(children)
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('root_listed', '1')")
+        self.commit()
+
+    def record_page(self, folder_id: str, children: List[Dict[str, Any]], next_url: Optional[str]):
+        """Store one listed children page of `folder_id`. `next_url` is the
+        absolute nextLink of the following page, or None when the folder is
+        complete."""
+        self._add_children(children)
+        self.conn.execute("UPDATE folders SET next_url = ?, done = ? WHERE id = ?", (next_url, 0 if next_url else 1, folder_id))
+        self.maybe_commit()
+
+    def load_discovered(self) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Tuple[Dict[str, Any], Optional[str]]]]:
+        """Return (folders, files, pending) where pending lists the folders
+        still to be listed with the nextLink to continue from (None = first page)."""
+        folders: List[Dict[str, Any]] = []
+        pending: List[Tuple[Dict[str, Any], Optional[str]]] = []
+        for item, next_url, done in self.conn.execute("SELECT item, next_url, done FROM folders ORDER BY rowid"):
+            f = json.loads(item)
+            folders.append(f)
+            if not done:
+                pending.append((f, next_url))
+        files = [json.loads(item) for (item,) in self.conn.execute("SELECT item FROM files ORDER BY rowid")]
+        return folders, files, pending
+
+    # --- details ---------------------------------------------------------
+    def add_result(self, result: Dict[str, Any]):
+        self.conn.execute("INSERT OR REPLACE INTO results (id, result) VALUES (?, ?)", (result.get("id"), _dumps(result)))
+        self.maybe_commit()
+
+    def done_ids(self) -> Set[str]:
+        return {rid for (rid,) in self.conn.execute("SELECT id FROM results")}
+
+    def iter_results(self) -> Iterator[Dict[str, Any]]:
+        for (result,) in self.conn.execute("SELECT result FROM results ORDER BY rowid"):
+            yield json.loads(result)
+
+    def counts(self) -> Dict[str, int]:
+        q = lambda sql: self.conn.execute(sql).fetchone()[0]
+        return {
+            "folders": q("SELECT COUNT(*) FROM folders"),
+            "pending_folders": q("SELECT COUNT(*) FROM folders WHERE done = 0"),
+            "files": q("SELECT COUNT(*) FROM files"),
+            "results": q("SELECT COUNT(*) FROM results"),
+        }
+
+    # --- housekeeping ----------------------------------------------------
+    def maybe_commit(self):
+        if time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        try:
+            self.conn.commit()
+        finally:
+            self.conn.close()
+
+
+class CheckpointSink:
+    """Records every result in the checkpoint before passing it on to the
+    real sink, or collecting it in `items` when there is none."""
+
+    def __init__(self, checkpoint: ScanCheckpoint, inner=None):
+        self.checkpoint = checkpoint
+        self.inner = inner
+        self.items: List[Dict[str, Any]] = []
+
+    async def put(self, item: Dict[str, Any]):
+        self.checkpoint.add_result(item)
+        if self.inner is not None:
+            await self.inner.put(item)
+        else:
+            self.items.append(item)
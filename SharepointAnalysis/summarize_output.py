@@ -1,18 +1,224 @@
-import json,collections,sys,os
-p=os.path.join(os.path.dirname(__file__), 'output', 'drive_analysis.json')
-if not os.path.exists(p):
-    print('drive_analysis.json not found at', p); sys.exit(2)
-with open(p,'r',encoding='utf-8') as f:
-    items=json.load(f)
-
-total=len(items)
-with_hash=sum(1 for i in items if i.get('quickXorHash'))
-with_label=sum(1 for i in items if i.get('sensitivityLabelName'))
-labels=[i.get('sensitivityLabelName') for i in items if i.get('sensitivityLabelName')]
-top=collections.Counter(labels).most_common(10)
-print('total:', total)
-print('with_quickXorHash:', with_hash)
-print('with_sensitivityLabelName:', with_label)
-print('\nTop labels:')
-for k,v in top:
-    print(f'{k}\t{v}')
+r"""
+Summarise a drive scan result in one streaming pass.
+
+Reads `drive_analysis.json` (JSON array) or the streamed NDJSON output
+(optionally .gz/.zst) item by item, so memory does not grow with the drive:
+
+- totals: items, items with quickXorHash, items with a sensitivity label
+- top labels
+- size histogram (power-of-two buckets)
+- per-folder bytes, file counts and label coverage, aggregated at
+  `--folder-depth` and kept in two bounded top-K tables, one ranked by
+  bytes and one by files (approximate once more than `--capacity` folders
+  have been seen, with an error bound per folder)
+
+Usage:
+  python .\SharepointAnalysis\summarize_output.py [results file] [--folder-depth 2] [--top 10] [--json summary.json]
+"""
+from __future__ import annotations
+import argparse
+import collections
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from drive_results import graph_relative_path, iter_drive_items
+
+DEFAULT_NAMES = ["drive_analysis.json", "drive_analysis.ndjson", "drive_analysis.ndjson.gz", "drive_analysis.ndjson.zst"]
+
+
+class BoundedTopK:
+    """Approximate heavy hitters over a stream of (key, weights) updates,
+    ranked by the first weight.
+
+    Keeps at most 2 * `capacity` keys; when full the table is pruned to the
+    `capacity` heaviest keys and `floor` is raised to the heaviest first
+    weight pruned. Like Space-Saving, a key that enters the table afterwards
+    starts from `floor` and records it as its error: its first weight is
+    then an upper bound that is over by at most `error(key)`, also for keys
+    pruned and re-added several times. Keys added before the first prune
+    are exact. The other weights count only since the key was (re)added.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = max(1, capacity)
+        self.table: Dict[str, List[int]] = {}
+        self.errors: Dict[str, int] = {}
+        self.floor = 0
+        self.pruned = 0
+
+    def add(self, key: str, weights: Tuple[int, ...]):
+        row = self.table.get(key)
+        if row is None:
+            if len(self.table) >= 2 * self.capacity:
+                self._prune()
+            row = list(weights)
+            if self.floor:
+                row[0] += self.floor
+                self.errors[key] = self.floor
+            self.table[key] = row
+        else:
+            for i, w in enumerate(weights):
+                row[i] += w
+
+    def _prune(self):
+        ranked = sorted(self.table.items(), key=lambda kv: kv[1][0], reverse=True)
+        for key, row in ranked[self.capacity:]:
+            self.floor = max(self.floor, row[0])
+            self.pruned += 1
+            del self.table[key]
+            self.errors.pop(key, None)
+
+    def error(self, key: str) -> int:
+        return self.errors.get(key, 0)
+
+    def max_error(self, keys: List[str]) -> int:
+        return max((self.error(k) for k in keys), default=0)
+
+    def top(self, n: int) -> List[Tuple[str, List[int]]]:
+        return sorted(self.table.items(), key=lambda kv: kv[1][0], reverse=True)[:n]
+
+
+class Summary:
+    """Single-pass accumulator for result items."""
+
+    def __init__(self, folder_depth: int = 2, capacity: int = 1000):
+        self.folder_depth = folder_depth
+        self.total = 0
+        self.files = 0
+        self.bytes = 0
+        self.with_hash = 0
+        self.with_label = 0
+        self.labels: collections.Counter = collections.Counter()
+        # bucket b counts files with 2**(b-1) <= size < 2**b (bucket 0: empty files)
+        self.size_buckets: collections.Counter = collections.Counter()
+        # folder -> [bytes, files, labelled files] and [files, bytes, labelled files]
+        self.folders = BoundedTopK(capacity)
+        self.folders_by_files = BoundedTopK(capacity)
+
+    def folder_key(self, path: Optional[str]) -> str:
+        parts = [p for p in graph_relative_path(path).split("/") if p]
+        # the last part is the item name
+        return "/" + "/".join(parts[:-1][:self.folder_depth])
+
+    def add(self, item: Dict[str, Any]):
+        self.total += 1
+        has_hash = bool(item.get("quickXorHash"))
+        label = item.get("sensitivityLabelName")
+        if has_hash:
+            self.with_hash += 1
+        if label:
+            self.with_label += 1
+            self.labels[label] += 1
+        if item.get("isFolder"):
+            return
+        size = int(item.get("size") or 0)
+        self.files += 1
+        self.bytes += size
+        self.size_buckets[size.bit_length()] += 1
+        folder = self.folder_key(item.get("path"))
+        self.folders.add(folder, (size, 1, 1 if label else 0))
+        self.folders_by_files.add(folder, (1, size, 1 if label else 0))
+
+    def size_histogram(self) -> List[Tuple[str, int]]:
+        rows = []
+        for b in sorted(self.size_buckets):
+            lo = 0 if b == 0 else 1 << (b - 1)
+            hi = 1 if b == 0 else 1 << b
+            rows.append((f"{human_bytes(lo)} - {human_bytes(hi)}", self.size_buckets[b]))
+        return rows
+
+    def to_dict(self, top: int) -> Dict[str, Any]:
+        def folder_rows(table: BoundedTopK, by_files: bool):
+            rows = []
+            for k, v in table.top(top):
+                nbytes, nfiles = (v[1], v[0]) if by_files else (v[0], v[1])
+                # labelled files are counted since the key was (re)added, like `counted`
+                counted = nfiles - table.error(k) if by_files else nfiles
+                rows.append({"folder": k, "bytes": nbytes, "files": nfiles, "labelled": v[2],
+                             "labelCoverage": round(v[2] / counted, 4) if counted else 0.0, "error": table.error(k)})
+            return rows
+        return {
+            "total": self.total,
+            "files": self.files,
+            "bytes": self.bytes,
+            "withQuickXorHash": self.with_hash,
+            "withSensitivityLabelName": self.with_label,
+            "topLabels": self.labels.most_common(top),
+            "sizeHistogram": self.size_histogram(),
+            "folderDepth": self.folder_depth,
+            "topFoldersByBytes": folder_rows(self.folders, False),
+            "topFoldersByFiles": folder_rows(self.folders_by_files, True),
+            # "error": the ranked value (bytes resp. files) may be over-counted by this much
+            "folderTableApproximate": self.folders.pruned > 0 or self.folders_by_files.pruned > 0,
+        }
+
+
+def human_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if n < 1024 or unit == "TB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} TB"
+
+
+def print_summary(s: Summary, top: int):
+    print('total:', s.total)
+    print('with_quickXorHash:', s.with_hash)
+    print('with_sensitivityLabelName:', s.with_label)
+    print('\nTop labels:')
+    for k, v in s.labels.most_common(top):
+        print(f'{k}\t{v}')
+    print(f'\nFiles: {s.files}, {human_bytes(s.bytes)}')
+    print('\nSize histogram:')
+    for rng, n in s.size_histogram():
+        print(f'{rng:>24}\t{n}')
+    rows = s.folders.top(top)
+    error = s.folders.max_error([k for k, _ in rows])
+    note = f" (approximate, bytes over-counted by <= {human_bytes(error)})" if error else ""
+    print(f'\nTop folders by bytes (depth {s.folder_depth}){note}:')
+    print(f'{"bytes":>10} {"files":>8} {"labelled":>8}  folder')
+    for k, (nbytes, nfiles, labelled) in rows:
+        print(f'{human_bytes(nbytes):>10} {nfiles:>8} {labelled / nfiles if nfiles else 0:>8.0%}  {k}')
+    rows = s.folders_by_files.top(top)
+    error = s.folders_by_files.max_error([k for k, _ in rows])
+    note = f" (approximate, files over-counted by <= {error})" if error else ""
+    print(f'\nTop folders by files (depth {s.folder_depth}){note}:')
+    print(f'{"files":>8} {"bytes":>10}  folder')
+    for k, (nfiles, nbytes, _) in rows:
+        print(f'{nfiles:>8} {human_bytes(nbytes):>10}  {k}')
+
+
+def default_input() -> Optional[str]:
+    outdir = os.path.join(os.path.dirname(__file__), 'output')
+    found = [os.path.join(outdir, n) for n in DEFAULT_NAMES if os.path.exists(os.path.join(outdir, n))]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Summarise drive_analysis.json / .ndjson in one streaming pass")
+    p.add_argument("path", nargs="?", help="Result file (default: newest drive_analysis.* in ./output)")
+    p.add_argument("--top", type=int, default=10, help="Rows in the top lists")
+    p.add_argument("--folder-depth", type=int, default=2, help="Aggregate folders at this depth below the drive root")
+    p.add_argument("--capacity", type=int, default=1000, help="Folders tracked exactly before the folder table becomes approximate")
+    p.add_argument("--json", dest="json_path", required=False, help="Also write the summary as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    path = args.path or default_input()
+    if not path or not os.path.exists(path):
+        print('drive_analysis.json not found at', path or os.path.join(os.path.dirname(__file__), 'output')); sys.exit(2)
+    s = Summary(folder_depth=args.folder_depth, capacity=args.capacity)
+    for item in iter_drive_items(path):
+        s.add(item)
+    print_summary(s, args.top)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(s.to_dict(args.top), f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
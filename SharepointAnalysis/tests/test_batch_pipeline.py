@@ -0,0 +1,63 @@
+"""
+$batch detail retries while the traversal is slow to list more files (--pipeline).
+
+Run: python -m unittest discover -s SharepointAnalysis/tests
+"""
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_drive_scanner as gds  # noqa: E402
+
+
+class ThrottleOnceClient:
+    """Answers the first $batch with 429 sub-responses, later ones with 200."""
+
+    max_retries = 3
+    rate = None
+
+    def __init__(self):
+        self.posts = []
+
+    def api_base(self):
+        return "http://graph"
+
+    async def request(self, method, url, json=None):
+        self.posts.append(time.monotonic())
+        status = 429 if len(self.posts) == 1 else 200
+        return {"responses": [{"id": r["id"], "status": status, "headers": {"Retry-After": "0.1"}, "body": {}}
+                              for r in json["requests"]]}
+
+
+def record(iid):
+    return gds.ItemRecord(iid, iid + ".txt", 1, False, "root", "/drives/b!abc/root:", None, None, None)
+
+
+class BatchPipelineTest(unittest.TestCase):
+
+    def test_retry_not_held_back_by_slow_listing(self):
+        client = ThrottleOnceClient()
+
+        async def scan():
+            feed = gds.FileFeed()
+            feed.put(record("a"))
+            task = asyncio.ensure_future(gds.batch_gather_file_details(client, "b!abc", feed, None, 20, 4, 0, show_progress=False))
+            # the listing produces nothing more for a while
+            await asyncio.sleep(1.0)
+            feed.close()
+            return await task
+
+        started = time.monotonic()
+        results = asyncio.run(scan())
+        self.assertEqual([r["id"] for r in results], ["a"])
+        self.assertEqual(len(client.posts), 2)
+        # retried after its Retry-After, not only when the feed was closed
+        self.assertLess(client.posts[1] - started, 0.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""
+Error bounds of summarize_output.BoundedTopK once the table has been pruned.
+
+Run: python -m unittest discover -s SharepointAnalysis/tests
+"""
+import collections
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from summarize_output import BoundedTopK, Summary  # noqa: E402
+
+
+class BoundedTopKTest(unittest.TestCase):
+
+    def test_exact_without_pruning(self):
+        t = BoundedTopK(10)
+        for key, w in [("a", 5), ("b", 3), ("a", 2)]:
+            t.add(key, (w,))
+        self.assertEqual(t.top(2), [("a", [7]), ("b", [3])])
+        self.assertEqual(t.error("a"), 0)
+
+    def test_counts_within_error_after_repeated_prunes(self):
+        rnd = random.Random(7)
+        t = BoundedTopK(5)
+        truth: collections.Counter = collections.Counter()
+        for _ in range(5000):
+            # a few heavy keys among many light ones, revisited after prunes
+            key = f"k{int(rnd.paretovariate(0.8)) % 200}"
+            w = rnd.randint(1, 100)
+            truth[key] += w
+            t.add(key, (w,))
+        self.assertGreater(t.pruned, 0)
+        for key, (est,) in t.table.items():
+            self.assertLessEqual(truth[key], est, key)
+            self.assertLessEqual(est - t.error(key), truth[key], key)
+
+    def test_files_ranking_is_kept_separately(self):
+        s = Summary(folder_depth=1, capacity=1)
+        for i in range(3):
+            s.add({"path": f"/big{i}/f.bin", "size": 10 ** 9})
+        for _ in range(50):
+            s.add({"path": "/many/small.txt", "size": 1})
+        top = s.to_dict(1)["topFoldersByFiles"][0]
+        self.assertEqual(top["folder"], "/many")
+        self.assertGreaterEqual(top["files"], 50)
+        self.assertLessEqual(top["files"] - top["error"], 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Incremental scan path handling against results in the real Graph format.
+
+Run: python -m unittest discover -s SharepointAnalysis/tests
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_drive_scanner as gds  # noqa: E402
+
+PREFIX = "/drives/b!abc/root:"
+
+
+class DeltaClient:
+    """Answers the deltaLink request with one page of changes."""
+
+    def __init__(self, changes):
+        self.changes = changes
+
+    async def request(self, method, url):
+        return {"value": self.changes, "@odata.deltaLink": "delta-2"}
+
+
+async def fake_details(client, args, files, sink=None):
+    return [f.result() for f in files]
+
+
+def entry(iid, path):
+    return {"id": iid, "name": path.rsplit("/", 1)[1], "path": PREFIX + path, "size": 1, "isFolder": False}
+
+
+class IncrementalPathTest(unittest.TestCase):
+
+    def run_scan(self, changes):
+        state = {
+            "deltaLink": "delta-1",
+            "rootId": "root",
+            "folders": {"fa": ["A", "root"], "fb": ["B", "fa"], "fc": ["C", "root"]},
+        }
+        previous = [
+            entry("1", "/top.txt"),
+            entry("2", "/A/a.txt"),
+            entry("3", "/A/B/b.txt"),
+            entry("4", "/C/c.txt"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "drive_analysis.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(previous, f)
+            args = SimpleNamespace(drive_id="b!abc")
+            with mock.patch.object(gds, "fetch_details", fake_details):
+                details, new_state = asyncio.run(gds.incremental_scan(DeltaClient(changes), args, state, path))
+        return {d["id"]: d["path"] for d in details}, new_state
+
+    def test_folder_rename_rewrites_paths_below_it(self):
+        paths, state = self.run_scan([{"id": "fa", "name": "A2", "folder": {}, "parentReference": {"id": "root"}}])
+        self.assertEqual(paths["2"], PREFIX + "/A2/a.txt")
+        self.assertEqual(paths["3"], PREFIX + "/A2/B/b.txt")
+        self.assertEqual(paths["1"], PREFIX + "/top.txt")
+        self.assertEqual(state["deltaLink"], "delta-2")
+
+    def test_folder_move_and_delete(self):
+        paths, _ = self.run_scan([
+            {"id": "fb", "name": "B", "folder": {}, "parentReference": {"id": "fc"}},
+            {"id": "fa", "deleted": {}},
+        ])
+        self.assertEqual(paths["3"], PREFIX + "/C/B/b.txt")
+        self.assertNotIn("2", paths)
+        self.assertEqual(paths["4"], PREFIX + "/C/c.txt")
+
+    def test_refreshed_files_keep_the_stored_prefix(self):
+        paths, _ = self.run_scan([
+            {"id": "5", "name": "new.txt", "file": {}, "parentReference": {"id": "fb"}},
+            {"id": "6", "name": "root.txt", "file": {}, "parentReference": {"id": "root"}},
+        ])
+        self.assertEqual(paths["5"], PREFIX + "/A/B/new.txt")
+        self.assertEqual(paths["6"], PREFIX + "/root.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+graph_drive_scanner_simple.scan_drive_items keeps scanning when a folder cannot be listed.
+
+Run: python -m unittest discover -s SharepointAnalysis/tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import graph_drive_scanner_simple as simple  # noqa: E402
+
+PREFIX = "/drives/b!abc/root:"
+TREE = {
+    None: [{"id": "A", "name": "A", "folder": {"childCount": 1}, "parentReference": {"path": PREFIX}},
+           {"id": "B", "name": "B", "folder": {"childCount": 1}, "parentReference": {"path": PREFIX}},
+           {"id": "f0", "name": "f0.txt", "parentReference": {"path": PREFIX}}],
+    "B": [{"id": "f1", "name": "f1.txt", "parentReference": {"path": PREFIX + "/B"}}],
+}
+
+
+def list_children(session, token, drive_id, folder, page_size, api_base):
+    key = None if folder is None else folder["id"]
+    if key == "A":
+        raise RuntimeError("503 Service Unavailable")
+    return TREE.get(key, [])
+
+
+def fetch_file_detail(session, token, drive_id, item, api_base):
+    return {"id": item["id"], "path": simple.build_path(item)}
+
+
+class ListingFailureTest(unittest.TestCase):
+
+    def test_failed_folder_is_skipped_and_reported(self):
+        with mock.patch.object(simple, "list_children", list_children), \
+                mock.patch.object(simple, "fetch_file_detail", fetch_file_detail):
+            folders, files, details, unlisted = simple.scan_drive_items(None, "token", "b!abc", concurrency=2, show_progress=False)
+        self.assertEqual(sorted(d["id"] for d in details), ["f0", "f1"])
+        self.assertEqual([f["id"] for f in unlisted], ["A"])
+        self.assertEqual(len(folders), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()